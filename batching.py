@@ -0,0 +1,102 @@
+import asyncio
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+
+class MicroBatcher:
+    """Собирает одиночные запросы к бэкенду в пакеты
+
+    Пакет уходит одним вызовом `send_batch(items)`, когда набралось
+    `max_batch` запросов или наступил ближайший срок среди ожидающих: срок
+    запроса — его `max_wait` (по умолчанию `window`) с момента прихода,
+    поэтому одиночный запрос при свободном бэкенде не ждёт попутчиков
+    дольше. Одновременно в полёте не больше `max_in_flight` пакетов (по
+    числу слотов модели): пока все заняты, запросы копятся, и освободившийся
+    слот сразу забирает до `max_batch` из них — под нагрузкой пакеты
+    растут сами, без длинного окна. `send_batch` возвращает результаты в
+    порядке запросов; ошибка вызова достаётся всем запросам пакета.
+    Отменённые до отправки запросы в пакет не попадают.
+    """
+
+    def __init__(self, send_batch: Callable[[List[Any]], Awaitable[List[Any]]], max_batch: int = 8,
+                 window: float = 0.05, max_in_flight: int = 1, on_batch: Optional[Callable[[int], Any]] = None):
+        self.send_batch = send_batch
+        self.max_batch = max_batch
+        self.window = window
+        self.max_in_flight = max_in_flight
+        self.on_batch = on_batch
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._flush_at: Optional[float] = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: set = set()
+        self.batches = 0
+        self.items = 0
+        self.sizes: Counter = Counter()
+
+    async def submit(self, item: Any, max_wait: Optional[float] = None) -> Any:
+        """Поставить запрос в пакет и дождаться его результата"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif len(self._tasks) < self.max_in_flight:
+            # Пока слоты заняты, срок не нужен: пакет заберёт освободившийся слот
+            flush_at = loop.time() + (self.window if max_wait is None else min(max_wait, self.window))
+            if self._flush_at is None or flush_at < self._flush_at:
+                if self._timer is not None:
+                    self._timer.cancel()
+                self._flush_at = flush_at
+                self._timer = loop.call_at(flush_at, self._flush)
+        return await future
+
+    def _flush(self):
+        """Отправить ожидающие запросы пакетами, сколько позволяют свободные слоты"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._flush_at = None
+        self._pending = [(item, future) for item, future in self._pending if not future.done()]
+        while self._pending and len(self._tasks) < self.max_in_flight:
+            batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+            task = asyncio.create_task(self._send(batch))
+            self._tasks.add(task)
+
+    async def _send(self, batch: List[Tuple[Any, asyncio.Future]]):
+        self.batches += 1
+        self.items += len(batch)
+        self.sizes[len(batch)] += 1
+        if self.on_batch is not None:
+            self.on_batch(len(batch))
+        try:
+            results = await self.send_batch([item for item, _ in batch])
+            if len(results) != len(batch):
+                raise ValueError(f"пакет из {len(batch)} запросов, а результатов {len(results)}")
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self._tasks.discard(asyncio.current_task())
+            # Освободился слот — накопившееся уходит сразу
+            if self._pending:
+                self._flush()
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def close(self):
+        """Отправить ожидающее и дождаться пакетов в полёте"""
+        self._flush()
+        while self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'batches': self.batches,
+            'items': self.items,
+            'mean_batch': self.items / self.batches if self.batches else 0.0,
+            'waiting': len(self._pending),
+            'sizes': dict(sorted(self.sizes.items())),
+        }
@@ -0,0 +1,108 @@
+"""Бенчмарк пакетной отправки запросов картинок: окно и размер пакета
+
+Фейковый HuggingFace считает картинку `--latency` секунд, каждый следующий
+промпт в пакете — ещё `--batch-cost` от этого времени, и одновременно
+держит не больше `--gpu-slots` вызовов — как эндпоинт на одном GPU.
+Промпты приходят равномерно с частотой `--rate` в секунду в течение
+`--seconds`; для каждого режима — сколько картинок в секунду выдано и
+p50/p99 времени от запроса до картинки. Первая строка — без пакетов,
+дальше — разные размеры пакета при окне 50 мс и разные окна при пакете 8.
+
+Запуск из корня репозитория:
+    python bench/bench_batching.py --rate 40 --seconds 3
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiohttp import web  # noqa: E402
+
+from batching import MicroBatcher  # noqa: E402
+from fake_inference import build_app  # noqa: E402
+from inference import InferenceClient, ModelConfig  # noqa: E402
+
+
+def percentile(values, share: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(0, int(len(ordered) * share) - 1)]
+
+
+async def run(client: InferenceClient, args, label: str, max_batch: int = 0, window: float = 0.0):
+    batcher = None
+    if max_batch:
+        batcher = MicroBatcher(lambda prompts: client.generate_media_batch('images', prompts),
+                               max_batch=max_batch, window=window, max_in_flight=args.concurrency)
+
+    latencies = []
+
+    async def one(i: int):
+        started = time.perf_counter()
+        prompt = f"картинка {i}"
+        if batcher is not None:
+            await batcher.submit(prompt)
+        else:
+            await client.generate_media('images', prompt)
+        latencies.append(time.perf_counter() - started)
+
+    total = int(args.rate * args.seconds)
+    tasks = []
+    started = time.perf_counter()
+    for i in range(total):
+        # Равномерный поток: i-й запрос приходит в момент i / rate
+        delay = started + i / args.rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(one(i)))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+
+    mean_batch = f", в среднем {batcher.stats()['mean_batch']:.1f} в пакете" if batcher is not None else ""
+    print(f"{label:>22}: {total / elapsed:5.1f} картинок/с, p50 {statistics.median(latencies) * 1000:6,.0f} мс, "
+          f"p99 {percentile(latencies, 0.99) * 1000:6,.0f} мс{mean_batch}")
+
+
+async def bench(args):
+    runner = web.AppRunner(build_app(latency=args.latency, loading=0, media_bytes=16 * 1024,
+                                     batch_cost=args.batch_cost, gpu_slots=args.gpu_slots))
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    client = InferenceClient("test", {
+        'images': ModelConfig('fake/sdxl', timeout=300, concurrency=args.concurrency),
+    }, base_url=f"http://127.0.0.1:{port}/models")
+
+    try:
+        print(f"{args.rate:g} промптов/с, картинка {args.latency * 1000:.0f} мс, "
+              f"следующая в пакете +{args.batch_cost:.0%}, GPU: {args.gpu_slots}")
+        await run(client, args, "без пакетов")
+        for max_batch in (2, 4, 8, 16):
+            await run(client, args, f"пакет {max_batch}, окно 50 мс", max_batch, 0.05)
+        for window in (0.0, 0.01, 0.1, 0.2):
+            await run(client, args, f"пакет 8, окно {window * 1000:.0f} мс", 8, window)
+    finally:
+        await client.close()
+        await runner.cleanup()
+
+
+def cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rate', type=float, default=40)
+    parser.add_argument('--seconds', type=float, default=3)
+    parser.add_argument('--latency', type=float, default=0.1)
+    parser.add_argument('--batch-cost', type=float, default=0.15)
+    parser.add_argument('--gpu-slots', type=int, default=1)
+    parser.add_argument('--concurrency', type=int, default=2, help="вызовов к модели одновременно, как в HF_MODELS")
+    args = parser.parse_args()
+    logging.disable(logging.ERROR)
+    asyncio.run(bench(args))
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,168 @@
+"""Бенчмарк рассылки: темп, оценка времени, продолжение после рестарта, отсев недоступных
+
+Локальный фейковый Bot API по HTTP отвечает 429 сверх общего лимита
+`--rate` и 403 заблокировавшим бота (каждый `--blocked-every`-й
+пользователь). Бот шлёт через OutboundScheduler с тем же лимитом, как в
+проде. База SQLite заполняется `--users` пользователями; на `--restart-at`
+доле рассылки Broadcaster останавливается, как при рестарте, и новый
+экземпляр продолжает её с контрольной точки. Параллельно идут
+интерактивные ответы в другие чаты — их задержка показывает, что рассылка
+не вытесняет пользователей. Вторая рассылка проверяет, что недоступные
+уже не получают отправок.
+
+Запуск из корня репозитория:
+    python bench/bench_broadcast.py --users 3000 --rate 200
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiogram import Bot  # noqa: E402
+from aiogram.client.session.aiohttp import AiohttpSession  # noqa: E402
+from aiogram.client.telegram import TelegramAPIServer  # noqa: E402
+from broadcast import Broadcaster, BroadcastStore  # noqa: E402
+from fake_bot_api import FakeBotAPI  # noqa: E402
+from outbound import OutboundScheduler  # noqa: E402
+from quota import QuotaStore, new_stats  # noqa: E402
+from storage import SQLiteStorage  # noqa: E402
+
+ADMIN_ID = 1
+# Чаты интерактивных ответов — вне базы рассылки
+INTERACTIVE_CHATS = range(10, 20)
+
+
+def percentile(values, share: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(0, int(len(ordered) * share) - 1)]
+
+
+async def interactive(bot: Bot, stop: asyncio.Event, latencies: list, interval: float = 0.1):
+    """Ответы пользователям по кругу чатов, пока идёт рассылка"""
+    for i in range(10 ** 9):
+        if stop.is_set():
+            return
+        started = time.perf_counter()
+        await bot.send_message(INTERACTIVE_CHATS[i % len(INTERACTIVE_CHATS)], "ответ")
+        latencies.append(time.perf_counter() - started)
+        await asyncio.sleep(interval)
+
+
+async def wait_processed(broadcaster: Broadcaster, broadcast_id: int, share: float, report_every: float = 1.0):
+    """Печатать прогресс, пока не обработана доля `share`
+
+    Возвращает прогноз окончания, сделанный на середине оставшегося
+    на момент вызова — чтобы сравнить его с фактическим.
+    """
+    predicted = None
+    halfway = None
+    next_report = time.monotonic()
+    while broadcaster.running:
+        progress = broadcaster.progress(broadcast_id)
+        if halfway is None:
+            halfway = (progress['processed'] + progress['total']) / 2
+        if predicted is None and progress['eta'] is not None and progress['processed'] >= halfway:
+            predicted = time.monotonic() + progress['eta']
+        if time.monotonic() >= next_report:
+            eta = f"{progress['eta']:.1f} с" if progress['eta'] is not None else "—"
+            print(f"  {progress['processed']:>6}/{progress['total']} — {progress['rate']:.0f} сообщ./с, "
+                  f"осталось {eta}, в полёте {progress['in_flight']}")
+            next_report += report_every
+        if progress['processed'] >= progress['total'] * share:
+            break
+        await asyncio.sleep(0.05)
+    return predicted
+
+
+async def bench(args):
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    users = list(range(1_000_000, 1_000_000 + args.users))
+    blocked = set(users[::args.blocked_every])
+
+    storage = SQLiteStorage(path)
+    for user_id in users:
+        storage.mark_stats(user_id, new_stats())
+    await storage.flush()
+    quotas = QuotaStore(backend=storage)
+
+    server = FakeBotAPI(latency=args.api_latency, blocked=blocked, global_rate=args.rate)
+    runner = await server.start()
+    port = runner.addresses[0][1]
+    bot = Bot("42:bench", session=AiohttpSession(api=TelegramAPIServer.from_base(f"http://127.0.0.1:{port}")))
+    outbound = OutboundScheduler(global_rate=args.rate)
+    bot.session.middleware(outbound)
+
+    latencies = []
+    stop = asyncio.Event()
+    pinger = asyncio.create_task(interactive(bot, stop, latencies))
+    try:
+        # Рассылка с рестартом посередине
+        broadcaster = Broadcaster(bot, BroadcastStore(path), quotas, concurrency=args.concurrency,
+                                  report_interval=3600)
+        started = time.monotonic()
+        broadcast = await broadcaster.launch(ADMIN_ID, ADMIN_ID, 1, "<b>Новые VIP лимиты!</b>")
+        await wait_processed(broadcaster, broadcast.id, args.restart_at)
+        await broadcaster.close()
+        print(f"  — рестарт: в контрольной точке {broadcast.sent + broadcast.blocked} из {broadcast.total}")
+
+        broadcaster = Broadcaster(bot, BroadcastStore(path), quotas, concurrency=args.concurrency,
+                                  report_interval=3600)
+        resumed = time.monotonic()
+        await broadcaster.start()
+        predicted = await wait_processed(broadcaster, broadcast.id, 1.1)
+        finished = time.monotonic()
+        elapsed = finished - started
+        await broadcaster.close()
+
+        reachable = [user_id for user_id in users if user_id not in blocked]
+        delivered = [server.replies[user_id] for user_id in reachable]
+        forecast = f"{predicted - resumed:.1f} с" if predicted is not None else "—"
+        print(f"рассылка: {len(reachable)} доставок за {elapsed:.1f} с — {len(reachable) / elapsed:.0f} сообщ./с "
+              f"при лимите {args.rate:.0f}; после рестарта заняла {finished - resumed:.1f} с, "
+              f"прогноз на её середине — {forecast}")
+        print(f"  не получили: {delivered.count(0)}, получили дважды: {sum(1 for n in delivered if n > 1)}, "
+              f"429 от Bot API: {server.errors[429]}, 403: {server.errors[403]} (заблокировали: {len(blocked)})")
+        print(f"  интерактивные ответы во время рассылки: p50 {statistics.median(latencies) * 1000:.0f} мс, "
+              f"p99 {percentile(latencies, 0.99) * 1000:.0f} мс, из {len(latencies)}")
+
+        # Вторая рассылка: недоступные отсеиваются до отправки
+        forbidden_before = server.errors[403]
+        broadcaster = Broadcaster(bot, BroadcastStore(path), quotas, concurrency=args.concurrency,
+                                  report_interval=3600)
+        started = time.monotonic()
+        second = await broadcaster.launch(ADMIN_ID, ADMIN_ID, 1, "Ещё новость")
+        await wait_processed(broadcaster, second.id, 1.1, report_every=3600)
+        elapsed = time.monotonic() - started
+        await broadcaster.close()
+        print(f"вторая рассылка: {elapsed:.1f} с, новых 403: {server.errors[403] - forbidden_before}, "
+              f"пропущено известных недоступных: {second.skipped}")
+    finally:
+        stop.set()
+        await pinger
+        await outbound.close()
+        await bot.session.close()
+        await quotas.close()
+        await runner.cleanup()
+
+
+def cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=3000)
+    parser.add_argument('--rate', type=float, default=200, help="общий лимит отправок в секунду")
+    parser.add_argument('--blocked-every', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--restart-at', type=float, default=0.4)
+    parser.add_argument('--api-latency', type=float, default=0.02)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    asyncio.run(bench(args))
+
+
+if __name__ == '__main__':
+    cli()
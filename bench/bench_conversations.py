@@ -0,0 +1,113 @@
+"""Бенчмарк памяти диалогов: память на диалог и время сборки промпта
+
+Сравнивается ConversationStore с наивной историей (все реплики в списке,
+промпт — склейка всей истории). Память — рост по tracemalloc на
+`--conversations` заполненных диалогов; сборка промпта — среднее время
+после 10, 100 и `--turns` обменов у одного пользователя.
+
+Запуск из корня репозитория:
+    python bench/bench_conversations.py --conversations 2000 --turns 2000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from conversations import ConversationStore  # noqa: E402
+
+WORDS = ("модель", "картинка", "музыка", "вопрос", "ответ", "нейросеть", "канал", "подписка",
+         "видео", "документ", "текст", "пример", "почему", "как", "сделать", "лучше")
+
+
+def phrase(words: int) -> str:
+    return " ".join(random.choice(WORDS) for _ in range(words))
+
+
+class NaiveHistory:
+    """Вся история без ограничений — то, от чего защищает ConversationStore"""
+
+    def __init__(self):
+        self._turns = {}
+
+    def append(self, user_id: int, question: str, answer: str):
+        self._turns.setdefault(user_id, []).append((question, answer))
+
+    def build_prompt(self, user_id: int, message: str) -> str:
+        parts = ["<s>"]
+        for question, answer in self._turns.get(user_id, ()):
+            parts.append(f"[INST] {question} [/INST] {answer}</s>")
+        parts.append(f"[INST] {message} [/INST]")
+        return "".join(parts)
+
+
+def exchanges(count: int):
+    return [(phrase(random.randint(5, 30)), phrase(random.randint(30, 150))) for _ in range(count)]
+
+
+def measure_memory(store, conversations: int, dialogue) -> float:
+    """Байт на диалог: рост памяти после заполнения `conversations` диалогов"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for user_id in range(conversations):
+        # Свои строки у каждого пользователя, как у настоящих сообщений
+        for question, answer in dialogue:
+            store.append(user_id, f"{question} {user_id}", f"{answer} {user_id}")
+    grown = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return grown / conversations
+
+
+def measure_prompt(store, dialogue, checkpoints, repeats: int = 200):
+    """Среднее время build_prompt (мкс) и длина промпта после каждого числа обменов"""
+    results = []
+    done = 0
+    for checkpoint in checkpoints:
+        for question, answer in dialogue[done:checkpoint]:
+            store.append(0, question, answer)
+        done = checkpoint
+        started = time.perf_counter()
+        for _ in range(repeats):
+            prompt = store.build_prompt(0, "новый вопрос")
+        results.append((checkpoint, (time.perf_counter() - started) / repeats * 1_000_000, len(prompt)))
+    return results
+
+
+def cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--conversations', type=int, default=2000)
+    parser.add_argument('--memory-turns', type=int, default=200, help="обменов в каждом диалоге для замера памяти")
+    parser.add_argument('--turns', type=int, default=2000, help="обменов у одного пользователя для замера промпта")
+    parser.add_argument('--budget', type=int, default=1024)
+    args = parser.parse_args()
+    random.seed(1)
+
+    dialogue = exchanges(max(args.memory_turns, args.turns))
+    stores = {
+        'бюджет': lambda: ConversationStore(args.budget, max_tokens=10 ** 12, idle_ttl=None),
+        'наивно': NaiveHistory,
+    }
+
+    for name, factory in stores.items():
+        per_conversation = measure_memory(factory(), args.conversations, dialogue[:args.memory_turns])
+        print(f"{name}: {per_conversation / 1024:,.1f} КиБ на диалог из {args.memory_turns} обменов "
+              f"({per_conversation * args.conversations / 1024 / 1024:,.1f} МиБ на {args.conversations})")
+
+    checkpoints = sorted({min(10, args.turns), min(100, args.turns), args.turns})
+    for name, factory in stores.items():
+        for turns, micros, length in measure_prompt(factory(), dialogue, checkpoints):
+            print(f"{name}: промпт после {turns:>5} обменов — {micros:,.1f} мкс, {length:,} символов")
+
+    # Общий лимит: диалоги сверх него вытесняются по давности
+    store = ConversationStore(args.budget, max_tokens=args.budget * 100, idle_ttl=None)
+    for user_id in range(args.conversations):
+        for question, answer in dialogue[:args.memory_turns]:
+            store.append(user_id, question, answer)
+    print(f"общий лимит {store.max_tokens:,} токенов: {store.stats()}")
+
+
+if __name__ == '__main__':
+    cli()
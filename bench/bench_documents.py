@@ -0,0 +1,85 @@
+"""Бенчмарк подготовки сканов к OCR: пропускная способность и пик памяти
+
+Синтетический скан (JPEG, строки текста с наклоном) прогоняется через
+prepare_image в пуле потоков. Для сравнения — наивный путь без draft и
+уменьшения: полное декодирование в RGB и перекодирование в PNG. Каждый
+режим идёт в отдельном процессе, чтобы пик RSS не смешивался.
+
+Запуск из корня репозитория:
+    python bench/bench_documents.py --documents 40 --workers 4
+"""
+import argparse
+import asyncio
+import io
+import multiprocessing
+import os
+import resource
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageDraw  # noqa: E402
+
+from documents import prepare_image  # noqa: E402
+
+
+def make_scan(width: int = 3000, height: int = 4000, angle: float = 3) -> bytes:
+    image = Image.new('L', (width, height), 255)
+    draw = ImageDraw.Draw(image)
+    for y in range(200, height - 200, 60):
+        for x in range(200, width - 200, 140):
+            draw.rectangle((x, y, x + 100, y + 20), fill=30)
+    image = image.rotate(angle, expand=True, fillcolor=255)
+    buffer = io.BytesIO()
+    image.convert('RGB').save(buffer, format='JPEG', quality=85)
+    return buffer.getvalue()
+
+
+def naive_prepare(data: bytes, max_side: int = 0) -> bytes:
+    image = Image.open(io.BytesIO(data)).convert('RGB')
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+async def run(prepare, scan: bytes, documents: int, workers: int):
+    executor = ThreadPoolExecutor(max_workers=workers)
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    results = await asyncio.gather(*(
+        loop.run_in_executor(executor, prepare, scan, 1600) for _ in range(documents)
+    ))
+    elapsed = time.perf_counter() - started
+    executor.shutdown()
+    return documents / elapsed, len(results[0])
+
+
+def measure(name: str, scan: bytes, documents: int, workers: int, queue):
+    baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    prepare = prepare_image if name == 'pipeline' else naive_prepare
+    throughput, output = asyncio.run(run(prepare, scan, documents, workers))
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline_kb
+    queue.put((name, len(scan), throughput, output, peak_kb))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--documents', type=int, default=40)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    scan = make_scan()
+    queue = multiprocessing.Queue()
+    for name in ('naive', 'pipeline'):
+        process = multiprocessing.Process(target=measure, args=(name, scan, args.documents, args.workers, queue))
+        process.start()
+        process.join()
+        name, scan_size, throughput, output, peak_kb = queue.get()
+        print(f"{name:>8}: {throughput:7.1f} док/с, скан {scan_size // 1024} КБ → "
+              f"{output // 1024} КБ в OCR, пик памяти +{peak_kb / 1024 / args.workers:.0f} МБ на документ в работе")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+"""Сквозной нагрузочный прогон бота: сценарии пользователей от апдейта до ответа
+
+Два режима:
+  inprocess — апдейты подаются через dp.feed_update, Bot API отвечает из
+              памяти (FakeSession); латентность — время обработки апдейта;
+  polling   — бот забирает апдейты через getUpdates у локального фейкового
+              Bot API сервера по HTTP; латентность — от появления апдейта на
+              сервере до последнего ответа бота на этот шаг.
+
+Отчёт: апдейтов в секунду, p50/p99 латентности, запросов к Bot API на апдейт.
+Планировщик исходящих (flood control) по умолчанию выключен: лимит 1
+сообщение/с на чат иначе задаёт всю латентность; включается --flood-control.
+
+Запуск из корня репозитория:
+    python bench/bench_e2e.py --users 200 --journey full --mode both
+"""
+import argparse
+import asyncio
+import itertools
+import logging
+import os
+import sys
+import tempfile
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+_workdir = tempfile.mkdtemp()
+os.environ.setdefault("DATABASE_PATH", os.path.join(_workdir, "bench.db"))
+os.environ.setdefault("RESULT_CACHE_DIR", os.path.join(_workdir, "media_cache"))
+os.environ.setdefault("TRACE_DIR", os.path.join(_workdir, "traces"))
+
+import main  # noqa: E402
+from aiogram.client.session.aiohttp import AiohttpSession  # noqa: E402
+from aiogram.client.telegram import TelegramAPIServer  # noqa: E402
+from aiogram.types import Update  # noqa: E402
+from fake_bot_api import FakeBotAPI  # noqa: E402
+from fake_session import FakeSession  # noqa: E402
+from traffic import JOURNEYS, TrafficReport, run_users  # noqa: E402
+
+
+def attach_middlewares(session, flood_control: bool):
+    """Те же middleware сессии, что у бота в main.py, на новую сессию"""
+    session.middleware(main.tracer)
+    if flood_control:
+        session.middleware(main.outbound)
+    session.middleware(main.api_calls)
+    session.middleware(main.bot_metrics)
+
+
+def print_report(mode: str, report: TrafficReport, updates_before: int, calls_before: int):
+    summary = report.summary()
+    updates = main.api_calls.updates - updates_before
+    calls = main.api_calls.update_calls - calls_before
+    print(f"{mode:>9}: апдейтов {summary['updates']} (ошибок {summary['errors']}) за {report.elapsed:.2f} с, "
+          f"{summary['updates_per_second']:,.0f} апдейтов/с")
+    print(f"{'':>9}  латентность p50 {summary['p50_ms']:.1f} мс, p99 {summary['p99_ms']:.1f} мс, "
+          f"запросов к Bot API на апдейт: {calls / updates if updates else 0:.2f}")
+
+
+async def run_inprocess(args, subscribers, first_user_id: int):
+    session = FakeSession(latency=args.api_latency, subscribers=subscribers)
+    attach_middlewares(session, args.flood_control)
+    main.bot.session = session
+    # Разные update_id обязательны: aiogram кэширует тип апдейта по его хэшу
+    update_ids = itertools.count(1)
+
+    async def deliver(user_id: int, update: dict, replies: int):
+        await main.dp.feed_update(main.bot, Update(update_id=next(update_ids), **update))
+
+    before = (main.api_calls.updates, main.api_calls.update_calls)
+    report = await run_users(deliver, args.users, JOURNEYS[args.journey], first_user_id)
+    print_report("inprocess", report, *before)
+
+
+async def run_polling(args, subscribers, first_user_id: int):
+    server = FakeBotAPI(latency=args.api_latency, subscribers=subscribers)
+    runner = await server.start()
+    port = runner.addresses[0][1]
+    session = AiohttpSession(api=TelegramAPIServer.from_base(f"http://127.0.0.1:{port}"))
+    attach_middlewares(session, args.flood_control)
+    main.bot.session = session
+
+    # Ответов бота в чат с начала прогона, которых ждём к концу текущего шага
+    expected = defaultdict(int)
+
+    async def deliver(user_id: int, update: dict, replies: int):
+        expected[user_id] += replies
+        server.push_update(update)
+        await server.wait_replies(user_id, expected[user_id])
+
+    polling = asyncio.create_task(main.dp.start_polling(
+        main.bot, polling_timeout=1, handle_signals=False, close_bot_session=False,
+        allowed_updates=main.dp.resolve_used_update_types(),
+    ))
+    before = (main.api_calls.updates, main.api_calls.update_calls)
+    try:
+        report = await run_users(deliver, args.users, JOURNEYS[args.journey], first_user_id)
+    finally:
+        await main.dp.stop_polling()
+        await polling
+        await session.close()
+        await runner.cleanup()
+    print_report("polling", report, *before)
+    print(f"{'':>9}  вызовы сервера: {dict(server.calls.most_common())}")
+
+
+async def run(args):
+    await main.user_limits.start()
+    # Первые subscribed_share пользователей подписаны на оба канала (VIP)
+    subscribed = int(args.users * args.subscribed_share)
+    try:
+        # У каждого режима свои пользователи: лимиты и состояния FSM не пересекаются
+        for index, mode in enumerate(('inprocess', 'polling')):
+            if args.mode not in (mode, 'both'):
+                continue
+            first_user_id = 1_000_000 * (index + 1)
+            subscribers = range(first_user_id, first_user_id + subscribed)
+            if mode == 'inprocess':
+                await run_inprocess(args, subscribers, first_user_id)
+            else:
+                await run_polling(args, subscribers, first_user_id)
+    finally:
+        await main.tracer.close()
+        await main.outbound.close()
+        await main.user_limits.close()
+
+
+def cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--journey', choices=sorted(JOURNEYS), default='full')
+    parser.add_argument('--mode', choices=('inprocess', 'polling', 'both'), default='both')
+    parser.add_argument('--api-latency', type=float, default=0.005)
+    parser.add_argument('--subscribed-share', type=float, default=0.5)
+    parser.add_argument('--flood-control', action='store_true')
+    args = parser.parse_args()
+    logging.disable(logging.ERROR)
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    cli()
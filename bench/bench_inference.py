@@ -0,0 +1,70 @@
+"""Бенчмарк клиента инференса против локального фейкового сервера
+
+Запуск из корня репозитория:
+    python bench/bench_inference.py --requests 2000 --concurrency 200 --latency 0.02
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiohttp import web  # noqa: E402
+
+from fake_inference import build_app  # noqa: E402
+from inference import InferenceClient, ModelConfig  # noqa: E402
+
+
+async def run(requests: int, concurrency: int, latency: float, model_concurrency: int):
+    runner = web.AppRunner(build_app(latency=latency, loading=3))
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = runner.addresses[0][1]
+
+    client = InferenceClient("test", {
+        'chat': ModelConfig('fake/chat', timeout=30, concurrency=model_concurrency),
+        'images': ModelConfig('fake/sdxl', timeout=30, concurrency=model_concurrency),
+    }, base_url=f"http://127.0.0.1:{port}/models")
+
+    latencies = []
+    gate = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with gate:
+            started = time.perf_counter()
+            if i % 4 == 0:
+                await client.generate_media('images', f"картинка {i}")
+            else:
+                await client.generate_text('chat', f"вопрос {i}")
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+
+    await client.close()
+    await runner.cleanup()
+
+    latencies.sort()
+    p50 = statistics.median(latencies)
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(f"запросов: {requests}, параллельно: {concurrency}, на модель: {model_concurrency}")
+    print(f"{requests / elapsed:,.0f} запросов/с, p50 {p50 * 1000:.1f} мс, p99 {p99 * 1000:.1f} мс")
+
+
+def cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.02)
+    parser.add_argument('--model-concurrency', type=int, default=32)
+    args = parser.parse_args()
+    asyncio.run(run(args.requests, args.concurrency, args.latency, args.model_concurrency))
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,107 @@
+"""Проверка подписок по событиям chat_member: после события getChatMember не нужен
+
+Для `--users` пользователей, которых Bot API считает неподписанными,
+сначала опрашивается статус (getChatMember, результат ложится в TTL-кэш),
+затем через dp.feed_update приходят события left→member по всем каналам
+из REQUIRED_CHANNELS. Следующий is_subscribed_all должен вернуть True без
+единого getChatMember — событие главнее закэшированного опроса. Затем
+события member→left должны так же без запросов вернуть False.
+
+Запуск из корня репозитория:
+    python bench/bench_membership.py --users 500
+"""
+import argparse
+import asyncio
+import itertools
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+_workdir = tempfile.mkdtemp()
+os.environ.setdefault("DATABASE_PATH", os.path.join(_workdir, "bench.db"))
+os.environ.setdefault("RESULT_CACHE_DIR", os.path.join(_workdir, "media_cache"))
+os.environ.setdefault("TRACE_DIR", os.path.join(_workdir, "traces"))
+
+import main  # noqa: E402
+from aiogram.types import Update  # noqa: E402
+from fake_session import FakeSession  # noqa: E402
+
+_update_ids = itertools.count(1)
+
+
+def channel_chat(channel_id: str) -> dict:
+    """Чат канала так, как его пришлёт Telegram: по @username или числовому id"""
+    if channel_id.startswith('@'):
+        return {'id': -1001000000000, 'type': 'channel', 'username': channel_id[1:]}
+    return {'id': int(channel_id), 'type': 'channel'}
+
+
+def member_update(user_id: int, channel_id: str, old: str, new: str) -> Update:
+    user = {'id': user_id, 'is_bot': False, 'first_name': 'user'}
+    return Update(update_id=next(_update_ids), chat_member={
+        'chat': channel_chat(channel_id), 'from': user, 'date': 1,
+        'old_chat_member': {'status': old, 'user': user},
+        'new_chat_member': {'status': new, 'user': user},
+    })
+
+
+async def feed_all(users, old: str, new: str) -> float:
+    """Подать события по всем каналам; время на событие, мс"""
+    updates = [member_update(user_id, channel['id'], old, new)
+               for user_id in users for channel in main.REQUIRED_CHANNELS]
+    started = time.perf_counter()
+    for update in updates:
+        await main.dp.feed_update(main.bot, update)
+    return (time.perf_counter() - started) / len(updates) * 1000
+
+
+async def check_all(users, session: FakeSession, expected: bool) -> int:
+    """Статусы всех пользователей; вернуть число getChatMember за проверку"""
+    before = session.calls['getChatMember']
+    results = await asyncio.gather(*(main.subscription_cache.is_subscribed_all(user_id) for user_id in users))
+    wrong = sum(1 for result in results if result is not expected)
+    assert not wrong, f"{wrong} из {len(users)} пользователей с неверным статусом (ждали {expected})"
+    return session.calls['getChatMember'] - before
+
+
+async def run(args):
+    # Bot API не знает ни одного подписчика: True возможен только из события
+    session = FakeSession(latency=args.api_latency, subscribers=())
+    main.bot.session = session
+    users = range(2_000_000, 2_000_000 + args.users)
+    await main.user_limits.start()
+    try:
+        polled = await check_all(users, session, expected=False)
+        print(f"опрос до событий: getChatMember {polled} "
+              f"(на {args.users} пользователей × {len(main.REQUIRED_CHANNELS)} каналов)")
+
+        per_event = await feed_all(users, 'left', 'member')
+        calls = await check_all(users, session, expected=True)
+        print(f"left→member: {per_event:.3f} мс на событие, getChatMember после: {calls}")
+        assert calls == 0, "после события chat_member статус снова запрошен у Bot API"
+
+        per_event = await feed_all(users, 'member', 'left')
+        calls = await check_all(users, session, expected=False)
+        print(f"member→left: {per_event:.3f} мс на событие, getChatMember после: {calls}")
+        assert calls == 0, "после события chat_member статус снова запрошен у Bot API"
+        print(f"кэш подписок: {main.subscription_cache.stats()}")
+    finally:
+        await main.tracer.close()
+        await main.outbound.close()
+        await main.user_limits.close()
+
+
+def cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--api-latency', type=float, default=0.002)
+    args = parser.parse_args()
+    logging.disable(logging.ERROR)
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    cli()
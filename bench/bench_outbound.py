@@ -0,0 +1,90 @@
+"""Бенчмарк исходящих сообщений под flood control
+
+Всплеск массовых сообщений по многим чатам и, поверх него, интерактивные
+ответы отправляются в сессию, которая, как Telegram, отвечает 429 при
+превышении лимитов. Без планировщика часть сообщений теряется; с ним
+всё доставляется на скорости насыщения, а интерактивные ответы
+обгоняют массовые.
+
+Запуск из корня репозитория:
+    python bench/bench_outbound.py --chats 120 --per-chat 2 --interactive 20
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from aiogram import Bot  # noqa: E402
+from aiogram.exceptions import TelegramRetryAfter  # noqa: E402
+
+from fake_session import RateLimitedSession  # noqa: E402
+from outbound import OutboundScheduler, bulk_priority  # noqa: E402
+
+
+async def send(bot: Bot, chat_id: int, latencies: list) -> bool:
+    started = time.perf_counter()
+    try:
+        await bot.send_message(chat_id, "🏛️ Artemius")
+    except TelegramRetryAfter:
+        return False
+    latencies.append(time.perf_counter() - started)
+    return True
+
+
+async def send_bulk(bot: Bot, chat_id: int, latencies: list) -> bool:
+    with bulk_priority():
+        return await send(bot, chat_id, latencies)
+
+
+async def run(chats: int, per_chat: int, interactive: int, scheduled: bool):
+    session = RateLimitedSession()
+    scheduler = OutboundScheduler()
+    if scheduled:
+        session.middleware(scheduler)
+    bot = Bot(token="42:TEST", session=session)
+
+    bulk_latencies, interactive_latencies = [], []
+    started = time.perf_counter()
+    bulk = [
+        asyncio.create_task(send_bulk(bot, chat_id, bulk_latencies))
+        for _ in range(per_chat) for chat_id in range(1, chats + 1)
+    ]
+    await asyncio.sleep(0.5)
+    # Интерактивные ответы новым пользователям посреди рассылки
+    replies = [
+        asyncio.create_task(send(bot, 100_000 + i, interactive_latencies))
+        for i in range(interactive)
+    ]
+    results = await asyncio.gather(*bulk, *replies)
+    elapsed = time.perf_counter() - started
+    await scheduler.close()
+
+    delivered = sum(results)
+    mode = "планировщик" if scheduled else "напрямую"
+    print(f"{mode:>11}: доставлено {delivered}/{len(results)} за {elapsed:.1f} с "
+          f"({delivered / elapsed:.1f} сообщ/с), 429 от API: {session.rejected}")
+    if interactive_latencies:
+        print(f"{'':>11}  интерактивные p50 {statistics.median(interactive_latencies) * 1000:.0f} мс, "
+              f"массовые p50 {statistics.median(bulk_latencies) * 1000:.0f} мс")
+    if scheduled:
+        print(f"{'':>11}  {scheduler.stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--chats', type=int, default=120)
+    parser.add_argument('--per-chat', type=int, default=2)
+    parser.add_argument('--interactive', type=int, default=20)
+    args = parser.parse_args()
+
+    asyncio.run(run(args.chats, args.per_chat, args.interactive, scheduled=False))
+    asyncio.run(run(args.chats, args.per_chat, args.interactive, scheduled=True))
+
+
+if __name__ == '__main__':
+    main()
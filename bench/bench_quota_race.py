@@ -0,0 +1,116 @@
+"""Бенчмарк резервирования лимита: сотни одновременных сообщений одного пользователя
+
+Сначала `--updates` резервов одного пользователя идут в хранилище лимитов
+одновременно, в обход планировщика апдейтов: списаться должно не больше
+лимита, упавшие вызовы бэкенда — вернуть единицу. Затем те же сообщения
+приходят через диспетчер в состоянии waiting_for_text: планировщик
+выполняет их по очереди, а сверх очереди пользователя отвечает «занято».
+
+Запуск из корня репозитория:
+    python bench/bench_quota_race.py --updates 500 --fail-rate 0.2
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_PATH", os.path.join(tempfile.mkdtemp(), "bench.db"))
+
+import main  # noqa: E402
+from aiogram.fsm.storage.base import StorageKey  # noqa: E402
+from fake_session import FakeSession, message_update  # noqa: E402
+
+
+async def race_reserves(updates: int, fail_rate: float, backend_latency: float):
+    """Одновременные резервы напрямую: атомарность списания и возвраты"""
+    user_id = 434343
+    limit = main.FREE_LIMITS['chat']
+    admitted = 0
+    refunded = 0
+
+    async def attempt():
+        nonlocal admitted, refunded
+        reservation = await main.user_limits.reserve(user_id, 'chat', limit)
+        if reservation is None:
+            return
+        admitted += 1
+        await asyncio.sleep(backend_latency)
+        if random.random() < fail_rate:
+            refunded += 1
+            await reservation.refund()
+        else:
+            await reservation.commit()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(attempt() for _ in range(updates)))
+    elapsed = time.perf_counter() - started
+
+    usage = await main.user_limits.get_usage(user_id)
+    stats = await main.user_limits.get_stats(user_id)
+    print(f"резервы напрямую: {updates} за {elapsed:.3f} с, лимит {limit}, допущено {admitted}, "
+          f"возвращено {refunded}")
+    print(f"  списано за день: {usage['chat']}, засчитано в статистику: {stats['total_messages']}")
+    assert admitted <= limit, "одновременные резервы проскочили лимит"
+    assert usage['chat'] == admitted - refunded, "возвраты не сошлись со списанием"
+    assert usage['chat'] == stats['total_messages'], "возвраты не сошлись со статистикой"
+
+
+async def run(updates: int, fail_rate: float, backend_latency: float):
+    await race_reserves(updates, fail_rate, backend_latency)
+
+    # Пользователь без подписок — базовый лимит
+    session = FakeSession(subscribers=())
+    main.bot.session = session
+    user_id = 424242
+    await main.dp.storage.set_state(
+        StorageKey(bot_id=main.bot.id, chat_id=user_id, user_id=user_id),
+        main.BotStates.waiting_for_text
+    )
+
+    backend_calls = 0
+
+    async def flaky_chat(prompt: str, user_id: int, language=None):
+        nonlocal backend_calls
+        backend_calls += 1
+        await asyncio.sleep(backend_latency)
+        if random.random() < fail_rate:
+            raise RuntimeError("бэкенд недоступен")
+        yield f"ответ на {prompt}"
+
+    main.chat_with_ai = flaky_chat
+
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        main.dp.feed_update(main.bot, message_update(user_id, f"вопрос {i}"))
+        for i in range(updates)
+    ))
+    elapsed = time.perf_counter() - started
+
+    usage = await main.user_limits.get_usage(user_id)
+    stats = await main.user_limits.get_stats(user_id)
+    limit = main.FREE_LIMITS['chat']
+    print(f"через диспетчер — апдейтов: {updates}, время: {elapsed:.3f} с ({updates / elapsed:,.0f} апдейтов/с)")
+    print(f"лимит: {limit}, вызовов бэкенда: {backend_calls}")
+    print(f"отклонено планировщиком: {main.update_scheduler.stats()['shed']}")
+    print(f"списано за день: {usage['chat']}, засчитано в статистику: {stats['total_messages']}")
+    assert usage['chat'] <= limit, "лимит превышен"
+    assert usage['chat'] == stats['total_messages'], "возвраты не сошлись со статистикой"
+
+
+def cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--updates', type=int, default=500)
+    parser.add_argument('--fail-rate', type=float, default=0.2)
+    parser.add_argument('--backend-latency', type=float, default=0.01)
+    args = parser.parse_args()
+    logging.disable(logging.ERROR)
+    asyncio.run(run(args.updates, args.fail_rate, args.backend_latency))
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,116 @@
+"""Проверка хранилища в Redis: атомарность лимитов, возврат, FSM между процессами
+
+Redis — в памяти (fakeredis; Lua-скрипты исполняет lupa), два «процесса
+бота» — два клиента к одному серверу, как воркеры шардов к общему Redis:
+  гонка   — `--concurrency` одновременных reserve одного пользователя через
+            оба клиента при лимите `--limit`: пропущено ровно `--limit`,
+            счётчик дня равен числу пропущенных;
+  возврат — refund возвращает единицу и её снова можно занять, лишний
+            release не уводит счётчик в минус, commit засчитывается в
+            статистику;
+  FSM     — состояние и данные, записанные одним процессом, видит другой.
+
+Зависимости сверх requirements.txt: pip install fakeredis lupa
+
+Запуск из корня репозитория:
+    python bench/bench_redis.py --concurrency 50 --limit 3
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiogram.fsm.storage.base import StorageKey  # noqa: E402
+from fakeredis import FakeServer  # noqa: E402
+from fakeredis.aioredis import FakeRedis  # noqa: E402
+from quota import FEATURE_STATS, msk_day  # noqa: E402
+from redis_storage import create_redis_storage  # noqa: E402
+
+FEATURE = 'chat'
+
+
+async def race(processes, user_id: int, concurrency: int, limit: int):
+    quotas = [process['quotas'] for process in processes]
+    started = time.perf_counter()
+    reservations = await asyncio.gather(*(
+        quotas[i % len(quotas)].reserve(user_id, FEATURE, limit) for i in range(concurrency)
+    ))
+    elapsed = time.perf_counter() - started
+    admitted = [reservation for reservation in reservations if reservation is not None]
+    used = (await quotas[0].get_usage(user_id))[FEATURE]
+    print(f"гонка: {concurrency} reserve за {elapsed * 1000:.1f} мс, пропущено {len(admitted)} "
+          f"при лимите {limit}, счётчик дня {used}")
+    assert len(admitted) == min(limit, concurrency), "лимит пропустил больше или меньше, чем разрешено"
+    assert used == len(admitted), "счётчик дня разошёлся с числом пропущенных"
+    return admitted
+
+
+async def refund(processes, user_id: int, admitted, limit: int):
+    first, second = (process['quotas'] for process in processes)
+    await admitted[0].refund()
+    await admitted[0].refund()
+    used = (await second.get_usage(user_id))[FEATURE]
+    assert used == len(admitted) - 1, "refund вернул не одну единицу"
+
+    again = await second.reserve(user_id, FEATURE, limit)
+    assert again is not None, "возвращённую единицу не удалось занять снова"
+    assert await first.reserve(user_id, FEATURE, limit) is None, "после повторного занятия лимит не исчерпан"
+
+    for reservation in (again, *admitted[1:]):
+        await reservation.commit()
+    stats = await first.get_stats(user_id)
+    assert stats[FEATURE_STATS[FEATURE]] == len(admitted), "commit не засчитан в статистику"
+
+    # Лишние release (например, возврат после сброса дня) не уходят в минус
+    day = msk_day()
+    for _ in range(limit + 2):
+        await first.release(user_id, FEATURE, day)
+    used = (await second.get_usage(user_id))[FEATURE]
+    assert used == 0, f"счётчик ушёл в минус: {used}"
+    assert await second.reserve(user_id, FEATURE, limit) is not None
+    print(f"возврат: повторный refund не учтён, единица занята снова, "
+          f"в статистике {stats[FEATURE_STATS[FEATURE]]}, лишние release не уводят в минус")
+
+
+async def fsm(processes, user_id: int):
+    first, second = (process['fsm'] for process in processes)
+    key = StorageKey(bot_id=42, chat_id=user_id, user_id=user_id)
+    await first.set_state(key, "BotStates:waiting_for_text")
+    await first.set_data(key, {'feature': FEATURE, 'attempt': 1})
+    assert await second.get_state(key) == "BotStates:waiting_for_text", "состояние не видно другому процессу"
+    assert await second.get_data(key) == {'feature': FEATURE, 'attempt': 1}, "данные не видны другому процессу"
+
+    await second.set_state(key, None)
+    await second.set_data(key, {})
+    assert await first.get_state(key) is None and await first.get_data(key) == {}, "сброс не виден"
+    print("FSM: состояние и данные общие для процессов, сброс виден обоим")
+
+
+async def run(args):
+    server = FakeServer()
+    processes = [create_redis_storage("", redis=FakeRedis(server=server)) for _ in range(2)]
+    user_id = 4242
+    try:
+        admitted = await race(processes, user_id, args.concurrency, args.limit)
+        await refund(processes, user_id, admitted, args.limit)
+        await fsm(processes, user_id)
+    finally:
+        for process in processes:
+            await process['fsm'].close()
+
+
+def cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--limit', type=int, default=3)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,132 @@
+"""Бенчмарк планировщика апдейтов: латентность при кратной перегрузке
+
+Пользователи в состоянии waiting_for_image_prompt присылают промпты с
+постоянной частотой; бэкенд генерации обслуживает ограниченное число
+запросов одновременно (`--backend-slots` по `--backend-latency` секунд).
+Нагрузка 1× ниже пропускной способности бэкенда, 10× — в десять раз выше.
+Без ограничений очередь к бэкенду растёт весь прогон, и латентность растёт
+вместе с ней; с планировщиком бесплатные генерации сверх очереди получают
+«занято», и p99 остаётся ограниченным.
+
+Запуск из корня репозитория:
+    python bench/bench_scheduler.py --rate 60 --seconds 3
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_PATH", os.path.join(tempfile.mkdtemp(), "bench.db"))
+
+import main  # noqa: E402
+from aiogram.fsm.storage.base import StorageKey  # noqa: E402
+from fake_session import FakeSession, message_update  # noqa: E402
+from scheduling import UpdateScheduler  # noqa: E402
+
+USERS = 5000
+FIRST_USER_ID = 2_000_000
+
+
+def percentile(values, share: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(0, int(len(ordered) * share) - 1)] if ordered else 0.0
+
+
+async def run(args, multiplier: int, scheduled: bool):
+    # Свой планировщик на прогон: либо настройки из аргументов, либо без ограничений
+    if scheduled:
+        scheduler = UpdateScheduler(args.concurrency, shed_queue=args.shed_queue, max_queue=args.max_queue,
+                                    sheddable=main.is_sheddable, on_shed=main.reply_busy)
+    else:
+        scheduler = UpdateScheduler(10 ** 9, shed_queue=10 ** 9, max_queue=10 ** 9, max_user_queue=10 ** 9)
+    main.update_scheduler.__dict__.update(scheduler.__dict__)
+
+    backend = asyncio.Semaphore(args.backend_slots)
+
+    async def limited_backend(prompt: str, user_id: int, language=None) -> str:
+        async with backend:
+            await asyncio.sleep(args.backend_latency)
+        return f"🎨 {prompt}"
+
+    main.generate_image = limited_backend
+
+    latencies = {'vip': [], 'free': []}
+    vip_users = set(main.bot.session.subscribers)
+
+    async def send(user_id: int, text: str):
+        started = time.perf_counter()
+        await main.dp.feed_update(main.bot, message_update(user_id, text))
+        latencies['vip' if user_id in vip_users else 'free'].append(time.perf_counter() - started)
+
+    rate = args.rate * multiplier
+    total = int(rate * args.seconds)
+    tasks = []
+    started = time.perf_counter()
+    for i in range(total):
+        # Равномерный поток: i-й апдейт приходит в момент i / rate
+        delay = started + i / rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        user_id = FIRST_USER_ID + random.randrange(USERS)
+        tasks.append(asyncio.create_task(send(user_id, f"картинка {i}")))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+
+    stats = main.update_scheduler.stats()
+    everyone = latencies['vip'] + latencies['free']
+    mode = "планировщик" if scheduled else "без ограничений"
+    print(f"{multiplier:>3}× {mode:>15}: {total} апдейтов за {elapsed:.1f} с, "
+          f"p50 {statistics.median(everyone) * 1000:,.0f} мс, p99 {percentile(everyone, 0.99) * 1000:,.0f} мс, "
+          f"VIP p99 {percentile(latencies['vip'], 0.99) * 1000:,.0f} мс, "
+          f"отклонено {sum(stats['shed'].values())}, макс. очередь {stats['max_waiting']}")
+
+
+async def prepare(args):
+    # Лимиты не должны мешать: меряем очередь, а не дневные квоты
+    for limits in (main.FREE_LIMITS, main.VIP_LIMITS):
+        for feature in limits:
+            limits[feature] = 10 ** 6
+    vip = random.sample(range(FIRST_USER_ID, FIRST_USER_ID + USERS), int(USERS * args.vip_share))
+    main.bot.session = FakeSession(latency=args.api_latency, subscribers=vip)
+    for user_id in range(FIRST_USER_ID, FIRST_USER_ID + USERS):
+        await main.dp.storage.set_state(
+            StorageKey(bot_id=main.bot.id, chat_id=user_id, user_id=user_id),
+            main.BotStates.waiting_for_image_prompt
+        )
+
+
+async def bench(args):
+    await main.user_limits.start()
+    try:
+        await prepare(args)
+        for multiplier in (1, 10):
+            for scheduled in (False, True):
+                await run(args, multiplier, scheduled)
+    finally:
+        await main.user_limits.close()
+
+
+def cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rate', type=float, default=60, help="апдейтов в секунду при нагрузке 1×")
+    parser.add_argument('--seconds', type=float, default=3)
+    parser.add_argument('--backend-slots', type=int, default=8)
+    parser.add_argument('--backend-latency', type=float, default=0.1)
+    parser.add_argument('--api-latency', type=float, default=0.005)
+    parser.add_argument('--vip-share', type=float, default=0.1)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--shed-queue', type=int, default=32)
+    parser.add_argument('--max-queue', type=int, default=256)
+    args = parser.parse_args()
+    logging.disable(logging.ERROR)
+    asyncio.run(bench(args))
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,75 @@
+"""Бенчмарк шардов: апдейтов в секунду в зависимости от числа процессов-воркеров
+
+Роутер (ShardRouter) раздаёт заранее подготовленные апдейты сценариев
+пользователей воркерам по user_id и ждёт, пока все они обработаны. Воркеры —
+бот из main.py с Bot API в памяти (bench/shard_worker.py), так что меряется
+работа самого бота: разбор апдейтов, хендлеры, тексты, клавиатуры.
+
+Запуск из корня репозитория:
+    python bench/bench_shards.py --users 500 --workers 1 2 4
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shards import ShardRouter  # noqa: E402
+from traffic import JOURNEYS, message_update  # noqa: E402
+
+WORKER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "shard_worker.py")
+
+
+def build_updates(users: int, journey_name: str):
+    updates = []
+    for text, _ in JOURNEYS[journey_name]:
+        for user in range(users):
+            update = message_update(1_000_000 + user, text)
+            update['update_id'] = len(updates) + 1
+            updates.append(update)
+    return updates
+
+
+async def run(workers: int, updates):
+    workdir = tempfile.mkdtemp()
+    env = dict(os.environ, DATABASE_PATH=os.path.join(workdir, "bench.db"),
+               RESULT_CACHE_DIR=os.path.join(workdir, "media_cache"), METRICS_PORT="0")
+    router = ShardRouter(workers, [sys.executable, WORKER], env=env)
+    await router.start()
+    try:
+        # Прогрев: первый апдейт в каждом воркере строит схемы pydantic
+        for index in range(workers):
+            await router.route(message_update(index, "/start") | {'update_id': 0})
+        await router.drain()
+        router.routed = [0] * workers
+
+        started = time.perf_counter()
+        for update in updates:
+            await router.route(update)
+        await router.drain()
+        elapsed = time.perf_counter() - started
+    finally:
+        await router.close()
+    print(f"воркеров: {workers}, апдейтов: {len(updates)} за {elapsed:.2f} с "
+          f"({len(updates) / elapsed:,.0f} апдейтов/с), по шардам: {router.routed}")
+
+
+def cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--journey', choices=sorted(JOURNEYS), default='full')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    print(f"ядер: {os.cpu_count()}")
+    updates = build_updates(args.users, args.journey)
+    for workers in args.workers:
+        asyncio.run(run(workers, updates))
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,88 @@
+"""Бенчмарк записи счётчиков: с пакетной отложенной записью и без неё
+
+После замера — проверка закрытия посреди записи: `--close-rounds` раз
+фоновая запись получает большой пакет, и close вызывается, пока пакет
+пишется в потоке. close должен завершиться (не зависнуть на отмене) и
+не закрыть соединение под идущей транзакцией, а после повторного
+открытия на диске должны быть все записи.
+
+Запуск из корня репозитория:
+    python bench/bench_storage.py --increments 20000 --users 1000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from quota import FEATURES, QuotaStore, new_stats  # noqa: E402
+from storage import SQLiteStorage  # noqa: E402
+
+
+async def run(increments: int, users: int, batched: bool) -> float:
+    with tempfile.TemporaryDirectory() as tmp:
+        storage = SQLiteStorage(os.path.join(tmp, 'bench.db'))
+        quotas = QuotaStore(backend=storage)
+        if batched:
+            storage.start()
+
+        started = time.perf_counter()
+        for i in range(increments):
+            await quotas.increment(i % users, FEATURES[i % len(FEATURES)])
+            if batched:
+                # Даём фоновой записи шанс отработать, как между апдейтами
+                if i % 100 == 0:
+                    await asyncio.sleep(0)
+            else:
+                await storage.flush()
+        await storage.close()
+        elapsed = time.perf_counter() - started
+    return increments / elapsed
+
+
+async def close_while_writing(users: int, rounds: int):
+    for round_ in range(rounds):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'bench.db')
+            storage = SQLiteStorage(path, flush_interval=3600, flush_threshold=users)
+            storage.start()
+            for user_id in range(users):
+                stats = new_stats()
+                stats['total_messages'] = round_ + 1
+                storage.mark_stats(user_id, stats)
+            # Порог достигнут — ждём, пока пакет уйдёт в поток записи
+            while not storage._flushing_stats:
+                await asyncio.sleep(0)
+            # Хвост, пришедший во время записи, допишет финальный флаш
+            storage.mark_stats(users, new_stats())
+            await asyncio.wait_for(storage.close(), timeout=30)
+
+            reopened = SQLiteStorage(path)
+            saved = await reopened.count_users()
+            sample = await reopened.load_stats(users // 2)
+            await reopened.close()
+            assert saved == users + 1, f"после закрытия посреди записи на диске {saved} из {users + 1}"
+            assert sample['total_messages'] == round_ + 1
+    print(f"{'закрытие посреди записи':>24}: {rounds} раз, пакет {users} записей — без зависаний и потерь")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--increments', type=int, default=20000)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--close-rounds', type=int, default=20)
+    parser.add_argument('--close-batch', type=int, default=20000)
+    args = parser.parse_args()
+
+    for batched in (False, True):
+        rate = await run(args.increments, args.users, batched)
+        mode = 'пакетная запись' if batched else 'транзакция на инкремент'
+        print(f"{mode:>24}: {rate:>12,.0f} инкрементов/с")
+    await close_while_writing(args.close_batch, args.close_rounds)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
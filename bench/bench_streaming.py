@@ -0,0 +1,139 @@
+"""Бенчмарк потоковых ответов чата: когда пользователь видит первый текст ответа
+
+Локальный фейковый HuggingFace отдаёт `--tokens` слов по `--token-interval`
+секунд (потоком или целиком в конце); Bot API — FakeSession за
+OutboundScheduler, как у бота, поэтому правки упираются в лимит на чат.
+Сравниваются режимы с потоком и без: время до первого видимого текста
+ответа, время до полного ответа, правки и сообщения на ответ, длина
+сообщений и правки с незакрытой разметкой.
+
+Запуск из корня репозитория:
+    python bench/bench_streaming.py --users 20 --tokens 500 --token-interval 0.01
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_PATH", os.path.join(tempfile.mkdtemp(), "bench.db"))
+
+import main  # noqa: E402
+from aiogram.fsm.storage.base import StorageKey  # noqa: E402
+from aiogram.methods import EditMessageText, SendMessage  # noqa: E402
+from aiohttp import web  # noqa: E402
+from delivery import _utf16_len, markdown_state  # noqa: E402
+from fake_inference import build_app  # noqa: E402
+from fake_session import FakeSession, message_update  # noqa: E402
+from inference import InferenceClient, ModelConfig  # noqa: E402
+
+
+class RecordingSession(FakeSession):
+    """FakeSession, которая запоминает, что и когда видел каждый чат"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.first_answer = {}
+        self.edits = defaultdict(int)
+        self.messages = defaultdict(int)
+        self.max_length = 0
+        self.unbalanced = 0
+
+    async def make_request(self, bot, method, timeout=None):
+        result = await super().make_request(bot, method, timeout)
+        if isinstance(method, (SendMessage, EditMessageText)):
+            chat_id = method.chat_id
+            text = method.text
+            self.max_length = max(self.max_length, _utf16_len(text))
+            if markdown_state(text)[0] is not None:
+                self.unbalanced += 1
+            if isinstance(method, EditMessageText):
+                self.edits[chat_id] += 1
+            else:
+                self.messages[chat_id] += 1
+            if "Artemius:" in text and chat_id not in self.first_answer:
+                self.first_answer[chat_id] = time.perf_counter()
+        return result
+
+
+def percentile(values, share: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(0, int(len(ordered) * share) - 1)]
+
+
+async def run(args, streaming: bool, first_user_id: int):
+    main.CHAT_STREAMING = streaming
+    session = RecordingSession(latency=args.api_latency)
+    session.middleware(main.outbound)
+    main.bot.session = session
+
+    users = range(first_user_id, first_user_id + args.users)
+    for user_id in users:
+        await main.dp.storage.set_state(
+            StorageKey(bot_id=main.bot.id, chat_id=user_id, user_id=user_id), main.BotStates.waiting_for_text
+        )
+
+    sent_at = {}
+    done_at = {}
+
+    async def ask(user_id: int):
+        sent_at[user_id] = time.perf_counter()
+        await main.dp.feed_update(main.bot, message_update(user_id, "расскажи длинную историю"))
+        done_at[user_id] = time.perf_counter()
+
+    await asyncio.gather(*(ask(user_id) for user_id in users))
+
+    first = [session.first_answer[user_id] - sent_at[user_id] for user_id in users]
+    full = [done_at[user_id] - sent_at[user_id] for user_id in users]
+    mode = "поток" if streaming else "целиком"
+    print(f"{mode:>8}: первый текст p50 {statistics.median(first) * 1000:,.0f} мс, "
+          f"p99 {percentile(first, 0.99) * 1000:,.0f} мс; полный ответ p50 {statistics.median(full) * 1000:,.0f} мс")
+    print(f"{'':>8}  правок на ответ {sum(session.edits.values()) / args.users:.1f}, "
+          f"сообщений на ответ {sum(session.messages.values()) / args.users:.1f}, "
+          f"макс. длина {session.max_length}, с незакрытой разметкой {session.unbalanced}")
+
+
+async def bench(args):
+    runner = web.AppRunner(build_app(latency=args.latency, loading=0, tokens=args.tokens,
+                                     token_interval=args.token_interval))
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    main.inference = InferenceClient("test", {
+        'chat': ModelConfig('fake/chat', timeout=120, concurrency=args.users),
+    }, base_url=f"http://127.0.0.1:{port}/models")
+    main.FREE_LIMITS['chat'] = main.VIP_LIMITS['chat'] = 10 ** 6
+    main.STREAM_EDIT_INTERVAL = args.edit_interval
+
+    await main.user_limits.start()
+    try:
+        await run(args, streaming=False, first_user_id=3_000_000)
+        await run(args, streaming=True, first_user_id=4_000_000)
+    finally:
+        await main.user_limits.close()
+        await main.outbound.close()
+        await main.inference.close()
+        await runner.cleanup()
+
+
+def cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--tokens', type=int, default=500)
+    parser.add_argument('--token-interval', type=float, default=0.01)
+    parser.add_argument('--latency', type=float, default=0.05, help="задержка модели до первого слова")
+    parser.add_argument('--api-latency', type=float, default=0.005)
+    parser.add_argument('--edit-interval', type=float, default=main.STREAM_EDIT_INTERVAL)
+    args = parser.parse_args()
+    logging.disable(logging.ERROR)
+    asyncio.run(bench(args))
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,122 @@
+"""Проверка вебхука: секретный заголовок, доставка апдейта в диспетчер, /health
+
+Приложения из webhook.py поднимаются тестовым клиентом aiohttp на
+локальном порту, Bot API отвечает из памяти (FakeSession):
+  build_app        — POST без X-Telegram-Bot-Api-Secret-Token или с чужим
+                     получает 401 и до диспетчера не доходит; с верным —
+                     200, и /start доходит до хендлера (бот отвечает в чат);
+  build_router_app — то же для роутера шардов: 401 без секрета, с секретом
+                     апдейт передаётся в route;
+  /health          — 200 и {"status": "ok"} у обоих.
+Затем `--updates` апдейтов подряд: сколько вебхук принимает в секунду.
+
+Запуск из корня репозитория:
+    python bench/bench_webhook.py --updates 500
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+_workdir = tempfile.mkdtemp()
+os.environ.setdefault("DATABASE_PATH", os.path.join(_workdir, "bench.db"))
+os.environ.setdefault("RESULT_CACHE_DIR", os.path.join(_workdir, "media_cache"))
+os.environ.setdefault("TRACE_DIR", os.path.join(_workdir, "traces"))
+
+import main  # noqa: E402
+from aiohttp.test_utils import TestClient, TestServer  # noqa: E402
+from fake_session import FakeSession, message_update  # noqa: E402
+from webhook import build_app, build_router_app  # noqa: E402
+
+SECRET = "bench-secret"
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def start_update(user_id: int) -> dict:
+    return message_update(user_id, "/start").model_dump(mode='json', exclude_none=True)
+
+
+async def wait_calls(session: FakeSession, method: str, count: int, timeout: float = 5.0):
+    """Обработка идёт в фоне после ответа 200 — ждём, пока бот ответит"""
+    deadline = time.monotonic() + timeout
+    while session.calls[method] < count:
+        assert time.monotonic() < deadline, f"{method}: {session.calls[method]} из {count} за {timeout} с"
+        await asyncio.sleep(0.01)
+
+
+async def check_health(client: TestClient, name: str):
+    response = await client.get("/health")
+    assert response.status == 200 and await response.json() == {"status": "ok"}, f"{name}: /health не отвечает"
+
+
+async def check_bot_app(session: FakeSession, updates: int):
+    async with TestClient(TestServer(build_app(main.dp, main.bot, secret_token=SECRET))) as client:
+        await check_health(client, "build_app")
+
+        for headers in ({}, {SECRET_HEADER: "wrong"}):
+            response = await client.post("/webhook", json=start_update(3_000_000), headers=headers)
+            assert response.status == 401, f"запрос с заголовками {headers} получил {response.status}"
+        await asyncio.sleep(0.1)
+        assert not session.calls['sendMessage'], "апдейт без секрета дошёл до хендлера"
+
+        response = await client.post("/webhook", json=start_update(3_000_001), headers={SECRET_HEADER: SECRET})
+        assert response.status == 200, f"апдейт с секретом получил {response.status}"
+        await wait_calls(session, 'sendMessage', 1)
+        print("build_app: без секрета и с чужим — 401, с верным — 200 и ответ бота, /health — 200")
+
+        sent = session.calls['sendMessage']
+        started = time.perf_counter()
+        for i in range(updates):
+            response = await client.post("/webhook", json=start_update(3_100_000 + i),
+                                         headers={SECRET_HEADER: SECRET})
+            assert response.status == 200
+        accepted = time.perf_counter() - started
+        await wait_calls(session, 'sendMessage', sent + updates, timeout=30)
+        handled = time.perf_counter() - started
+        print(f"  {updates} апдейтов: приняты за {accepted:.2f} с ({updates / accepted:,.0f}/с), "
+              f"обработаны за {handled:.2f} с ({updates / handled:,.0f}/с)")
+
+
+async def check_router_app():
+    routed = []
+
+    async def route(update: dict):
+        routed.append(update['update_id'])
+
+    async with TestClient(TestServer(build_router_app(route, secret_token=SECRET))) as client:
+        await check_health(client, "build_router_app")
+        update = start_update(3_200_000)
+        response = await client.post("/webhook", json=update)
+        assert response.status == 401 and not routed, "роутер принял апдейт без секрета"
+        response = await client.post("/webhook", json=update, headers={SECRET_HEADER: SECRET})
+        assert response.status == 200 and routed == [update['update_id']], "роутер не передал апдейт"
+    print("build_router_app: без секрета — 401, с секретом — 200 и апдейт в route, /health — 200")
+
+
+async def run(args):
+    session = FakeSession()
+    main.bot.session = session
+    await main.user_limits.start()
+    try:
+        await check_bot_app(session, args.updates)
+        await check_router_app()
+    finally:
+        await main.tracer.close()
+        await main.outbound.close()
+        await main.user_limits.close()
+
+
+def cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--updates', type=int, default=500)
+    args = parser.parse_args()
+    logging.disable(logging.ERROR)
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,187 @@
+"""Локальный фейковый Telegram Bot API сервер
+
+Отвечает на getMe, getUpdates (long polling из очереди апдейтов),
+getChatMember (по списку подписчиков), sendMessage, editMessageText,
+deleteMessage, sendChatAction, answerCallbackQuery и отправку медиа —
+с настраиваемой задержкой. Как настоящий Telegram, отвечает 403 в чаты
+заблокировавших бота и 429 сверх общего лимита `global_rate`. Апдейты в очередь кладёт генератор трафика
+через `push_update`; он же ждёт ответов бота в чат через `wait_replies`.
+"""
+import asyncio
+import itertools
+import json
+import math
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterable, List, Optional
+
+from aiohttp import web
+
+from outbound import LIMITED_METHODS, TokenBucket
+
+# Ответы, которые видит пользователь: по ним генератор трафика понимает,
+# что шаг сценария обработан
+REPLY_METHODS = frozenset({'sendMessage', 'editMessageText', 'sendPhoto', 'sendAudio', 'sendVideo'})
+
+
+class APIError(Exception):
+    """Ответ Bot API с ошибкой: код, описание и параметры (retry_after)"""
+
+    def __init__(self, code: int, description: str, parameters: Optional[dict] = None):
+        super().__init__(description)
+        self.code = code
+        self.description = description
+        self.parameters = parameters
+
+
+class FakeBotAPI:
+    """Состояние фейкового Bot API: очередь апдейтов, подписчики, счётчики"""
+
+    def __init__(self, latency: float = 0.0, subscribers: Optional[Iterable[int]] = None,
+                 bot_id: int = 42, blocked: Iterable[int] = (), global_rate: Optional[float] = None):
+        self.latency = latency
+        # None — подписаны все; иначе множество подписанных user_id
+        self.subscribers = set(subscribers) if subscribers is not None else None
+        self.bot_id = bot_id
+        # Чаты пользователей, заблокировавших бота
+        self.blocked = set(blocked)
+        # None — без общего лимита на отправку
+        self._global = TokenBucket(global_rate, global_rate) if global_rate else None
+        self.calls: Counter = Counter()
+        self.errors: Counter = Counter()
+        self.replies: Dict[int, int] = defaultdict(int)
+        self._reply_events: Dict[int, asyncio.Event] = {}
+        self._updates: List[dict] = []
+        self._new_updates = asyncio.Event()
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1000)
+
+    # Апдейты
+
+    def push_update(self, update: dict) -> int:
+        update_id = next(self._update_ids)
+        update['update_id'] = update_id
+        self._updates.append(update)
+        self._new_updates.set()
+        return update_id
+
+    async def _get_updates(self, params: Dict[str, Any]) -> List[dict]:
+        offset = int(params.get('offset') or 0)
+        timeout = float(params.get('timeout') or 0)
+        limit = int(params.get('limit') or 100)
+        if offset:
+            # Всё до offset бот подтвердил
+            self._updates = [update for update in self._updates if update['update_id'] >= offset]
+        if not self._updates and timeout:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self._updates[:limit]
+
+    # Ответы бота
+
+    def _record_reply(self, chat_id: int):
+        self.replies[chat_id] += 1
+        event = self._reply_events.pop(chat_id, None)
+        if event is not None:
+            event.set()
+
+    async def wait_replies(self, chat_id: int, count: int):
+        """Дождаться, пока бот отправит в чат `count` ответов с начала работы"""
+        while self.replies[chat_id] < count:
+            event = self._reply_events.setdefault(chat_id, asyncio.Event())
+            await event.wait()
+
+    def _message(self, chat_id: int, text: Optional[str] = None, message_id: Optional[int] = None) -> dict:
+        message = {
+            'message_id': message_id or next(self._message_ids),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': {'id': self.bot_id, 'is_bot': True, 'first_name': 'bot'},
+        }
+        if text is not None:
+            message['text'] = text
+        return message
+
+    def _user(self, user_id: int) -> dict:
+        return {'id': user_id, 'is_bot': False, 'first_name': 'user'}
+
+    async def _call(self, method: str, params: Dict[str, Any]) -> Any:
+        if method == 'getUpdates':
+            return await self._get_updates(params)
+
+        self.calls[method] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if method == 'getMe':
+            return {'id': self.bot_id, 'is_bot': True, 'first_name': 'bot', 'username': 'artemius_bot'}
+        if method == 'getChatMember':
+            user_id = int(params['user_id'])
+            subscribed = self.subscribers is None or user_id in self.subscribers
+            return {'status': 'member' if subscribed else 'left', 'user': self._user(user_id)}
+
+        chat_id = params.get('chat_id')
+        chat_id = int(chat_id) if chat_id is not None else 0
+        if method in LIMITED_METHODS:
+            self._check_limits(chat_id)
+        if method in REPLY_METHODS:
+            self._record_reply(chat_id)
+        if method in ('sendMessage', 'editMessageText'):
+            message_id = params.get('message_id')
+            return self._message(chat_id, params.get('text'), int(message_id) if message_id else None)
+        if method == 'sendPhoto':
+            message = self._message(chat_id)
+            message['photo'] = [{'file_id': f'photo{message["message_id"]}', 'file_unique_id': 'p',
+                                 'width': 512, 'height': 512}]
+            return message
+        if method in ('sendAudio', 'sendVideo'):
+            return self._message(chat_id)
+        # deleteMessage, sendChatAction, answerCallbackQuery, deleteWebhook и прочее
+        return True
+
+    def _check_limits(self, chat_id: int):
+        if chat_id in self.blocked:
+            self.errors[403] += 1
+            raise APIError(403, "Forbidden: bot was blocked by the user")
+        if self._global is not None:
+            delay = self._global.delay()
+            if delay:
+                self.errors[429] += 1
+                retry_after = math.ceil(delay)
+                raise APIError(429, f"Too Many Requests: retry after {retry_after}",
+                               {'retry_after': retry_after})
+            self._global.take()
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info['method']
+        params: Dict[str, Any] = dict(request.query)
+        if request.can_read_body:
+            if request.content_type == 'application/json':
+                params.update(await request.json())
+            else:
+                form = await request.post()
+                params.update({key: value for key, value in form.items() if isinstance(value, str)})
+        try:
+            result = await self._call(method, params)
+        except APIError as e:
+            body = {'ok': False, 'error_code': e.code, 'description': e.description}
+            if e.parameters:
+                body['parameters'] = e.parameters
+            return web.json_response(body, status=e.code, dumps=json.dumps)
+        return web.json_response({'ok': True, 'result': result}, dumps=json.dumps)
+
+    def build_app(self) -> web.Application:
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_route('*', '/bot{token}/{method}', self.handle)
+        return app
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> web.AppRunner:
+        """Поднять сервер; реальный порт — `runner.addresses[0][1]`"""
+        runner = web.AppRunner(self.build_app())
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        return runner
+
@@ -0,0 +1,95 @@
+"""Локальный фейковый HuggingFace Inference API
+
+Первые `--loading` запросов к каждой модели получают 503 «model is loading»,
+дальше — ответ после задержки `--latency`: текст для text-generation и OCR,
+случайные байты для картинок и музыки. С `--tokens` ответ text-generation —
+столько слов, по `--token-interval` секунд на каждое, как у настоящей модели;
+с "stream": true в запросе слова приходят потоком server-sent events.
+Список промптов в "inputs" — пакет: ответ — JSON-список base64, а пакет
+из n занимает `latency * (1 + batch_cost * (n - 1))`; с `gpu_slots` модель
+одновременно считает не больше стольких запросов или пакетов.
+
+Запуск отдельно:
+    python bench/fake_inference.py --port 8081 --latency 0.05
+и затем бот с HF_API_URL=http://localhost:8081/models HUGGINGFACE_API_TOKEN=test
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+from collections import Counter
+from contextlib import nullcontext
+
+from aiohttp import web
+
+
+def build_app(latency: float = 0.05, loading: int = 1, media_bytes: int = 256 * 1024,
+              estimated_time: float = 0.05, tokens: int = 0, token_interval: float = 0.0,
+              batch_cost: float = 1.0, gpu_slots: int = 0) -> web.Application:
+    requests_per_model: Counter = Counter()
+    media = os.urandom(media_bytes)
+    gpus: dict = {}
+
+    def words(prompt: str):
+        return [f"слово{i} " if i % 12 else f"*слово{i}* " for i in range(tokens)] or [f"Ответ модели на: {prompt}"]
+
+    async def stream(request: web.Request, prompt: str) -> web.StreamResponse:
+        response = web.StreamResponse(headers={'Content-Type': 'text/event-stream'})
+        await response.prepare(request)
+        # Темп от начала ответа, чтобы мелкие задержки sleep не копились
+        started = asyncio.get_running_loop().time()
+        for index, word in enumerate(words(prompt)):
+            await asyncio.sleep(started + (index + 1) * token_interval - asyncio.get_running_loop().time())
+            event = {"token": {"text": word, "special": False}, "generated_text": None}
+            await response.write(f"data:{json.dumps(event, ensure_ascii=False)}\n\n".encode())
+        await response.write_eof()
+        return response
+
+    async def handle(request: web.Request) -> web.Response:
+        model = request.match_info['model']
+        requests_per_model[model] += 1
+        if requests_per_model[model] <= loading:
+            return web.json_response(
+                {"error": f"Model {model} is currently loading", "estimated_time": estimated_time},
+                status=503
+            )
+        body = await request.read()
+        payload = json.loads(body) if request.content_type == 'application/json' else None
+        batch = len(payload['inputs']) if payload and isinstance(payload.get('inputs'), list) else 1
+        async with gpus.setdefault(model, asyncio.Semaphore(gpu_slots)) if gpu_slots else nullcontext():
+            await asyncio.sleep(latency * (1 + batch_cost * (batch - 1)))
+
+        if payload is not None:
+            if isinstance(payload['inputs'], list):
+                encoded = base64.b64encode(media).decode()
+                return web.json_response([encoded] * batch)
+            if 'parameters' in payload:
+                if payload.get('stream'):
+                    return await stream(request, payload['inputs'])
+                await asyncio.sleep(tokens * token_interval)
+                return web.json_response([{"generated_text": "".join(words(payload['inputs']))}])
+            return web.Response(body=media, content_type='application/octet-stream')
+        # Сырые байты изображения — OCR
+        return web.json_response([{"generated_text": f"распознано {len(body)} байт"}])
+
+    app = web.Application(client_max_size=32 * 1024 * 1024)
+    app.router.add_post('/models/{model:.+}', handle)
+    app['requests'] = requests_per_model
+    return app
+
+
+def cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--loading', type=int, default=1)
+    parser.add_argument('--tokens', type=int, default=0)
+    parser.add_argument('--token-interval', type=float, default=0.02)
+    args = parser.parse_args()
+    web.run_app(build_app(args.latency, args.loading, tokens=args.tokens, token_interval=args.token_interval),
+                port=args.port)
+
+
+if __name__ == '__main__':
+    cli()
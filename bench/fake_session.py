@@ -0,0 +1,112 @@
+"""Сессия Bot API в памяти процесса для бенчмарков через dp.feed_update
+
+Отвечает на методы, которыми пользуется бот, правдоподобными объектами
+и считает вызовы по методам. Сеть не трогает.
+"""
+import asyncio
+import itertools
+import math
+from collections import Counter
+from typing import Any, Dict, Iterable, Optional
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import (DeleteMessage, EditMessageText, GetChatMember, GetMe, SendChatAction,
+                             SendMessage, TelegramMethod)
+from aiogram.types import Chat, ChatMemberLeft, ChatMemberMember, Message, Update, User
+
+from outbound import LIMITED_METHODS, TokenBucket
+
+
+class FakeSession(BaseSession):
+    """Отвечает на запросы бота из памяти с настраиваемой задержкой"""
+
+    def __init__(self, latency: float = 0.0, subscribers: Optional[Iterable[int]] = None):
+        super().__init__()
+        self.latency = latency
+        # None — подписаны все; иначе множество подписанных user_id
+        self.subscribers = set(subscribers) if subscribers is not None else None
+        self.calls: Counter = Counter()
+        self._message_ids = itertools.count(1000)
+
+    async def close(self):
+        pass
+
+    async def stream_content(self, url: str, headers: Optional[Dict[str, Any]] = None, timeout: int = 30,
+                             chunk_size: int = 65536, raise_for_status: bool = True):
+        yield b""
+
+    def _user(self, user_id: int) -> User:
+        return User(id=user_id, is_bot=False, first_name="user")
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: Optional[int] = None) -> Any:
+        self.calls[method.__api_method__] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if isinstance(method, GetChatMember):
+            user = self._user(method.user_id)
+            if self.subscribers is None or method.user_id in self.subscribers:
+                return ChatMemberMember(user=user)
+            return ChatMemberLeft(user=user)
+        if isinstance(method, (SendMessage, EditMessageText)):
+            chat_id = method.chat_id if isinstance(method.chat_id, int) else 0
+            message_id = getattr(method, 'message_id', None) or next(self._message_ids)
+            return Message(
+                message_id=message_id, date=1,
+                chat=Chat(id=chat_id, type="private"), text=method.text
+            ).as_(bot)
+        if isinstance(method, GetMe):
+            return User(id=bot.id, is_bot=True, first_name="bot", username="artemius_bot")
+        if isinstance(method, (DeleteMessage, SendChatAction)):
+            return True
+        return True
+
+
+class RateLimitedSession(FakeSession):
+    """FakeSession, которая как Telegram отвечает 429 при превышении лимитов
+
+    Общий лимит и лимит на чат считаются маркерными вёдрами; запрос сверх
+    лимита получает TelegramRetryAfter с честным retry_after и не
+    засчитывается как доставленный.
+    """
+
+    def __init__(self, global_rate: float = 30, chat_rate: float = 1, chat_burst: float = 3, **kwargs):
+        super().__init__(**kwargs)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chats: Dict[Any, TokenBucket] = {}
+        self.delivered = 0
+        self.rejected = 0
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: Optional[int] = None) -> Any:
+        chat_id = getattr(method, 'chat_id', None)
+        if method.__api_method__ in LIMITED_METHODS and chat_id is not None:
+            chat = self._chats.setdefault(chat_id, TokenBucket(self.chat_rate, self.chat_burst))
+            delay = max(chat.delay(), self._global.delay())
+            if delay:
+                self.rejected += 1
+                retry_after = math.ceil(delay)
+                raise TelegramRetryAfter(
+                    method=method, message=f"Too Many Requests: retry after {retry_after}",
+                    retry_after=retry_after,
+                )
+            chat.take()
+            self._global.take()
+            self.delivered += 1
+        return await super().make_request(bot, method, timeout)
+
+
+_update_ids = itertools.count(1)
+
+
+def message_update(user_id: int, text: str) -> Update:
+    """Апдейт с текстовым сообщением из личного чата"""
+    update_id = next(_update_ids)
+    return Update(update_id=update_id, message={
+        'message_id': update_id, 'date': 1, 'text': text,
+        'chat': {'id': user_id, 'type': 'private'},
+        'from': {'id': user_id, 'is_bot': False, 'first_name': 'user'},
+    })
@@ -0,0 +1,24 @@
+"""Воркер шарда для bench_shards.py: бот из main.py с Bot API в памяти
+
+Запускается роутером (ShardRouter), который передаёт SHARD_INDEX,
+SHARD_WORKERS и SHARD_SOCKET через окружение.
+"""
+import asyncio
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+from fake_session import FakeSession  # noqa: E402
+
+if __name__ == '__main__':
+    session = FakeSession(latency=float(os.getenv("BENCH_API_LATENCY", "0")))
+    # Как в main.py, но без планировщика: flood control здесь не меряем
+    session.middleware(main.tracer)
+    session.middleware(main.api_calls)
+    session.middleware(main.bot_metrics)
+    main.bot.session = session
+    logging.disable(logging.ERROR)
+    asyncio.run(main.main())
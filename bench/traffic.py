@@ -0,0 +1,97 @@
+"""Синтетический трафик: сценарии пользователей для нагрузочных прогонов
+
+Сценарий — последовательность сообщений пользователя и число ответов бота,
+которое должно прийти на каждое. Пользователи проходят свой сценарий шаг
+за шагом, все пользователи — одновременно. Как доставить апдейт и дождаться
+обработки, решает вызывающий (`dp.feed_update` или фейковый сервер).
+"""
+import asyncio
+import itertools
+import statistics
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Sequence, Tuple
+
+from catalog import RU
+
+BUTTONS = RU['buttons']
+
+# (текст, ответов бота): в демо-режиме генерация — заглушка и её правка
+IMAGE_JOURNEY: Sequence[Tuple[str, int]] = (
+    ("/start", 1),
+    (BUTTONS['images'], 1),
+    ("кот в космосе, акварель", 2),
+)
+FULL_JOURNEY: Sequence[Tuple[str, int]] = IMAGE_JOURNEY + (
+    (BUTTONS['main_menu'], 1),
+    (BUTTONS['chat'], 1),
+    ("что посмотреть вечером?", 2),
+    (BUTTONS['main_menu'], 1),
+    (BUTTONS['profile'], 1),
+)
+JOURNEYS = {'image': IMAGE_JOURNEY, 'full': FULL_JOURNEY}
+
+_message_ids = itertools.count(1)
+
+
+def message_update(user_id: int, text: str) -> dict:
+    """Апдейт с сообщением из личного чата в формате Bot API"""
+    update = {
+        'message_id': next(_message_ids), 'date': int(time.time()), 'text': text,
+        'chat': {'id': user_id, 'type': 'private'},
+        'from': {'id': user_id, 'is_bot': False, 'first_name': 'user', 'language_code': 'ru'},
+    }
+    if text.startswith('/'):
+        update['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+    return {'message': update}
+
+
+# Доставить апдейт пользователя и вернуться, когда бот его обработал;
+# аргументы — user_id, апдейт и сколько ответов бота ждать на этот шаг
+Deliver = Callable[[int, dict, int], Awaitable[None]]
+
+
+@dataclass
+class TrafficReport:
+    updates: int = 0
+    errors: int = 0
+    elapsed: float = 0.0
+    latencies: List[float] = field(default_factory=list)
+
+    def percentile(self, share: float) -> float:
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[max(0, int(len(ordered) * share) - 1)]
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            'updates': self.updates,
+            'errors': self.errors,
+            'updates_per_second': self.updates / self.elapsed if self.elapsed else 0.0,
+            'p50_ms': statistics.median(self.latencies) * 1000 if self.latencies else 0.0,
+            'p99_ms': self.percentile(0.99) * 1000,
+        }
+
+
+async def run_users(deliver: Deliver, users: int, journey: Sequence[Tuple[str, int]],
+                    first_user_id: int = 1_000_000, step_timeout: float = 30.0) -> TrafficReport:
+    """Прогнать сценарий для `users` одновременных пользователей"""
+    report = TrafficReport()
+
+    async def user(user_id: int):
+        for text, replies in journey:
+            started = time.perf_counter()
+            try:
+                await asyncio.wait_for(deliver(user_id, message_update(user_id, text), replies), step_timeout)
+            except Exception:
+                # Сценарий пользователя дальше не имеет смысла: состояние не то
+                report.errors += 1
+                return
+            report.latencies.append(time.perf_counter() - started)
+            report.updates += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user(first_user_id + i) for i in range(users)))
+    report.elapsed = time.perf_counter() - started
+    return report
@@ -0,0 +1,462 @@
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+
+from outbound import bulk_priority
+from quota import BaseQuotaStore
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS broadcasts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    admin_id INTEGER NOT NULL,
+    chat_id INTEGER NOT NULL,
+    message_id INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'running',
+    cursor TEXT NOT NULL DEFAULT '',
+    total INTEGER NOT NULL DEFAULT 0,
+    sent INTEGER NOT NULL DEFAULT 0,
+    blocked INTEGER NOT NULL DEFAULT 0,
+    skipped INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS unreachable_users (
+    user_id INTEGER PRIMARY KEY,
+    reason TEXT NOT NULL,
+    at REAL NOT NULL
+);
+"""
+
+# Ответы Bot API 400, после которых писать в чат бессмысленно
+GONE_CHAT_ERRORS = ("chat not found", "user not found")
+
+
+class Broadcast:
+    """Рассылка: текст, кто запустил, где показывать прогресс и докуда дошли"""
+
+    __slots__ = ('id', 'admin_id', 'chat_id', 'message_id', 'text', 'cursor', 'total',
+                 'sent', 'blocked', 'skipped', 'failed', 'created_at')
+
+    def __init__(self, admin_id: int, chat_id: int, message_id: int, text: str, total: int = 0,
+                 cursor: str = "", sent: int = 0, blocked: int = 0, skipped: int = 0, failed: int = 0,
+                 created_at: float = None, id: int = None):
+        self.id = id
+        self.admin_id = admin_id
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.text = text
+        self.cursor = cursor
+        self.total = total
+        self.sent = sent
+        self.blocked = blocked
+        self.skipped = skipped
+        self.failed = failed
+        self.created_at = created_at if created_at is not None else time.time()
+
+
+class BroadcastStore:
+    """Рассылки с контрольными точками и недоступные пользователи в SQLite
+
+    Методы вызываются из потоков (asyncio.to_thread), соединение одно —
+    запросы идут по очереди под блокировкой, чтобы /start не попал внутрь
+    транзакции контрольной точки.
+    """
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def add(self, broadcast: Broadcast) -> int:
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO broadcasts (admin_id, chat_id, message_id, text, total, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (broadcast.admin_id, broadcast.chat_id, broadcast.message_id, broadcast.text,
+                 broadcast.total, broadcast.created_at)
+            )
+        return cursor.lastrowid
+
+    def checkpoint(self, broadcast: Broadcast, unreachable: List[Tuple[int, str]], finished: bool = False):
+        """Курсор, счётчики и новые недоступные пользователи — одной транзакцией
+
+        `finished` — завершена последняя страница: рассылка отмечается
+        законченной в той же транзакции, и после рестарта её хвост не
+        уходит повторно.
+        """
+        conn = self._conn
+        with self._lock:
+            conn.execute("BEGIN")
+            try:
+                if unreachable:
+                    now = time.time()
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO unreachable_users (user_id, reason, at) VALUES (?, ?, ?)",
+                        [(user_id, reason, now) for user_id, reason in unreachable]
+                    )
+                conn.execute(
+                    "UPDATE broadcasts SET cursor = ?, sent = ?, blocked = ?, skipped = ?, failed = ?, "
+                    "status = CASE WHEN ? THEN 'done' ELSE status END WHERE id = ?",
+                    (broadcast.cursor, broadcast.sent, broadcast.blocked, broadcast.skipped, broadcast.failed,
+                     finished, broadcast.id)
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def set_status(self, broadcast_id: int, status: str):
+        with self._lock:
+            self._conn.execute("UPDATE broadcasts SET status = ? WHERE id = ?", (status, broadcast_id))
+
+    def running(self) -> List[Broadcast]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, admin_id, chat_id, message_id, text, total, cursor, sent, blocked, skipped, failed, "
+                "created_at FROM broadcasts WHERE status = 'running' ORDER BY id"
+            ).fetchall()
+        return [Broadcast(*row[1:], id=row[0]) for row in rows]
+
+    def unreachable_among(self, user_ids: Iterable[int]) -> Set[int]:
+        user_ids = list(user_ids)
+        if not user_ids:
+            return set()
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT user_id FROM unreachable_users WHERE user_id IN ({', '.join('?' for _ in user_ids)})",
+                user_ids
+            ).fetchall()
+        return {user_id for user_id, in rows}
+
+    def mark_reachable(self, user_id: int) -> bool:
+        """Убрать из недоступных; False, если пользователь там и не был"""
+        with self._lock:
+            # Почти всегда пользователя в таблице нет — чтение не берёт блокировку записи
+            row = self._conn.execute("SELECT 1 FROM unreachable_users WHERE user_id = ?", (user_id,)).fetchone()
+            if row is None:
+                return False
+            self._conn.execute("DELETE FROM unreachable_users WHERE user_id = ?", (user_id,))
+        return True
+
+    def close(self):
+        # Под блокировкой: запрос, ещё идущий в потоке, закончится до закрытия
+        with self._lock:
+            self._conn.close()
+
+
+class _Page:
+    """Страница получателей: сколько отправок ещё в полёте и их итоги"""
+
+    __slots__ = ('cursor', 'pending', 'dispatched', 'interrupted', 'sent', 'blocked', 'skipped', 'failed',
+                 'unreachable')
+
+    def __init__(self, cursor: Optional[str]):
+        self.cursor = cursor
+        self.pending = 0
+        self.dispatched = False
+        self.interrupted = False
+        self.sent = 0
+        self.blocked = 0
+        self.skipped = 0
+        self.failed = 0
+        self.unreachable: List[Tuple[int, str]] = []
+
+    @property
+    def done(self) -> bool:
+        return self.dispatched and not self.pending and not self.interrupted
+
+
+class _Run:
+    """Идущая в этом процессе рассылка: страницы в полёте и темп с момента (пере)запуска"""
+
+    __slots__ = ('broadcast', 'pages', 'started', 'processed_at_start', 'task')
+
+    def __init__(self, broadcast: Broadcast):
+        self.broadcast = broadcast
+        self.pages: Deque[_Page] = deque()
+        self.started = time.monotonic()
+        self.processed_at_start = self.count('sent', 'blocked', 'skipped', 'failed')
+        self.task: Optional[asyncio.Task] = None
+
+    def count(self, *fields: str) -> int:
+        """Сумма счётчиков: сохранённые в контрольной точке плюс страницы в полёте"""
+        return sum(getattr(self.broadcast, field) + sum(getattr(page, field) for page in self.pages)
+                   for field in fields)
+
+
+class Broadcaster:
+    """Рассылка сообщения всем известным пользователям
+
+    Получатели читаются из хранилища пользователей страницами по
+    `page_size` — в памяти только страницы в полёте. Отправки идут
+    через общий бот и планировщик исходящих с пониженным приоритетом
+    (`bulk_priority`): темп задаёт общий лимит Telegram, а ответы
+    пользователям обходят рассылку в очереди. Одновременно в полёте не
+    больше `concurrency` отправок.
+
+    Контрольная точка — курсор страницы, все отправки до которой
+    завершены, вместе со счётчиками; после рестарта рассылка продолжается
+    с неё. При штатной остановке текущая страница дорабатывается (не
+    дольше `drain_timeout`), так что повторов нет; при аварийной повторно
+    уходит не больше страницы.
+
+    Заблокировавшие бота и удалённые пользователи запоминаются и в
+    следующих рассылках пропускаются, пока снова не нажмут /start.
+    """
+
+    def __init__(self, bot: Bot, store: BroadcastStore, users: BaseQuotaStore, concurrency: int = 32,
+                 page_size: int = 100, report_interval: float = 15, drain_timeout: float = 5):
+        self.bot = bot
+        self.store = store
+        self.users = users
+        self.concurrency = concurrency
+        self.page_size = page_size
+        self.report_interval = report_interval
+        self.drain_timeout = drain_timeout
+        self._runs: Dict[int, _Run] = {}
+        # Записи контрольных точек в потоке: отмена рассылки их не прерывает, close их дожидается
+        self._writes: Set[asyncio.Task] = set()
+        self._closing = False
+
+    @property
+    def running(self) -> bool:
+        return bool(self._runs)
+
+    async def launch(self, admin_id: int, chat_id: int, message_id: int, text: str) -> Broadcast:
+        """Начать рассылку; прогресс — правками сообщения `message_id` в чате администратора"""
+        broadcast = Broadcast(admin_id, chat_id, message_id, text, total=await self.users.count_users())
+        broadcast.id = await asyncio.to_thread(self.store.add, broadcast)
+        logger.info(f"📣 Рассылка {broadcast.id} запущена {admin_id}: ~{broadcast.total} получателей")
+        self._spawn(broadcast)
+        return broadcast
+
+    async def stop(self) -> List[int]:
+        """Прервать идущие рассылки без возобновления после рестарта"""
+        stopped = list(self._runs)
+        for broadcast_id in stopped:
+            await asyncio.to_thread(self.store.set_status, broadcast_id, 'stopped')
+        await self._cancel_runs()
+        return stopped
+
+    async def mark_reachable(self, user_id: int):
+        """Пользователь снова пишет боту — снова получает рассылки"""
+        if await asyncio.to_thread(self.store.mark_reachable, user_id):
+            logger.info(f"📣 {user_id} снова доступен для рассылок")
+
+    async def start(self, owns: Optional[Callable[[int], bool]] = None):
+        """Продолжить рассылки, прерванные рестартом
+
+        `owns` — фильтр по id администратора, когда база общая для
+        нескольких процессов (шардов): каждый продолжает только свои.
+        """
+        restored = await asyncio.to_thread(self.store.running)
+        if owns is not None:
+            restored = [broadcast for broadcast in restored if owns(broadcast.admin_id)]
+        for broadcast in restored:
+            logger.info(f"🔁 Рассылка {broadcast.id} продолжается после рестарта с {broadcast.cursor or 'начала'}")
+            self._spawn(broadcast)
+
+    async def close(self):
+        """Остановить рассылки на границе страницы — после рестарта они продолжатся с неё"""
+        self._closing = True
+        if self._runs:
+            await asyncio.wait([run.task for run in self._runs.values()], timeout=self.drain_timeout)
+        await self._cancel_runs()
+        if self._writes:
+            await asyncio.gather(*self._writes, return_exceptions=True)
+        self.store.close()
+
+    async def _cancel_runs(self):
+        runs = list(self._runs.values())
+        for run in runs:
+            run.task.cancel()
+        await asyncio.gather(*(run.task for run in runs), return_exceptions=True)
+
+    def _spawn(self, broadcast: Broadcast):
+        run = self._runs[broadcast.id] = _Run(broadcast)
+        run.task = asyncio.create_task(self._run(run))
+
+    def progress(self, broadcast_id: int) -> Dict[str, Any]:
+        run = self._runs[broadcast_id]
+        broadcast = run.broadcast
+        processed = run.count('sent', 'blocked', 'skipped', 'failed')
+        elapsed = time.monotonic() - run.started
+        rate = (processed - run.processed_at_start) / elapsed if elapsed > 0 else 0.0
+        remaining = max(broadcast.total - processed, 0)
+        return {
+            'id': broadcast.id,
+            'total': broadcast.total,
+            'processed': processed,
+            'sent': run.count('sent'),
+            'blocked': run.count('blocked'),
+            'skipped': run.count('skipped'),
+            'failed': run.count('failed'),
+            'in_flight': sum(page.pending for page in run.pages),
+            'rate': rate,
+            'eta': remaining / rate if rate > 0 else None,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {broadcast_id: self.progress(broadcast_id) for broadcast_id in self._runs}
+
+    def _progress_text(self, progress: Dict[str, Any], finished: bool = False) -> str:
+        lines = [
+            f"📣 Рассылка #{progress['id']}" + (" завершена" if finished else ""),
+            f"✅ Доставлено: {progress['sent']}",
+            f"🚫 Недоступны: {progress['blocked']} новых, {progress['skipped']} известных",
+            f"❌ Ошибки: {progress['failed']}",
+        ]
+        if not finished:
+            eta = progress['eta']
+            eta_text = f"{int(eta) // 60}:{int(eta) % 60:02d}" if eta is not None else "—"
+            lines.append(f"📈 {progress['processed']} из ~{progress['total']}, "
+                         f"{progress['rate']:.1f} сообщ./с, осталось {eta_text}")
+        return "\n".join(lines)
+
+    async def _report(self, run: _Run, finished: bool = False):
+        broadcast = run.broadcast
+        try:
+            await self.bot.edit_message_text(self._progress_text(self.progress(broadcast.id), finished),
+                                             chat_id=broadcast.chat_id, message_id=broadcast.message_id)
+        except Exception as e:
+            logger.warning(f"Не удалось обновить прогресс рассылки {broadcast.id}: {e}")
+
+    async def _report_progress(self, run: _Run):
+        while True:
+            await asyncio.sleep(self.report_interval)
+            progress = self.progress(run.broadcast.id)
+            eta = f"{progress['eta']:.0f} с" if progress['eta'] is not None else "—"
+            logger.info(f"📣 Рассылка {progress['id']}: {progress['processed']}/{progress['total']}, "
+                        f"{progress['rate']:.1f} сообщ./с, осталось {eta}")
+            await self._report(run)
+
+    async def _run(self, run: _Run):
+        broadcast = run.broadcast
+        reporter = asyncio.create_task(self._report_progress(run))
+        try:
+            # Отправки создаются внутри блока и наследуют низкий приоритет
+            with bulk_priority():
+                completed = await self._send_all(run)
+            if not completed:
+                logger.info(f"📣 Рассылка {broadcast.id} остановлена на {broadcast.cursor or 'начале'}")
+                return
+            # Статус done записала контрольная точка последней страницы
+            progress = self.progress(broadcast.id)
+            logger.info(f"📣 Рассылка {broadcast.id} завершена: {progress}")
+            await self._report(run, finished=True)
+        except asyncio.CancelledError:
+            logger.info(f"📣 Рассылка {broadcast.id} остановлена на {broadcast.cursor or 'начале'}")
+            raise
+        except Exception as e:
+            # Статус остаётся running — рассылка продолжится с контрольной точки после рестарта
+            logger.error(f"Рассылка {broadcast.id} прервана ошибкой: {e}")
+        finally:
+            reporter.cancel()
+            del self._runs[broadcast.id]
+
+    async def _send_all(self, run: _Run) -> bool:
+        """Разослать с контрольной точки; False — остановились раньше (close)"""
+        broadcast = run.broadcast
+        slots = asyncio.Semaphore(self.concurrency)
+        sends: Set[asyncio.Task] = set()
+
+        def finished(task: asyncio.Task):
+            sends.discard(task)
+            slots.release()
+
+        cursor = broadcast.cursor
+        # Повторы между страницами отсеиваются здесь; id держатся в памяти только
+        # для хранилищ, которые их допускают (SSCAN в Redis)
+        seen: Optional[Set[int]] = set() if self.users.recipients_may_repeat else None
+        try:
+            while cursor is not None and not self._closing:
+                user_ids, cursor = await self.users.recipients(cursor, self.page_size)
+                if seen is not None:
+                    user_ids = [user_id for user_id in user_ids if user_id not in seen]
+                    seen.update(user_ids)
+                unreachable = await asyncio.to_thread(self.store.unreachable_among, user_ids)
+                page = _Page(cursor)
+                run.pages.append(page)
+                for user_id in user_ids:
+                    if user_id in unreachable:
+                        page.skipped += 1
+                        continue
+                    await slots.acquire()
+                    page.pending += 1
+                    send = asyncio.create_task(self._send(broadcast, user_id, page))
+                    sends.add(send)
+                    send.add_done_callback(finished)
+                page.dispatched = True
+                await self._checkpoint(run)
+            while sends:
+                await asyncio.gather(*sends)
+            return cursor is None
+        finally:
+            if sends:
+                # Уже ушедшие запросы дожидаемся, чтобы после рестарта не отправить их снова
+                await asyncio.wait(sends, timeout=self.drain_timeout)
+                for send in sends:
+                    send.cancel()
+                await asyncio.gather(*sends, return_exceptions=True)
+            await self._checkpoint(run)
+
+    async def _send(self, broadcast: Broadcast, user_id: int, page: _Page):
+        try:
+            await self.bot.send_message(user_id, broadcast.text, parse_mode="HTML")
+        except TelegramForbiddenError as e:
+            # Бот заблокирован, пользователь удалён
+            page.blocked += 1
+            page.unreachable.append((user_id, e.message))
+        except TelegramBadRequest as e:
+            if any(error in e.message.lower() for error in GONE_CHAT_ERRORS):
+                page.blocked += 1
+                page.unreachable.append((user_id, e.message))
+            else:
+                page.failed += 1
+                logger.warning(f"Рассылка {broadcast.id}: не доставлено {user_id}: {e.message}")
+        except asyncio.CancelledError:
+            page.interrupted = True
+            raise
+        except Exception as e:
+            page.failed += 1
+            logger.warning(f"Рассылка {broadcast.id}: не доставлено {user_id}: {e}")
+        else:
+            page.sent += 1
+        finally:
+            page.pending -= 1
+
+    async def _checkpoint(self, run: _Run):
+        """Перенести завершённые по порядку страницы в контрольную точку"""
+        broadcast = run.broadcast
+        unreachable = []
+        retired = False
+        finished = False
+        while run.pages and run.pages[0].done:
+            page = run.pages.popleft()
+            # У последней страницы курсора нет — вместо него рассылка отмечается законченной
+            if page.cursor is not None:
+                broadcast.cursor = page.cursor
+            else:
+                finished = True
+            broadcast.sent += page.sent
+            broadcast.blocked += page.blocked
+            broadcast.skipped += page.skipped
+            broadcast.failed += page.failed
+            unreachable.extend(page.unreachable)
+            retired = True
+        if retired:
+            write = asyncio.create_task(asyncio.to_thread(self.store.checkpoint, broadcast, unreachable, finished))
+            self._writes.add(write)
+            write.add_done_callback(self._writes.discard)
+            await asyncio.shield(write)
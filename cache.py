@@ -0,0 +1,113 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Ограниченный по размеру кэш с вытеснением по LRU и по TTL
+
+    Запись хранится как кортеж (время истечения, значение) без datetime.
+    Порядок `_data` — от давно использованных к недавним (для LRU), а
+    сроки лежат отдельно в порядке записи: TTL у всех один, поэтому в
+    голове `_deadlines` всегда ближайший срок, и просроченные записи
+    снимаются оттуда за амортизированное O(1) при каждой записи — даже
+    если их недавно читали.
+    """
+
+    __slots__ = ('maxsize', 'ttl', '_data', '_deadlines', 'hits', 'misses', 'evictions', 'expirations')
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl  # None — без срока жизни, только LRU
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._deadlines: "OrderedDict[Hashable, float]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        if entry[0] is not None and entry[0] <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """Значение без учёта в счётчиках и без обновления порядка LRU"""
+        entry = self._data.get(key)
+        if entry is None or (entry[0] is not None and entry[0] <= time.monotonic()):
+            return default
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any):
+        now = time.monotonic()
+        expires_at = now + self.ttl if self.ttl is not None else None
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        if expires_at is not None:
+            self._deadlines[key] = expires_at
+            self._deadlines.move_to_end(key)
+        self._sweep(now)
+        while len(self._data) > self.maxsize:
+            evicted, _ = self._data.popitem(last=False)
+            self._deadlines.pop(evicted, None)
+            self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.pop(key, _MISSING)
+        if entry is _MISSING:
+            return default
+        self._deadlines.pop(key, None)
+        return entry[1]
+
+    def _remove(self, key: Hashable):
+        del self._data[key]
+        self._deadlines.pop(key, None)
+
+    def _sweep(self, now: float, limit: int = 8):
+        """Снять несколько просроченных записей с головы очереди"""
+        if self.ttl is None:
+            return
+        deadlines = self._deadlines
+        for _ in range(limit):
+            if not deadlines:
+                return
+            key, expires_at = next(iter(deadlines.items()))
+            if expires_at > now:
+                return
+            self._remove(key)
+            self.expirations += 1
+
+    def keys(self) -> list:
+        """Ключи от давно использованных к недавним"""
+        return list(self._data)
+
+    def clear(self):
+        self._data.clear()
+        self._deadlines.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Счётчики попаданий/промахов/вытеснений и текущий размер"""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
@@ -0,0 +1,698 @@
+# Тексты и кнопки бота по языкам
+#
+# Поля в фигурных скобках двух видов. Известные при запуске (лимиты тарифа:
+# {free[chat]}, {vip[chat]}, {plus[chat]}, {limit[chat]}, {tier[...]},
+# {channels}, поля функции {feature[...]}) подставляются один раз в
+# templates.Renderer. Остальные ({remaining}, {daily[chat]}, {stats[...]},
+# {status_lines}) заполняются при отправке.
+#
+# Текст — строка (одинаковый шаблон для обоих тарифов) или словарь
+# {'vip': ..., 'free': ...}.
+
+_RU_VIP_PROMO = """💬 {vip[chat]} диалогов (+{plus[chat]})
+🎨 {vip[images]} картинок (+{plus[images]})
+🎵 {vip[music]} композиций (+{plus[music]})
+🎬 {vip[video]} видео (+{plus[video]})
+📄 {vip[documents]} документов (+{plus[documents]})"""
+
+_EN_VIP_PROMO = """💬 {vip[chat]} chats (+{plus[chat]})
+🎨 {vip[images]} images (+{plus[images]})
+🎵 {vip[music]} tracks (+{plus[music]})
+🎬 {vip[video]} videos (+{plus[video]})
+📄 {vip[documents]} documents (+{plus[documents]})"""
+
+RU = {
+    'tiers': {
+        'vip': {'status': "VIP", 'mode': "VIP режим"},
+        'free': {'status': "Базовый", 'mode': "Базовый доступ"},
+    },
+    'features': {
+        'chat': {'name': "диалогов с Artemius", 'emoji': "💬",
+                 'progress': "🏛️ Artemius думает...", 'error': "❌ Artemius временно недоступен"},
+        'images': {'name': "генераций изображений", 'emoji': "🎨",
+                   'progress': "🎨 Artemius создаёт...", 'error': "❌ Ошибка генерации"},
+        'music': {'name': "создания музыки", 'emoji': "🎵",
+                  'progress': "🎵 Artemius компонует...", 'error': "❌ Ошибка создания музыки"},
+        'video': {'name': "видеопроизводства", 'emoji': "🎬",
+                  'progress': "🎬 Artemius создаёт видео...", 'error': "❌ Ошибка видео"},
+        'documents': {'name': "анализа документов", 'emoji': "📄",
+                      'progress': "📄 Artemius сканирует...", 'error': "❌ Ошибка OCR"},
+    },
+    'buttons': {
+        'chat': "💬 Чат с Artemius",
+        'images': "🎨 Создать картинку",
+        'music': "🎵 Создать песню",
+        'video': "🎬 Создать видео",
+        'documents': "📄 Документ",
+        'profile': "👤 Мой профиль",
+        'status_vip': "⭐ VIP режим",
+        'status_free': "🔒 Базовый доступ",
+        'get_vip': "📢 Получить VIP",
+        'main_menu': "🏠 Главное меню",
+        'subscribed': "✅ {name} • Подписан",
+        'subscribe': "📢 {name} • Подписаться",
+        'separator': "➖ ➖ ➖ ➖ ➖",
+        'check': "🔄 Проверить подписки и получить VIP",
+        'skip': "⏭️ Продолжить с базовым доступом",
+    },
+    'texts': {
+        'start': {
+            'vip': """🏛️ **Добро пожаловать, VIP-пользователь!**
+
+⭐ **VIP СТАТУС АКТИВЕН!**
+Спасибо за подписку на наши каналы!
+
+🚀 **ВАШИ VIP-ЛИМИТЫ:**
+💬 Диалоги — **{vip[chat]} в день**
+🎨 Картинки — **{vip[images]} в день**
+🎵 Музыка — **{vip[music]} в день**
+🎬 Видео — **{vip[video]} в день**
+📄 Документы — **{vip[documents]} в день**
+
+✨ **Передовые AI технологии:**
+• DeepSeek V3 для умных диалогов
+• Stable Diffusion для изображений
+• MusicGen для музыки
+• Video AI для роликов
+• TrOCR для документов
+
+Наслаждайтесь VIP-возможностями! 🎯""",
+            'free': """🏛️ **Добро пожаловать в Artemius AI!**
+
+🤖 Я ваш персональный ИИ-помощник с множеством возможностей!
+
+🔒 **ВАШИ ТЕКУЩИЕ ЛИМИТЫ (базовый доступ):**
+💬 Диалоги — **{free[chat]} в день**
+🎨 Картинки — **{free[images]} в день**
+🎵 Музыка — **{free[music]} в день**
+🎬 Видео — **{free[video]} в день**
+📄 Документы — **{free[documents]} в день**
+
+⭐ **ХОТИТЕ ПОЛУЧИТЬ VIP СТАТУС?**
+Подпишитесь на наши каналы и получите:
+
+💬 **{vip[chat]} диалогов** в день (сейчас {free[chat]})
+🎨 **{vip[images]} картинок** в день (сейчас {free[images]})
+🎵 **{vip[music]} композиций** в день (сейчас {free[music]})
+🎬 **{vip[video]} видео** в день (сейчас {free[video]})
+📄 **{vip[documents]} документов** в день (сейчас {free[documents]})
+
+🚀 **Подпишитесь на оба канала для получения VIP!**""",
+        },
+        'limit_exhausted': {
+            'vip': """🚫 **Вы исчерпали лимит {feature[name]}!**
+
+⭐ **VIP статус:** {feature[limit]} в день
+⏰ **Лимиты обновятся:** завтра в 00:00 МСК
+
+💡 А пока можете использовать другие функции Artemius!""",
+            'free': """🚫 **Вы исчерпали лимит {feature[name]}!**
+
+{feature[emoji]} **Текущий лимит:** {feature[limit]} в день
+
+⭐ **Чтобы получить VIP статус, подпишитесь на каналы!**
+
+🎯 **VIP лимит:** {feature[vip]} в день (+{feature[plus]} дополнительно!)
+
+🚀 **ВСЕ VIP БОНУСЫ:**
+""" + _RU_VIP_PROMO + """
+
+📢 **Подпишитесь на оба канала прямо сейчас!**""",
+        },
+        'enter_chat': """🏛️ **Artemius готов к диалогу!**
+
+⭐ **Статус:** {tier[status]} доступ
+💡 **Осталось сообщений:** {remaining}
+
+🧠 Задавайте любые вопросы — я помогу с программированием, творчеством, решением задач и многим другим!""",
+        'enter_images': """🎨 **Artemius Art Studio активирован!**
+
+⭐ **Статус:** {tier[status]} доступ
+💡 **Осталось изображений:** {remaining}
+
+🖼️ **Примеры запросов:**
+• Мистический лес с волшебными созданиями
+• Киберпанк город с неоновыми огнями
+• Портрет эльфа в стиле фэнтези
+• Космический корабль среди звезд
+
+Опишите что создать:""",
+        'enter_music': """🎵 **Artemius Music Composer активирован!**
+
+⭐ **Статус:** {tier[status]} доступ
+💡 **Осталось композиций:** {remaining}
+
+🎼 **Примеры запросов:**
+• Эпичная оркестровая музыка для фильма
+• Расслабляющий джаз для работы
+• Энергичная электронная музыка для спорта
+• Романтическая мелодия с пианино
+
+Опишите какую музыку создать:""",
+        'enter_video': """🎬 **Artemius Video Producer активирован!**
+
+⭐ **Статус:** {tier[status]} доступ
+💡 **Осталось видео:** {remaining}
+
+🎥 **Доступные AI сервисы:**
+🌊 **Veo 3** — реалистичные сцены природы
+🤖 **Kling AI** — быстрая HD генерация
+🧡 **Hailuo 02** — креативные эффекты
+🐰 **Pika 2.2** — профессиональное качество
+
+📱 **Параметры:** HD (720p-1080p) • 5-10 сек
+
+Опишите какое видео создать:""",
+        'enter_documents': """📄 **Artemius Document Analyzer активирован!**
+
+⭐ **Статус:** {tier[status]} доступ
+💡 **Осталось анализов:** {remaining}
+
+🔍 **Artemius умеет обрабатывать:**
+• Сканы документов и справок
+• Рукописные заметки и тексты
+• Чеки, счета и квитанции
+• Таблицы и формы
+
+📸 Отправьте фото документа или изображение файлом:""",
+        'profile': {
+            'vip': """👤 **Профиль пользователя Artemius AI**
+
+⭐ VIP СТАТУС АКТИВЕН!
+Спасибо за подписку на каналы!
+
+📊 **Использовано сегодня:**
+💬 Диалоги: {daily[chat]}/{limit[chat]}
+🎨 Изображения: {daily[images]}/{limit[images]}
+🎵 Музыка: {daily[music]}/{limit[music]}
+🎬 Видео: {daily[video]}/{limit[video]}
+📄 Документы: {daily[documents]}/{limit[documents]}
+
+📈 **Всего создано с Artemius:**
+• Диалогов: {stats[total_messages]:,}
+• Изображений: {stats[total_images]:,}
+• Композиций: {stats[total_music]:,}
+• Видеороликов: {stats[total_videos]:,}
+• Документов: {stats[total_documents]:,}
+
+⏰ Лимиты обновляются каждый день в 00:00 МСК""",
+            'free': """👤 **Профиль пользователя Artemius AI**
+
+🔒 БАЗОВЫЙ ДОСТУП
+Подпишитесь на каналы для VIP статуса!
+
+📊 **Использовано сегодня:**
+💬 Диалоги: {daily[chat]}/{limit[chat]}
+🎨 Изображения: {daily[images]}/{limit[images]}
+🎵 Музыка: {daily[music]}/{limit[music]}
+🎬 Видео: {daily[video]}/{limit[video]}
+📄 Документы: {daily[documents]}/{limit[documents]}
+
+📈 **Всего создано с Artemius:**
+• Диалогов: {stats[total_messages]:,}
+• Изображений: {stats[total_images]:,}
+• Композиций: {stats[total_music]:,}
+• Видеороликов: {stats[total_videos]:,}
+• Документов: {stats[total_documents]:,}
+
+⏰ Лимиты обновляются каждый день в 00:00 МСК
+
+⭐ **ПОЛУЧИТЕ VIP СТАТУС:**
+Подпишитесь на оба канала и получите:
+
+""" + _RU_VIP_PROMO + """
+
+🚀 Подпишитесь на каналы!""",
+        },
+        'subscription_info': {
+            'vip': """⭐ **VIP СТАТУС УЖЕ АКТИВЕН!**
+
+Спасибо за поддержку наших каналов!
+
+🎯 **Ваши VIP-лимиты:**
+💬 {vip[chat]} диалогов в день
+🎨 {vip[images]} изображений в день
+🎵 {vip[music]} композиций в день
+🎬 {vip[video]} видеороликов в день
+📄 {vip[documents]} анализов документов в день
+
+🏛️ Наслаждайтесь возможностями Artemius AI!""",
+            'free': """⭐ **КАК ПОЛУЧИТЬ VIP СТАТУС?**
+
+📢 **Подпишитесь на ОБА наших канала:**
+
+{channels}
+
+🚀 **Что вы получите:**
+
+**СЕЙЧАС (базовый):**
+💬 {free[chat]} диалогов в день
+🎨 {free[images]} изображений в день
+🎵 {free[music]} композиций в день
+🎬 {free[video]} видео в день
+📄 {free[documents]} документов в день
+
+**ПОСЛЕ ПОДПИСКИ (VIP):**
+💬 **{vip[chat]} диалогов** (+{plus[chat]})
+🎨 **{vip[images]} изображений** (+{plus[images]})
+🎵 **{vip[music]} композиций** (+{plus[music]})
+🎬 **{vip[video]} видео** (+{plus[video]})
+📄 **{vip[documents]} документов** (+{plus[documents]})
+
+⭐ **Подпишитесь на каналы прямо сейчас!**""",
+        },
+        'checking': "🔄 Проверяю подписки...",
+        'check_vip': """✅ **ПОЗДРАВЛЯЕМ! VIP СТАТУС АКТИВИРОВАН!**
+
+🎉 Спасибо за подписку на оба канала!
+
+⭐ **Ваши новые VIP-лимиты:**
+💬 {vip[chat]} диалогов в день
+🎨 {vip[images]} изображений в день
+🎵 {vip[music]} композиций в день
+🎬 {vip[video]} видеороликов в день
+📄 {vip[documents]} документов в день
+
+🚀 Теперь у вас есть доступ к расширенным возможностям Artemius AI!""",
+        'check_missing': """❌ **VIP статус пока недоступен**
+
+📊 **Статус подписок:**
+{status_lines}
+
+📢 **Для получения VIP нужно подписаться на ВСЕ каналы!**
+
+🔍 Убедитесь что вы:
+• Подписались на все каналы
+• НЕ заблокировали каналы
+• Подождали 1-2 минуты после подписки
+
+🔄 Подпишитесь и попробуйте еще раз!""",
+        'check_pending': """⏳ **Проверяем подписки...**
+
+Возможно нужно подождать минуту для обновления статуса.
+Попробуйте еще раз через 30-60 секунд.""",
+        'channel_ok': "✅ {name}",
+        'channel_missing': "❌ {name}",
+        'skip': """🔒 **Базовый доступ активен**
+
+Вы можете пользоваться ограниченными возможностями:
+
+💬 {free[chat]} диалогов в день
+🎨 {free[images]} изображений в день
+🎵 {free[music]} композиций в день
+🎬 {free[video]} видео в день
+📄 {free[documents]} документов в день
+
+⭐ **В любой момент можете получить VIP**, подписавшись на каналы!""",
+        'main_menu': "🏛️ **Artemius AI — Главное меню**\n\n⭐ **Текущий статус:** {tier[mode]}",
+        'unknown': "🤔 **Artemius не понял команду**\n\n💡 Используйте кнопки меню для навигации",
+        'busy': "⏳ **Artemius сейчас перегружен**\n\n🔁 Попробуйте ещё раз через минуту — лимит не списан",
+        'empty_reply': "🤔 **Artemius не нашёл что ответить**\n\n🔁 Переформулируйте вопрос — лимит не списан",
+        # Генерации: заглушка, ошибка и статусы фоновых задач
+        'progress': "{feature[progress]}",
+        'failed': "{feature[error]}: {error}",
+        'job_queued': "{feature[progress]}\n🕓 Место в очереди: {position}",
+        'job_started': "{feature[progress]}\n⚙️ Генерация началась",
+        'job_running': "{feature[progress]}\n⏳ Генерация идёт {elapsed}",
+        # Ответы без токена HuggingFace (демо-режим)
+        'demo_chat': "🏛️ **Artemius AI обрабатывает:** \"{prompt}\"\n\n💡 Получил ваш запрос! В полной версии использую DeepSeek V3 для глубокого анализа и развернутых ответов на любые вопросы.",
+        'demo_images': "🎨 **Artemius создает изображение:** \"{prompt}\"\n\n⚡ В полной версии использую Stable Diffusion XL для создания качественных изображений по вашему описанию!",
+        'demo_music': "🎵 **Artemius компонует музыку:** \"{prompt}\"\n\n🎼 В полной версии использую MusicGen для создания уникальных композиций в любом жанре!",
+        'demo_video': """🎬 **Artemius Video Studio**
+
+📝 **Создается видео:** {prompt}
+
+⚡ **Параметры:**
+• AI: Veo 3, Kling AI, Pika 2.2
+• Качество: HD (720p-1080p)
+• Длительность: 5-10 секунд
+
+🔄 **Статус:** Генерация...
+⏱️ **Время:** 2-5 минут
+
+💡 В полной версии интегрированы реальные video API!""",
+        'demo_documents': """📄 **Artemius Document Analysis**
+
+✅ Документ успешно обработан!
+
+🔍 **Использованы технологии:**
+• Microsoft TrOCR для распознавания текста
+• Нейросетевая обработка изображения
+• Многоязычный анализ
+
+💡 В полной версии: точное распознавание текста с любых документов, переводы, ответы на вопросы по содержанию!""",
+        'document_text': "📄 **Artemius распознал текст:**\n\n{text}",
+        'document_no_text': "📄 **Artemius распознал текст:**\n\nтекст не найден",
+        'document_wrong_type': "📄 Пришлите документ фотографией или файлом-изображением (JPG, PNG)",
+        'document_too_big': "📄 Файл слишком большой — до 20 МБ",
+        # Команды администратора
+        'profile_busy': "⏳ Профилирование уже идёт, дождитесь отчёта",
+        'profile_started': "🔬 Профилирование {kind} на {seconds} с...",
+        'profile_failed': "❌ Профилирование не удалось: {error}",
+        'broadcast_usage': "📣 /broadcast <текст> — разослать всем, /broadcast stop — прервать",
+        'broadcast_stopped': "⏹ Рассылка #{id} прервана",
+        'broadcast_idle': "📣 Рассылка не идёт",
+        'broadcast_running': "⏳ Рассылка уже идёт, дождитесь её или прервите: /broadcast stop",
+        'broadcast_bad_text': "❌ Текст не отправляется, рассылка не запущена: {error}",
+        'broadcast_starting': "📣 Рассылка запускается...",
+    },
+}
+
+EN = {
+    'tiers': {
+        'vip': {'status': "VIP", 'mode': "VIP mode"},
+        'free': {'status': "Basic", 'mode': "Basic access"},
+    },
+    'features': {
+        'chat': {'name': "chats with Artemius", 'emoji': "💬",
+                 'progress': "🏛️ Artemius is thinking...", 'error': "❌ Artemius is temporarily unavailable"},
+        'images': {'name': "image generations", 'emoji': "🎨",
+                   'progress': "🎨 Artemius is creating...", 'error': "❌ Image generation failed"},
+        'music': {'name': "music tracks", 'emoji': "🎵",
+                  'progress': "🎵 Artemius is composing...", 'error': "❌ Music generation failed"},
+        'video': {'name': "videos", 'emoji': "🎬",
+                  'progress': "🎬 Artemius is creating a video...", 'error': "❌ Video generation failed"},
+        'documents': {'name': "document scans", 'emoji': "📄",
+                      'progress': "📄 Artemius is scanning...", 'error': "❌ OCR failed"},
+    },
+    'buttons': {
+        'chat': "💬 Chat with Artemius",
+        'images': "🎨 Create an image",
+        'music': "🎵 Create a song",
+        'video': "🎬 Create a video",
+        'documents': "📄 Document",
+        'profile': "👤 My profile",
+        'status_vip': "⭐ VIP mode",
+        'status_free': "🔒 Basic access",
+        'get_vip': "📢 Get VIP",
+        'main_menu': "🏠 Main menu",
+        'subscribed': "✅ {name} • Subscribed",
+        'subscribe': "📢 {name} • Subscribe",
+        'separator': "➖ ➖ ➖ ➖ ➖",
+        'check': "🔄 Check subscriptions and get VIP",
+        'skip': "⏭️ Continue with basic access",
+    },
+    'texts': {
+        'start': {
+            'vip': """🏛️ **Welcome, VIP user!**
+
+⭐ **VIP STATUS IS ACTIVE!**
+Thank you for subscribing to our channels!
+
+🚀 **YOUR VIP LIMITS:**
+💬 Chats — **{vip[chat]} per day**
+🎨 Images — **{vip[images]} per day**
+🎵 Music — **{vip[music]} per day**
+🎬 Video — **{vip[video]} per day**
+📄 Documents — **{vip[documents]} per day**
+
+✨ **State-of-the-art AI:**
+• DeepSeek V3 for smart conversations
+• Stable Diffusion for images
+• MusicGen for music
+• Video AI for clips
+• TrOCR for documents
+
+Enjoy your VIP features! 🎯""",
+            'free': """🏛️ **Welcome to Artemius AI!**
+
+🤖 I'm your personal AI assistant with plenty of skills!
+
+🔒 **YOUR CURRENT LIMITS (basic access):**
+💬 Chats — **{free[chat]} per day**
+🎨 Images — **{free[images]} per day**
+🎵 Music — **{free[music]} per day**
+🎬 Video — **{free[video]} per day**
+📄 Documents — **{free[documents]} per day**
+
+⭐ **WANT VIP STATUS?**
+Subscribe to our channels and get:
+
+💬 **{vip[chat]} chats** per day (now {free[chat]})
+🎨 **{vip[images]} images** per day (now {free[images]})
+🎵 **{vip[music]} tracks** per day (now {free[music]})
+🎬 **{vip[video]} videos** per day (now {free[video]})
+📄 **{vip[documents]} documents** per day (now {free[documents]})
+
+🚀 **Subscribe to both channels to get VIP!**""",
+        },
+        'limit_exhausted': {
+            'vip': """🚫 **You have used up your daily {feature[name]}!**
+
+⭐ **VIP status:** {feature[limit]} per day
+⏰ **Limits reset:** tomorrow at 00:00 Moscow time
+
+💡 Meanwhile, try the other Artemius features!""",
+            'free': """🚫 **You have used up your daily {feature[name]}!**
+
+{feature[emoji]} **Current limit:** {feature[limit]} per day
+
+⭐ **Subscribe to the channels to get VIP status!**
+
+🎯 **VIP limit:** {feature[vip]} per day (+{feature[plus]} more!)
+
+🚀 **ALL VIP BONUSES:**
+""" + _EN_VIP_PROMO + """
+
+📢 **Subscribe to both channels right now!**""",
+        },
+        'enter_chat': """🏛️ **Artemius is ready to talk!**
+
+⭐ **Status:** {tier[status]} access
+💡 **Messages left:** {remaining}
+
+🧠 Ask anything — I can help with programming, creative work, problem solving and much more!""",
+        'enter_images': """🎨 **Artemius Art Studio is on!**
+
+⭐ **Status:** {tier[status]} access
+💡 **Images left:** {remaining}
+
+🖼️ **Prompt ideas:**
+• A mystical forest with magical creatures
+• A cyberpunk city with neon lights
+• A fantasy elf portrait
+• A spaceship among the stars
+
+Describe what to create:""",
+        'enter_music': """🎵 **Artemius Music Composer is on!**
+
+⭐ **Status:** {tier[status]} access
+💡 **Tracks left:** {remaining}
+
+🎼 **Prompt ideas:**
+• Epic orchestral film score
+• Relaxing jazz for work
+• Energetic electronic music for workouts
+• A romantic piano melody
+
+Describe the music to create:""",
+        'enter_video': """🎬 **Artemius Video Producer is on!**
+
+⭐ **Status:** {tier[status]} access
+💡 **Videos left:** {remaining}
+
+🎥 **Available AI services:**
+🌊 **Veo 3** — realistic nature scenes
+🤖 **Kling AI** — fast HD generation
+🧡 **Hailuo 02** — creative effects
+🐰 **Pika 2.2** — professional quality
+
+📱 **Output:** HD (720p-1080p) • 5-10 sec
+
+Describe the video to create:""",
+        'enter_documents': """📄 **Artemius Document Analyzer is on!**
+
+⭐ **Status:** {tier[status]} access
+💡 **Scans left:** {remaining}
+
+🔍 **Artemius can read:**
+• Scanned documents and certificates
+• Handwritten notes
+• Receipts and invoices
+• Tables and forms
+
+📸 Send a photo of the document or an image file:""",
+        'profile': {
+            'vip': """👤 **Artemius AI profile**
+
+⭐ VIP STATUS IS ACTIVE!
+Thank you for subscribing!
+
+📊 **Used today:**
+💬 Chats: {daily[chat]}/{limit[chat]}
+🎨 Images: {daily[images]}/{limit[images]}
+🎵 Music: {daily[music]}/{limit[music]}
+🎬 Video: {daily[video]}/{limit[video]}
+📄 Documents: {daily[documents]}/{limit[documents]}
+
+📈 **Created with Artemius so far:**
+• Chats: {stats[total_messages]:,}
+• Images: {stats[total_images]:,}
+• Tracks: {stats[total_music]:,}
+• Videos: {stats[total_videos]:,}
+• Documents: {stats[total_documents]:,}
+
+⏰ Limits reset every day at 00:00 Moscow time""",
+            'free': """👤 **Artemius AI profile**
+
+🔒 BASIC ACCESS
+Subscribe to the channels for VIP status!
+
+📊 **Used today:**
+💬 Chats: {daily[chat]}/{limit[chat]}
+🎨 Images: {daily[images]}/{limit[images]}
+🎵 Music: {daily[music]}/{limit[music]}
+🎬 Video: {daily[video]}/{limit[video]}
+📄 Documents: {daily[documents]}/{limit[documents]}
+
+📈 **Created with Artemius so far:**
+• Chats: {stats[total_messages]:,}
+• Images: {stats[total_images]:,}
+• Tracks: {stats[total_music]:,}
+• Videos: {stats[total_videos]:,}
+• Documents: {stats[total_documents]:,}
+
+⏰ Limits reset every day at 00:00 Moscow time
+
+⭐ **GET VIP STATUS:**
+Subscribe to both channels and get:
+
+""" + _EN_VIP_PROMO + """
+
+🚀 Subscribe to the channels!""",
+        },
+        'subscription_info': {
+            'vip': """⭐ **VIP STATUS IS ALREADY ACTIVE!**
+
+Thank you for supporting our channels!
+
+🎯 **Your VIP limits:**
+💬 {vip[chat]} chats per day
+🎨 {vip[images]} images per day
+🎵 {vip[music]} tracks per day
+🎬 {vip[video]} videos per day
+📄 {vip[documents]} document scans per day
+
+🏛️ Enjoy Artemius AI!""",
+            'free': """⭐ **HOW TO GET VIP STATUS?**
+
+📢 **Subscribe to BOTH of our channels:**
+
+{channels}
+
+🚀 **What you get:**
+
+**NOW (basic):**
+💬 {free[chat]} chats per day
+🎨 {free[images]} images per day
+🎵 {free[music]} tracks per day
+🎬 {free[video]} videos per day
+📄 {free[documents]} documents per day
+
+**AFTER SUBSCRIBING (VIP):**
+💬 **{vip[chat]} chats** (+{plus[chat]})
+🎨 **{vip[images]} images** (+{plus[images]})
+🎵 **{vip[music]} tracks** (+{plus[music]})
+🎬 **{vip[video]} videos** (+{plus[video]})
+📄 **{vip[documents]} documents** (+{plus[documents]})
+
+⭐ **Subscribe to the channels right now!**""",
+        },
+        'checking': "🔄 Checking subscriptions...",
+        'check_vip': """✅ **CONGRATULATIONS! VIP STATUS ACTIVATED!**
+
+🎉 Thank you for subscribing to both channels!
+
+⭐ **Your new VIP limits:**
+💬 {vip[chat]} chats per day
+🎨 {vip[images]} images per day
+🎵 {vip[music]} tracks per day
+🎬 {vip[video]} videos per day
+📄 {vip[documents]} documents per day
+
+🚀 You now have access to the extended Artemius AI features!""",
+        'check_missing': """❌ **VIP status is not available yet**
+
+📊 **Subscriptions:**
+{status_lines}
+
+📢 **You need to subscribe to ALL channels for VIP!**
+
+🔍 Make sure that you:
+• Subscribed to every channel
+• Did NOT block the channels
+• Waited 1-2 minutes after subscribing
+
+🔄 Subscribe and try again!""",
+        'check_pending': """⏳ **Checking subscriptions...**
+
+The status may take a minute to update.
+Please try again in 30-60 seconds.""",
+        'channel_ok': "✅ {name}",
+        'channel_missing': "❌ {name}",
+        'skip': """🔒 **Basic access is active**
+
+You can use the limited features:
+
+💬 {free[chat]} chats per day
+🎨 {free[images]} images per day
+🎵 {free[music]} tracks per day
+🎬 {free[video]} videos per day
+📄 {free[documents]} documents per day
+
+⭐ **You can get VIP at any time** by subscribing to the channels!""",
+        'main_menu': "🏛️ **Artemius AI — Main menu**\n\n⭐ **Current status:** {tier[mode]}",
+        'unknown': "🤔 **Artemius did not understand the command**\n\n💡 Use the menu buttons to navigate",
+        'busy': "⏳ **Artemius is overloaded right now**\n\n🔁 Please try again in a minute — your limit was not used",
+        'empty_reply': "🤔 **Artemius found nothing to say**\n\n🔁 Try rephrasing the question — your limit was not used",
+        # Генерации: заглушка, ошибка и статусы фоновых задач
+        'progress': "{feature[progress]}",
+        'failed': "{feature[error]}: {error}",
+        'job_queued': "{feature[progress]}\n🕓 Place in queue: {position}",
+        'job_started': "{feature[progress]}\n⚙️ Generation has started",
+        'job_running': "{feature[progress]}\n⏳ Generating for {elapsed}",
+        # Ответы без токена HuggingFace (демо-режим)
+        'demo_chat': "🏛️ **Artemius AI is processing:** \"{prompt}\"\n\n💡 Got your request! The full version uses DeepSeek V3 for in-depth analysis and detailed answers to any question.",
+        'demo_images': "🎨 **Artemius is creating an image:** \"{prompt}\"\n\n⚡ The full version uses Stable Diffusion XL to create high-quality images from your description!",
+        'demo_music': "🎵 **Artemius is composing music:** \"{prompt}\"\n\n🎼 The full version uses MusicGen to create unique tracks in any genre!",
+        'demo_video': """🎬 **Artemius Video Studio**
+
+📝 **Creating a video:** {prompt}
+
+⚡ **Settings:**
+• AI: Veo 3, Kling AI, Pika 2.2
+• Quality: HD (720p-1080p)
+• Length: 5-10 seconds
+
+🔄 **Status:** Generating...
+⏱️ **Time:** 2-5 minutes
+
+💡 The full version integrates real video APIs!""",
+        'demo_documents': """📄 **Artemius Document Analysis**
+
+✅ The document has been processed!
+
+🔍 **Technologies used:**
+• Microsoft TrOCR for text recognition
+• Neural image processing
+• Multilingual analysis
+
+💡 In the full version: accurate text recognition from any document, translations, answers to questions about the content!""",
+        'document_text': "📄 **Artemius recognized the text:**\n\n{text}",
+        'document_no_text': "📄 **Artemius recognized the text:**\n\nno text found",
+        'document_wrong_type': "📄 Send the document as a photo or an image file (JPG, PNG)",
+        'document_too_big': "📄 The file is too large — up to 20 MB",
+        # Команды администратора
+        'profile_busy': "⏳ Profiling is already running, wait for the report",
+        'profile_started': "🔬 Profiling {kind} for {seconds} s...",
+        'profile_failed': "❌ Profiling failed: {error}",
+        'broadcast_usage': "📣 /broadcast <text> — send to everyone, /broadcast stop — stop",
+        'broadcast_stopped': "⏹ Broadcast #{id} stopped",
+        'broadcast_idle': "📣 No broadcast is running",
+        'broadcast_running': "⏳ A broadcast is already running, wait for it or stop it: /broadcast stop",
+        'broadcast_bad_text': "❌ The text cannot be sent, the broadcast was not started: {error}",
+        'broadcast_starting': "📣 Starting the broadcast...",
+    },
+}
+
+CATALOG = {'ru': RU, 'en': EN}
@@ -0,0 +1,72 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from membership import MembershipCache
+from quota import BaseQuotaStore, DailyUsage
+
+logger = logging.getLogger(__name__)
+
+
+class UserContext:
+    """Статус и лимиты пользователя, вычисленные один раз на апдейт"""
+
+    __slots__ = ('user_id', 'subscriptions', 'is_vip', 'limits', 'daily', 'language')
+
+    def __init__(self, user_id: int, subscriptions: Dict[str, bool],
+                 limits: Dict[str, int], daily: DailyUsage, language: Optional[str] = None):
+        self.user_id = user_id
+        self.subscriptions = subscriptions
+        self.is_vip = all(subscriptions.values())
+        self.limits = limits
+        # Счётчики дня на момент начала апдейта
+        self.daily = daily
+        # language_code из Telegram — по нему выбирается язык текстов
+        self.language = language
+
+    def remaining(self, feature: str) -> int:
+        """Сколько осталось использований функции сегодня"""
+        return self.limits[feature] - self.daily[feature]
+
+    def has_quota(self, feature: str) -> bool:
+        return self.daily[feature] < self.limits[feature]
+
+
+class RequestContextMiddleware(BaseMiddleware):
+    """Собирает UserContext один раз и передаёт его хендлерам как `ctx`"""
+
+    def __init__(self, membership: MembershipCache, quotas: BaseQuotaStore,
+                 free_limits: Dict[str, int], vip_limits: Dict[str, int]):
+        self.membership = membership
+        self.quotas = quotas
+        self.free_limits = free_limits
+        self.vip_limits = vip_limits
+
+    async def resolve(self, user_id: int, language: Optional[str] = None) -> UserContext:
+        """Построить контекст пользователя (параллельные промахи кэша объединяются)"""
+        subscriptions, daily = await asyncio.gather(
+            self.membership.get_statuses(user_id), self.quotas.get_usage(user_id),
+            return_exceptions=True
+        )
+        if isinstance(subscriptions, BaseException):
+            logger.error(f"Ошибка проверки подписки: {subscriptions}")
+            subscriptions = {ch["id"]: False for ch in self.membership.channels}
+        if isinstance(daily, BaseException):
+            raise daily
+        is_vip = all(subscriptions.values())
+        limits = self.vip_limits if is_vip else self.free_limits
+        return UserContext(user_id, subscriptions, limits, daily, language)
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        if user is not None and "ctx" not in data:
+            data["ctx"] = await self.resolve(user.id, user.language_code)
+        return await handler(event, data)
@@ -0,0 +1,157 @@
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+# Токенизатора модели в процессе нет: оценка ~4 символа на токен
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def clip(text: str, tokens: int) -> str:
+    """Обрезать текст до оценки в `tokens` токенов"""
+    limit = tokens * CHARS_PER_TOKEN
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+class Conversation:
+    """Последние обмены репликами и сжатая выжимка более старых"""
+
+    __slots__ = ('turns', 'summary', 'tokens', 'used_at')
+
+    def __init__(self):
+        # (вопрос, ответ, токенов) — от старых к новым
+        self.turns: Deque[Tuple[str, str, int]] = deque()
+        # (строка выжимки, токенов) — от старых к новым
+        self.summary: Deque[Tuple[str, int]] = deque()
+        self.tokens = 0
+        self.used_at = time.monotonic()
+
+
+class ConversationStore:
+    """Память диалогов для чата: бюджет токенов на пользователя и общий лимит
+
+    У каждого диалога не больше `budget_tokens` (оценка): реплики длиннее
+    `max_turn_tokens` обрезаются, а обмены, не влезающие в бюджет, с головы
+    сжимаются в строку выжимки по первым словам вопроса и ответа. Выжимка
+    занимает не больше четверти бюджета, старые строки из неё выпадают.
+    Поэтому сборка промпта стоит O(бюджет), сколько бы ни длился разговор.
+
+    Диалоги упорядочены по последнему обращению (OrderedDict): простаивающие
+    дольше `idle_ttl` снимаются с головы при каждой записи, а при превышении
+    общего лимита `max_tokens` вытесняются давно не использованные.
+    """
+
+    def __init__(self, budget_tokens: int = 1024, max_turn_tokens: int = 256, digest_tokens: int = 24,
+                 max_tokens: int = 4_000_000, idle_ttl: Optional[float] = 3600):
+        self.budget_tokens = budget_tokens
+        self.max_turn_tokens = max_turn_tokens
+        self.digest_tokens = digest_tokens
+        self.summary_tokens = budget_tokens // 4
+        self.max_tokens = max_tokens
+        self.idle_ttl = idle_ttl
+        self._conversations: "OrderedDict[int, Conversation]" = OrderedDict()
+        self.total_tokens = 0
+        self.compacted = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._conversations)
+
+    def _get(self, user_id: int) -> Optional[Conversation]:
+        conversation = self._conversations.get(user_id)
+        if conversation is None:
+            return None
+        if self.idle_ttl is not None and conversation.used_at + self.idle_ttl <= time.monotonic():
+            self._drop(user_id)
+            self.expirations += 1
+            return None
+        return conversation
+
+    def _drop(self, user_id: int):
+        conversation = self._conversations.pop(user_id)
+        self.total_tokens -= conversation.tokens
+
+    def build_prompt(self, user_id: int, message: str) -> str:
+        """Промпт в формате Mistral Instruct: выжимка, последние обмены и новое сообщение"""
+        message = clip(message, self.max_turn_tokens)
+        conversation = self._get(user_id)
+        if conversation is None:
+            return f"<s>[INST] {message} [/INST]"
+
+        parts = ["<s>"]
+        preface = ""
+        if conversation.summary:
+            preface = "Ранее в разговоре:\n" + "\n".join(line for line, _ in conversation.summary) + "\n\n"
+        for question, answer, _ in conversation.turns:
+            parts.append(f"[INST] {preface}{question} [/INST] {answer}</s>")
+            preface = ""
+        parts.append(f"[INST] {preface}{message} [/INST]")
+        return "".join(parts)
+
+    def append(self, user_id: int, question: str, answer: str):
+        """Запомнить обмен репликами; лишнее по бюджету сжать, по общему лимиту — вытеснить"""
+        now = time.monotonic()
+        conversation = self._get(user_id)
+        if conversation is None:
+            conversation = self._conversations[user_id] = Conversation()
+        self._conversations.move_to_end(user_id)
+        conversation.used_at = now
+
+        question = clip(question, self.max_turn_tokens)
+        answer = clip(answer, self.max_turn_tokens)
+        tokens = estimate_tokens(question) + estimate_tokens(answer)
+        conversation.turns.append((question, answer, tokens))
+        added = tokens
+
+        # Старые обмены — в выжимку, пока диалог не уложится в бюджет
+        while conversation.tokens + added > self.budget_tokens and len(conversation.turns) > 1:
+            old_question, old_answer, old_tokens = conversation.turns.popleft()
+            line = (f"— {clip(old_question, self.digest_tokens // 2)} → "
+                    f"{clip(old_answer, self.digest_tokens // 2)}")
+            line_tokens = estimate_tokens(line)
+            conversation.summary.append((line, line_tokens))
+            added += line_tokens - old_tokens
+            self.compacted += 1
+        summary = sum(line_tokens for _, line_tokens in conversation.summary)
+        while summary > self.summary_tokens:
+            _, line_tokens = conversation.summary.popleft()
+            summary -= line_tokens
+            added -= line_tokens
+
+        conversation.tokens += added
+        self.total_tokens += added
+        self._sweep(now)
+        while self.total_tokens > self.max_tokens and len(self._conversations) > 1:
+            self._drop(next(iter(self._conversations)))
+            self.evictions += 1
+
+    def _sweep(self, now: float, limit: int = 8):
+        """Снять несколько простаивающих диалогов с головы очереди"""
+        if self.idle_ttl is None:
+            return
+        for _ in range(limit):
+            if not self._conversations:
+                return
+            user_id, conversation = next(iter(self._conversations.items()))
+            if conversation.used_at + self.idle_ttl > now:
+                return
+            self._drop(user_id)
+            self.expirations += 1
+
+    def clear(self, user_id: int):
+        if user_id in self._conversations:
+            self._drop(user_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'conversations': len(self._conversations),
+            'tokens': self.total_tokens,
+            'max_tokens': self.max_tokens,
+            'compacted': self.compacted,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
@@ -0,0 +1,317 @@
+import asyncio
+import logging
+import time
+from collections import Counter
+from contextlib import nullcontext
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from aiogram import Bot, types
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.methods import TelegramMethod
+
+from outbound import bulk_priority
+
+logger = logging.getLogger(__name__)
+
+# Лимит Telegram на текст сообщения — в единицах UTF-16
+MAX_MESSAGE_LENGTH = 4096
+# Признак, что ответ ещё печатается
+STREAM_CURSOR = " ▌"
+
+
+def _is_parse_error(error: TelegramBadRequest) -> bool:
+    return "can't parse entities" in error.message
+
+
+async def send_text(bot: Bot, chat_id: int, text: str, parse_mode: str = "Markdown", **kwargs) -> types.Message:
+    """Отправить текст; если разметка не разобралась — простым текстом"""
+    try:
+        return await bot.send_message(chat_id, text, parse_mode=parse_mode, **kwargs)
+    except TelegramBadRequest as e:
+        if not _is_parse_error(e):
+            raise
+        logger.warning(f"Разметка не разобралась, отправляем без неё: {e.message}")
+        return await bot.send_message(chat_id, text, parse_mode=None, **kwargs)
+
+
+async def edit_text(bot: Bot, chat_id: int, message_id: int, text: str,
+                    parse_mode: str = "Markdown", **kwargs) -> Any:
+    """Превратить сообщение-заглушку в ответ
+
+    Если разметка не разобралась (например, в ответе процитирован запрос
+    пользователя) — повторяем простым текстом. Если заглушки уже нет —
+    отправляем ответ новым сообщением.
+    """
+    try:
+        return await bot.edit_message_text(text, chat_id=chat_id, message_id=message_id,
+                                           parse_mode=parse_mode, **kwargs)
+    except TelegramBadRequest as e:
+        if _is_parse_error(e):
+            logger.warning(f"Разметка не разобралась, правим без неё: {e.message}")
+            return await bot.edit_message_text(text, chat_id=chat_id, message_id=message_id,
+                                               parse_mode=None, **kwargs)
+        if "message is not modified" in e.message:
+            return True
+        if "message to edit not found" in e.message:
+            return await send_text(bot, chat_id, text, parse_mode=parse_mode, **kwargs)
+        raise
+
+
+class ApiCallCounter(BaseRequestMiddleware):
+    """Сколько запросов к Bot API уходит на один обработанный апдейт
+
+    Как middleware сессии считает каждый запрос по методам; как outer
+    middleware на `dp.update` относит запросы к апдейту, в обработке
+    которого они сделаны.
+    """
+
+    def __init__(self):
+        self._current: ContextVar[Optional[list]] = ContextVar('api_calls', default=None)
+        self.updates = 0
+        self.update_calls = 0
+        self.by_method: Counter = Counter()
+
+    async def __call__(self, make_request: NextRequestMiddlewareType, bot: Bot, method: TelegramMethod):
+        calls = self._current.get()
+        if calls is not None:
+            calls[0] += 1
+        self.by_method[method.__api_method__] += 1
+        return await make_request(bot, method)
+
+    async def on_update(self, handler: Callable[[types.Update, Dict[str, Any]], Awaitable[Any]],
+                        event: types.Update, data: Dict[str, Any]) -> Any:
+        calls = [0]
+        token = self._current.set(calls)
+        try:
+            return await handler(event, data)
+        finally:
+            self._current.reset(token)
+            self.updates += 1
+            self.update_calls += calls[0]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'updates': self.updates,
+            'calls': self.update_calls,
+            'calls_per_update': self.update_calls / self.updates if self.updates else 0.0,
+            'by_method': dict(self.by_method.most_common()),
+        }
+
+
+def _utf16_len(text: str) -> int:
+    return len(text.encode('utf-16-le')) // 2
+
+
+def _fit(text: str, limit: int) -> int:
+    """Сколько первых символов `text` укладывается в `limit` единиц UTF-16"""
+    if _utf16_len(text) <= limit:
+        return len(text)
+    units = 0
+    for index, char in enumerate(text):
+        units += 2 if ord(char) > 0xFFFF else 1
+        if units > limit:
+            return index
+    return len(text)
+
+
+def markdown_state(text: str) -> Tuple[Optional[str], Optional[int]]:
+    """Незакрытая сущность Markdown в конце текста и начало незакрытой ссылки
+
+    В Markdown Telegram (не V2) сущности не вкладываются: открыта может быть
+    только одна — *, _, `, ``` или ссылка [текст](адрес); обратный слеш
+    экранирует символ только вне сущностей.
+    """
+    marker: Optional[str] = None
+    link_start: Optional[int] = None
+    index = 0
+    while index < len(text):
+        char = text[index]
+        if marker is None:
+            if char == '\\':
+                index += 2
+                continue
+            if text.startswith('```', index):
+                marker = '```'
+                index += 3
+                continue
+            if char in '*_`':
+                marker = char
+            elif char == '[':
+                marker, link_start = '[', index
+        elif marker == '```':
+            if text.startswith('```', index):
+                marker = None
+                index += 3
+                continue
+        elif marker == '[':
+            if char == ')' and ']' in text[link_start:index]:
+                marker, link_start = None, None
+        elif char == marker:
+            marker = None
+        index += 1
+    return marker, link_start
+
+
+def close_markdown(text: str) -> Tuple[str, str]:
+    """Текст, безопасный для показа на месте обрыва, и что открыть в продолжении
+
+    Незакрытая сущность закрывается, недописанная ссылка прячется до конца
+    (её адрес ещё не пришёл), висящий обратный слеш отбрасывается.
+    """
+    marker, link_start = markdown_state(text)
+    if marker == '[':
+        text = text[:link_start]
+        marker, _ = markdown_state(text)
+    if marker is None:
+        if (len(text) - len(text.rstrip('\\'))) % 2:
+            text = text[:-1]
+        return text, ''
+    return text + marker, marker
+
+
+class StreamingReply:
+    """Ответ, который дописывается в сообщение по мере генерации
+
+    Куски текста копятся в буфере, а сообщение правится в фоне не чаще раза
+    в `interval` секунд. Лимит Telegram на личный чат — около сообщения в
+    секунду (его соблюдает OutboundScheduler); правки вдвое реже оставляют
+    запас на перенос и окончательную правку, и конец ответа не ждёт. Пришедшее
+    за время правки уходит следующей правкой, даже если генерация замолчала.
+    На каждом обрыве разметка закрывается, чтобы правка не упала на разборе.
+    Когда текст подходит к 4096 символам, сообщение заканчивается на удобном
+    месте (перевод строки, пробел), и ответ продолжается новым сообщением.
+    Промежуточные правки после первой идут с приоритетом рассылок: под общим
+    лимитом бота первыми уходят начала и концы ответов.
+    """
+
+    def __init__(self, bot: Bot, chat_id: int, message_id: int, interval: float = 2.0,
+                 max_length: int = MAX_MESSAGE_LENGTH, parse_mode: str = "Markdown"):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.interval = interval
+        self.max_length = max_length
+        self.parse_mode = parse_mode
+        # Запас под закрытие разметки и курсор
+        self._limit = max_length - len(STREAM_CURSOR) - 3
+        self._pieces: List[str] = []
+        self._length = 0
+        self._shown = ""
+        self._edited_at = 0.0
+        self._lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+        self.edits = 0
+        self.messages = 1
+        # Когда пользователь увидел первый текст ответа (perf_counter, для замеров)
+        self.first_visible_at: Optional[float] = None
+
+    @property
+    def text(self) -> str:
+        """Текст текущего сообщения, ещё не законченный"""
+        if len(self._pieces) > 1:
+            self._pieces = ["".join(self._pieces)]
+        return self._pieces[0] if self._pieces else ""
+
+    async def _show(self, text: str):
+        if text == self._shown:
+            return
+        result = await edit_text(self.bot, self.chat_id, self.message_id, text, parse_mode=self.parse_mode)
+        # Заглушку удалили — edit_text отправил новое сообщение, дальше правим его
+        if isinstance(result, types.Message):
+            self.message_id = result.message_id
+        self._shown = text
+        self._edited_at = time.monotonic()
+        self.edits += 1
+        if self.first_visible_at is None:
+            self.first_visible_at = time.perf_counter()
+
+    def _too_long(self) -> bool:
+        # В UTF-16 символ занимает одну или две единицы: точный подсчёт — только у границы
+        return self._length * 2 > self._limit and _utf16_len(self.text) > self._limit
+
+    def _cut(self, text: str) -> int:
+        """Где закончить сообщение: по строке или слову, не разрывая ссылку"""
+        limit = cut = _fit(text, self._limit)
+        for separator in ('\n', ' '):
+            position = text.rfind(separator, 0, cut)
+            if position > cut // 2:
+                cut = position
+                break
+        marker, link_start = markdown_state(text[:cut])
+        if marker == '[' and link_start is not None:
+            cut = link_start
+            # Пробел нашёлся внутри ссылки в начале, а целиком она помещается — режем за ней
+            if not cut and markdown_state(text[:limit])[0] != '[':
+                cut = limit
+        return cut
+
+    async def _roll_over(self):
+        """Закончить текущее сообщение и перенести хвост в новое"""
+        text = self.text
+        cut = self._cut(text)
+        if not cut:
+            # Ссылка с самого начала не помещается в сообщение: вместо пустой
+            # правки режем жёстко, а её скобку экранируем — она станет текстом
+            text = '\\' + text
+            cut = self._cut(text)
+        head, reopen = close_markdown(text[:cut])
+        # Отброшенный слеш уходит в продолжение вместе с экранированным символом
+        tail = reopen + text[len(head) - len(reopen):].lstrip(' \n')
+
+        await self._show(head)
+        message = await send_text(self.bot, self.chat_id, tail + STREAM_CURSOR, parse_mode=self.parse_mode)
+        self.message_id = message.message_id
+        self.messages += 1
+        self._pieces = [tail]
+        self._length = len(tail)
+        self._shown = tail + STREAM_CURSOR
+
+    async def _flush_later(self):
+        try:
+            while True:
+                # Ждём без блокировки: перенос в новое сообщение не должен стоять за паузой
+                while (delay := self._edited_at + self.interval - time.monotonic()) > 0:
+                    await asyncio.sleep(delay)
+                async with self._lock:
+                    # Пока ждали, сообщение правил перенос — ждём остаток интервала от его правки
+                    if self._edited_at + self.interval > time.monotonic():
+                        continue
+                    # Куски, пришедшие во время правки, запланируют следующую
+                    self._flush_task = None
+                    shown, _ = close_markdown(self.text)
+                    # Длинный текст сначала разрежет feed
+                    if not shown.strip() or self._too_long():
+                        return
+                    # Промежуточные правки уступают первым и окончательным ответам
+                    with bulk_priority() if self.first_visible_at is not None else nullcontext():
+                        await self._show(shown + STREAM_CURSOR)
+                    return
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Не удалось обновить потоковый ответ в {self.chat_id}: {e}")
+
+    async def feed(self, piece: str):
+        """Добавить кусок ответа; показ — в фоне, с учётом `interval`"""
+        self._pieces.append(piece)
+        self._length += len(piece)
+        if self._too_long():
+            async with self._lock:
+                while self._too_long():
+                    await self._roll_over()
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def finish(self, empty_text: str = ""):
+        """Показать ответ целиком, без курсора; без ответа заглушку сменит `empty_text`"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        async with self._lock:
+            text = self.text
+            if text.strip():
+                await self._show(close_markdown(text)[0])
+            elif empty_text:
+                await self._show(empty_text)
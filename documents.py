@@ -0,0 +1,132 @@
+import asyncio
+import io
+import logging
+from concurrent.futures import Executor
+from typing import Awaitable, Callable, Dict, List, Optional, Union
+
+from aiogram import Bot, types
+from PIL import Image, ImageOps
+
+from cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Больше Bot API через getFile не отдаёт
+MAX_DOCUMENT_BYTES = 20 * 1024 * 1024
+
+# Сторона, до которой уменьшаем скан перед OCR: мелкий текст ещё читается,
+# а модель и сеть не получают лишних мегапикселей
+OCR_MAX_SIDE = 1600
+
+DocumentFile = Union[types.PhotoSize, types.Document]
+
+
+def pick_photo_size(sizes: List[types.PhotoSize], target_side: int = OCR_MAX_SIDE) -> types.PhotoSize:
+    """Наименьший вариант фото, которого хватает для OCR, иначе самый крупный"""
+    ordered = sorted(sizes, key=lambda size: size.width * size.height)
+    for size in ordered:
+        if max(size.width, size.height) >= target_side:
+            return size
+    return ordered[-1]
+
+
+def is_image_document(document: types.Document) -> bool:
+    return bool(document.mime_type) and document.mime_type.startswith('image/')
+
+
+def _row_profile_score(image: Image.Image) -> float:
+    """Разброс яркости строк: у ровного текста строки и пробелы чётко разделены"""
+    rows = list(image.resize((1, image.height), Image.BOX).getdata())
+    mean = sum(rows) / len(rows)
+    return sum((row - mean) ** 2 for row in rows)
+
+
+def skew_angle(gray: Image.Image, max_angle: float = 5, step: float = 0.5) -> float:
+    """Угол наклона строк, подобранный по профилю на уменьшенной копии"""
+    small = gray.copy()
+    small.thumbnail((400, 400))
+    # Текст светлый на чёрном — углы после поворота заполняются фоном
+    inverted = ImageOps.invert(small)
+    best_angle, best_score = 0.0, -1.0
+    steps = int(max_angle / step)
+    for i in range(-steps, steps + 1):
+        angle = i * step
+        score = _row_profile_score(inverted.rotate(angle, resample=Image.BILINEAR))
+        if score > best_score:
+            best_angle, best_score = angle, score
+    return best_angle
+
+
+def prepare_image(data: bytes, max_side: int = OCR_MAX_SIDE) -> bytes:
+    """Декодировать, выровнять и уменьшить скан; вернуть PNG в оттенках серого
+
+    Выполняется в пуле потоков: Pillow отпускает GIL на декодировании,
+    повороте и ресайзе.
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        # JPEG сразу декодируется в уменьшенном масштабе — меньше памяти и времени
+        image.draft('L', (max_side, max_side))
+        image = ImageOps.exif_transpose(image).convert('L')
+
+    image.thumbnail((max_side, max_side), Image.LANCZOS)
+    angle = skew_angle(image)
+    if angle:
+        image = image.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=255)
+
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG', optimize=False)
+    return buffer.getvalue()
+
+
+class DocumentIntake:
+    """Приём документов: скачивание в память, подготовка и кэш распознаваний
+
+    Файл скачивается сразу в буфер в памяти, без временных файлов.
+    Подготовка изображения идёт в пуле потоков, а не в event loop.
+    Результат OCR кэшируется по `file_unique_id`, поэтому повторно
+    присланный тот же файл не скачивается и не распознаётся заново.
+    """
+
+    def __init__(self, bot: Bot, executor: Optional[Executor] = None,
+                 max_side: int = OCR_MAX_SIDE, cache_size: int = 10_000, cache_ttl: float = 86400):
+        self.bot = bot
+        self.executor = executor
+        self.max_side = max_side
+        self._results = TTLCache(cache_size, ttl=cache_ttl)
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def select(self, message: types.Message) -> Optional[DocumentFile]:
+        """Файл для распознавания из сообщения: фото или картинка, присланная файлом"""
+        if message.photo:
+            return pick_photo_size(message.photo, self.max_side)
+        if message.document is not None and is_image_document(message.document):
+            return message.document
+        return None
+
+    async def _prepare(self, file: DocumentFile) -> bytes:
+        buffer = await self.bot.download(file, destination=io.BytesIO())
+        data = buffer.getvalue()
+        buffer.close()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, prepare_image, data, self.max_side)
+
+    async def _recognize(self, file: DocumentFile, ocr: Callable[[bytes], Awaitable[str]]) -> str:
+        text = await ocr(await self._prepare(file))
+        self._results.set(file.file_unique_id, text)
+        return text
+
+    async def recognize(self, file: DocumentFile, ocr: Callable[[bytes], Awaitable[str]]) -> str:
+        """Текст документа: из кэша или через скачивание, подготовку и `ocr`"""
+        key = file.file_unique_id
+        text = self._results.get(key)
+        if text is not None:
+            return text
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._recognize(file, ocr))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(future)
+
+    def stats(self):
+        return self._results.stats()
@@ -0,0 +1,176 @@
+import asyncio
+import base64
+import io
+import json
+import logging
+import random
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import aiohttp
+
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+HF_API_URL = "https://api-inference.huggingface.co/models"
+
+# Больше этого ответ модели в память не читаем
+MAX_RESPONSE_BYTES = 20 * 1024 * 1024
+
+
+class InferenceError(Exception):
+    """Бэкенд вернул ошибку или не ответил за отведённое время"""
+
+
+class ModelConfig:
+    """Модель на HuggingFace и ограничения на обращения к ней
+
+    `batch_size` больше 1 — эндпоинт принимает список промптов и отвечает
+    списком файлов (Inference Endpoints с пакетным обработчиком).
+    """
+
+    __slots__ = ('name', 'timeout', 'concurrency', 'batch_size')
+
+    def __init__(self, name: str, timeout: float = 60, concurrency: int = 4, batch_size: int = 1):
+        self.name = name
+        self.timeout = timeout
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+
+
+class InferenceClient:
+    """Общий асинхронный клиент HuggingFace Inference API
+
+    Одна сессия aiohttp с keep-alive на весь процесс, свой семафор на каждую
+    модель, повтор с джиттером, пока модель загружается (503), и чтение
+    ответа потоком в буфер в памяти.
+    """
+
+    def __init__(self, token: str, models: Dict[str, ModelConfig], base_url: str = HF_API_URL,
+                 max_connections: int = 100, max_retries: int = 5, backoff_cap: float = 30):
+        self.token = token
+        self.models = models
+        self.base_url = base_url.rstrip('/')
+        self.max_connections = max_connections
+        self.max_retries = max_retries
+        self.backoff_cap = backoff_cap
+        self._semaphores = {
+            feature: asyncio.Semaphore(model.concurrency) for feature, model in models.items()
+        }
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers={"Authorization": f"Bearer {self.token}"} if self.token else {},
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _backoff(self, attempt: int, estimated_time: Optional[float]) -> float:
+        """Пауза перед повтором: экспонента (или оценка от HF) с полным джиттером"""
+        base = estimated_time if estimated_time else 2 ** attempt
+        return random.uniform(0, min(base, self.backoff_cap))
+
+    async def _read_body(self, response: aiohttp.ClientResponse) -> bytes:
+        buffer = io.BytesIO()
+        async for chunk in response.content.iter_chunked(64 * 1024):
+            buffer.write(chunk)
+            if buffer.tell() > MAX_RESPONSE_BYTES:
+                raise InferenceError("Ответ модели слишком большой")
+        return buffer.getvalue()
+
+    @asynccontextmanager
+    async def _response(self, feature: str, payload: Any = None, data: bytes = None):
+        """Ответ модели функции `feature` со статусом 200
+
+        С ожиданием слота модели и повторами, пока она загружается; слот
+        занят, пока вызывающий читает ответ.
+        """
+        model = self.models[feature]
+        url = f"{self.base_url}/{model.name}"
+        timeout = aiohttp.ClientTimeout(total=model.timeout)
+
+        # Весь путь к модели, включая ожидание слота и повторы
+        with span(feature, 'backend', model=model.name):
+            async with self._semaphores[feature]:
+                for attempt in range(self.max_retries + 1):
+                    try:
+                        async with self.session.post(url, json=payload, data=data, timeout=timeout) as response:
+                            if response.status == 200:
+                                yield response
+                                return
+                            if response.status != 503 or attempt == self.max_retries:
+                                body = (await response.text())[:200]
+                                raise InferenceError(f"{model.name}: HTTP {response.status} {body}")
+                            # Модель ещё загружается — HF подсказывает, сколько ждать
+                            try:
+                                estimated_time = (await response.json(content_type=None)).get("estimated_time")
+                            except Exception:
+                                estimated_time = None
+                    except asyncio.TimeoutError:
+                        raise InferenceError(f"{model.name}: нет ответа за {model.timeout:.0f} с")
+                    except aiohttp.ClientError as e:
+                        raise InferenceError(f"{model.name}: {e}")
+
+                    delay = self._backoff(attempt, estimated_time)
+                    logger.info(f"⏳ {model.name} загружается, повтор через {delay:.1f} с")
+                    await asyncio.sleep(delay)
+
+    async def request(self, feature: str, payload: Any = None, data: bytes = None) -> bytes:
+        """POST к модели функции `feature`; вернуть тело ответа целиком"""
+        async with self._response(feature, payload, data) as response:
+            return await self._read_body(response)
+
+    async def generate_text(self, feature: str, prompt: str, max_new_tokens: int = 512) -> str:
+        body = await self.request(feature, payload={
+            "inputs": prompt,
+            "parameters": {"max_new_tokens": max_new_tokens, "return_full_text": False},
+        })
+        return _generated_text(body)
+
+    async def stream_text(self, feature: str, prompt: str, max_new_tokens: int = 512) -> AsyncIterator[str]:
+        """Текст по мере генерации: куски из потока server-sent events HF"""
+        async with self._response(feature, payload={
+            "inputs": prompt,
+            "parameters": {"max_new_tokens": max_new_tokens, "return_full_text": False},
+            "stream": True,
+        }) as response:
+            async for line in response.content:
+                if not line.startswith(b"data:"):
+                    continue
+                event = json.loads(line[len(b"data:"):])
+                if "error" in event:
+                    raise InferenceError(f"{self.models[feature].name}: {event['error']}")
+                token = event.get("token") or {}
+                if token.get("text") and not token.get("special"):
+                    yield token["text"]
+
+    async def generate_media(self, feature: str, prompt: str) -> bytes:
+        """Картинка или аудио по текстовому описанию — байты файла"""
+        return await self.request(feature, payload={"inputs": prompt})
+
+    async def generate_media_batch(self, feature: str, prompts: List[str]) -> List[bytes]:
+        """Несколько файлов одним вызовом: эндпоинт отвечает JSON-списком base64 в порядке промптов"""
+        result = json.loads(await self.request(feature, payload={"inputs": prompts}))
+        if not isinstance(result, list) or len(result) != len(prompts):
+            raise InferenceError(f"{self.models[feature].name}: ждали {len(prompts)} файлов в ответе")
+        return [base64.b64decode(item) for item in result]
+
+    async def image_to_text(self, feature: str, image: bytes) -> str:
+        return _generated_text(await self.request(feature, data=image))
+
+
+def _generated_text(body: bytes) -> str:
+    result = json.loads(body)
+    if isinstance(result, list):
+        result = result[0]
+    return result.get("generated_text", "").strip()
@@ -0,0 +1,243 @@
+import asyncio
+import logging
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from aiogram import Bot
+
+from quota import BaseQuotaStore, QuotaReservation
+from tracing import current_trace, resume_trace
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    feature TEXT NOT NULL,
+    user_id INTEGER NOT NULL,
+    chat_id INTEGER NOT NULL,
+    message_id INTEGER NOT NULL,
+    prompt TEXT NOT NULL,
+    day INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    created_at REAL NOT NULL,
+    language TEXT
+);
+"""
+
+
+class Job:
+    """Долгая генерация: кто заказал, куда отчитываться и за чей лимит"""
+
+    __slots__ = ('id', 'feature', 'user_id', 'chat_id', 'message_id', 'prompt', 'day', 'created_at', 'language',
+                 'trace')
+
+    def __init__(self, feature: str, user_id: int, chat_id: int, message_id: int, prompt: str,
+                 day: int, created_at: float = None, id: int = None, language: Optional[str] = None):
+        self.id = id
+        self.feature = feature
+        self.user_id = user_id
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.prompt = prompt
+        self.day = day
+        self.created_at = created_at if created_at is not None else time.time()
+        # language_code заказчика — на нём пишутся статусы и результат
+        self.language = language
+        # Спан апдейта, поставившего задачу (только в памяти), — воркер продолжит его трассу
+        self.trace = None
+
+
+class JobStore:
+    """Незавершённые задачи в SQLite, чтобы пережить рестарт
+
+    Соединение одно, поэтому все запросы идут по очереди через отдельный
+    поток: одновременные воркеры не делят sqlite3-соединение между потоками.
+    """
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        # Базы, созданные до языка задач: старые задачи получат язык по умолчанию
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if 'language' not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN language TEXT")
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='jobs-db')
+
+    async def _run(self, query: Callable[..., Any], *args) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, query, *args)
+
+    async def add(self, job: Job) -> int:
+        cursor = await self._run(
+            self._conn.execute,
+            "INSERT INTO jobs (feature, user_id, chat_id, message_id, prompt, day, created_at, language) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (job.feature, job.user_id, job.chat_id, job.message_id, job.prompt, job.day, job.created_at,
+             job.language)
+        )
+        return cursor.lastrowid
+
+    async def set_status(self, job_id: int, status: str):
+        await self._run(self._conn.execute, "UPDATE jobs SET status = ? WHERE id = ?", (status, job_id))
+
+    async def remove(self, job_id: int):
+        await self._run(self._conn.execute, "DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    async def pending(self) -> List[Job]:
+        rows = await self._run(lambda: self._conn.execute(
+            "SELECT id, feature, user_id, chat_id, message_id, prompt, day, created_at, language "
+            "FROM jobs ORDER BY id"
+        ).fetchall())
+        return [
+            Job(feature, user_id, chat_id, message_id, prompt, day, created_at, id=job_id, language=language)
+            for job_id, feature, user_id, chat_id, message_id, prompt, day, created_at, language in rows
+        ]
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self._conn.close()
+
+
+class JobQueue:
+    """Фоновые задачи для долгих генераций (видео, музыка)
+
+    Хендлер ставит задачу и сразу освобождается. Воркеры каждой функции
+    (не больше `concurrency` одновременно) выполняют задачи, пока идёт
+    генерация — редактируют исходное сообщение «создаёт...» с прогрессом,
+    по готовности отдают результат через `deliver`. Лимит, списанный при
+    постановке, подтверждается, когда результат доставлен, и возвращается
+    при ошибке генерации или доставки — тогда `deliver` получает исключение
+    и меняет заглушку на текст ошибки. `deliver` должен падать, только если
+    результат пользователю не отправлен.
+
+    Тексты статусов даёт `status_text(job, elapsed)`: `elapsed` — None в
+    начале генерации, дальше — секунды с её начала.
+    """
+
+    def __init__(self, bot: Bot, store: JobStore, quotas: BaseQuotaStore,
+                 deliver: Callable[[Job, Any], Awaitable[None]],
+                 status_text: Callable[[Job, Optional[int]], str], progress_interval: float = 15):
+        self.bot = bot
+        self.store = store
+        self.quotas = quotas
+        self.deliver = deliver
+        self.status_text = status_text
+        self.progress_interval = progress_interval
+        self._runners: Dict[str, Callable[[Job], Awaitable[Any]]] = {}
+        self._concurrency: Dict[str, int] = {}
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self._workers: List[asyncio.Task] = []
+
+    def register(self, feature: str, run: Callable[[Job], Awaitable[Any]], concurrency: int):
+        """Функция, которая выполняется в фоне, и сколько её задач идёт параллельно"""
+        self._runners[feature] = run
+        self._concurrency[feature] = concurrency
+
+    def queue_size(self, feature: str) -> int:
+        queue = self._queues.get(feature)
+        return queue.qsize() if queue is not None else 0
+
+    async def enqueue(self, job: Job) -> Job:
+        job.id = await self.store.add(job)
+        self._queues[job.feature].put_nowait(job)
+        return job
+
+    async def submit(self, reservation: QuotaReservation, chat_id: int, message_id: int,
+                     prompt: str, language: Optional[str] = None) -> Job:
+        """Поставить задачу, передав ей зарезервированную единицу лимита"""
+        job = Job(
+            reservation.feature, reservation.user_id, chat_id, message_id, prompt, reservation.day,
+            language=language
+        )
+        job.trace = current_trace()
+        job = await self.enqueue(job)
+        # Дальше резерв подтверждает или возвращает воркер, а не хендлер
+        reservation.settled = True
+        return job
+
+    async def start(self, owns: Optional[Callable[[int], bool]] = None):
+        """Запустить воркеры и вернуть в очередь задачи, не завершённые до рестарта
+
+        `owns` — фильтр по user_id, когда задачи в базе общие для нескольких
+        процессов (шардов): каждый восстанавливает только свои.
+        """
+        for feature, concurrency in self._concurrency.items():
+            self._queues[feature] = asyncio.Queue()
+            for _ in range(concurrency):
+                self._workers.append(asyncio.create_task(self._worker(feature)))
+
+        restored = await self.store.pending()
+        if owns is not None:
+            restored = [job for job in restored if owns(job.user_id)]
+        for job in restored:
+            if job.feature in self._queues:
+                self._queues[job.feature].put_nowait(job)
+        if restored:
+            logger.info(f"🔁 Восстановлено задач после рестарта: {len(restored)}")
+
+    async def close(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
+        self.store.close()
+
+    async def _edit(self, job: Job, text: str):
+        try:
+            await self.bot.edit_message_text(text, chat_id=job.chat_id, message_id=job.message_id)
+        except Exception as e:
+            logger.warning(f"Не удалось обновить прогресс задачи {job.id}: {e}")
+
+    async def _report_progress(self, job: Job, started: float):
+        while True:
+            await asyncio.sleep(self.progress_interval)
+            await self._edit(job, self.status_text(job, int(time.monotonic() - started)))
+
+    async def _worker(self, feature: str):
+        queue = self._queues[feature]
+        run = self._runners[feature]
+        while True:
+            job = await queue.get()
+            try:
+                with resume_trace(job.trace, f"job:{feature}", 'job', job_id=job.id):
+                    await self._execute(job, run)
+            except Exception as e:
+                logger.error(f"Задача {job.id} ({feature}) упала при доставке: {e}")
+            finally:
+                queue.task_done()
+
+    async def _execute(self, job: Job, run: Callable[[Job], Awaitable[Any]]):
+        reservation = QuotaReservation(self.quotas, job.user_id, job.feature, job.day)
+        await self.store.set_status(job.id, 'running')
+        await self._edit(job, self.status_text(job, None))
+
+        progress = asyncio.create_task(self._report_progress(job, time.monotonic()))
+        try:
+            result = await run(job)
+        except Exception as e:
+            logger.error(f"Ошибка задачи {job.id} ({job.feature}): {e}")
+            result = e
+        finally:
+            progress.cancel()
+
+        # Задача остаётся в базе, пока результат не доставлен и лимит не подтверждён или
+        # возвращён: после падения процесса в этот момент она выполнится заново
+        try:
+            if not isinstance(result, Exception):
+                try:
+                    await self.deliver(job, result)
+                except Exception as e:
+                    # Результат не отправлен: лимит вернётся, заглушка сменится ошибкой
+                    logger.error(f"Задача {job.id} ({job.feature}) не доставлена: {e}")
+                    result = e
+                else:
+                    await reservation.commit()
+                    return
+            await reservation.refund()
+            await self.deliver(job, result)
+        finally:
+            await self.store.remove(job.id)
+
@@ -1,20 +1,41 @@
 import asyncio
 import logging
 import os
-import requests
-import json
-from datetime import datetime, timedelta
-from typing import Dict, Any, List
+import sys
+from typing import AsyncIterator, Dict, Any, Optional
 from dotenv import load_dotenv
 
 from aiogram import Bot, Dispatcher, types, F
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.filters import Command, StateFilter
-from aiogram.types import (ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, 
-                          InlineKeyboardButton)
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.fsm.storage.memory import MemoryStorage
 
+from batching import MicroBatcher
+from broadcast import Broadcaster, BroadcastStore
+from catalog import CATALOG
+from context import RequestContextMiddleware, UserContext
+from conversations import ConversationStore
+from delivery import ApiCallCounter, StreamingReply, edit_text
+from documents import MAX_DOCUMENT_BYTES, DocumentFile, DocumentIntake
+from inference import HF_API_URL, InferenceClient, ModelConfig
+from jobs import Job, JobQueue, JobStore
+from membership import LocalMembershipEntries, MembershipCache
+from metrics import BotMetrics, Registry, start_metrics_server
+from outbound import OutboundScheduler
+from profiling import CaptureBusy, Profiler
+from quota import QuotaStore
+from result_cache import CachedMedia, ResultCache
+from scheduling import UpdateScheduler
+from shards import ShardRouter, poll_updates, serve_shard, shard_of
+from storage import SQLiteStorage
+from templates import Renderer
+from tracing import Tracer, span
+from webhook import build_router_app, run_webhook, serve_webhook
+
 # Загружаем переменные окружения
 load_dotenv()
 
@@ -27,7 +48,71 @@ logger = logging.getLogger(__name__)
 
 # Токены и настройки
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "8326095098:AAHVE8r5qaS8V2raYQgvi1Gz9dPEbUZ9ll8")
+# Свой сервер Bot API (локальный telegram-bot-api или фейковый для нагрузочных тестов)
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL")
 HUGGINGFACE_TOKEN = os.getenv("HUGGINGFACE_API_TOKEN")
+DATABASE_PATH = os.getenv("DATABASE_PATH", "artemius.db")
+# local — один процесс (память + SQLite), redis — общее хранилище для нескольких реплик
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+SUBSCRIPTION_CACHE_TTL = 300
+# polling — getUpdates, webhook — встроенный aiohttp сервер (WEBHOOK_URL обязателен)
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+PORT = int(os.getenv("PORT", "8080"))
+# Несколько ядер: роутер раздаёт апдейты SHARD_WORKERS процессам по user_id.
+# SHARD_INDEX и SHARD_SOCKET роутер задаёт сам процессам-воркерам
+SHARD_WORKERS = int(os.getenv("SHARD_WORKERS", "1"))
+SHARD_INDEX = int(os.getenv("SHARD_INDEX", "0"))
+SHARD_SOCKET = os.getenv("SHARD_SOCKET")
+# Метрики Prometheus на отдельном порту (0 — выключены); у воркеров шардов — METRICS_PORT + SHARD_INDEX
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9090"))
+if SHARD_SOCKET and METRICS_PORT:
+    METRICS_PORT += SHARD_INDEX
+# Долгие генерации идут в фоне: сколько задач каждой функции выполняется одновременно
+VIDEO_WORKERS = int(os.getenv("VIDEO_WORKERS", "2"))
+MUSIC_WORKERS = int(os.getenv("MUSIC_WORKERS", "2"))
+# Доля апдейтов, которые трассируются (0 — выключено); трассы и профили пишутся в TRACE_DIR
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+TRACE_DIR = os.getenv("TRACE_DIR", "traces")
+# Хендлеров одновременно; при очереди длиннее UPDATE_SHED_QUEUE бесплатные генерации
+# получают «занято», при UPDATE_MAX_QUEUE — все новые апдейты
+UPDATE_CONCURRENCY = int(os.getenv("UPDATE_CONCURRENCY", "256"))
+UPDATE_SHED_QUEUE = int(os.getenv("UPDATE_SHED_QUEUE", "200"))
+UPDATE_MAX_QUEUE = int(os.getenv("UPDATE_MAX_QUEUE", "1000"))
+# Кому доступны команды /profile и /broadcast: user_id через запятую
+ADMIN_IDS = [int(user_id) for user_id in os.getenv("ADMIN_IDS", "").split(",") if user_id.strip()]
+
+# Модели HuggingFace по функциям: таймаут и сколько запросов к модели одновременно
+HF_MODELS = {
+    'chat': ModelConfig(os.getenv("HF_CHAT_MODEL", "mistralai/Mistral-7B-Instruct-v0.3"),
+                        timeout=60, concurrency=8),
+    'images': ModelConfig(os.getenv("HF_IMAGE_MODEL", "stabilityai/stable-diffusion-xl-base-1.0"),
+                          timeout=120, concurrency=2, batch_size=int(os.getenv("HF_IMAGE_BATCH", "1"))),
+    'music': ModelConfig(os.getenv("HF_MUSIC_MODEL", "facebook/musicgen-small"),
+                         timeout=180, concurrency=2, batch_size=int(os.getenv("HF_MUSIC_BATCH", "1"))),
+    'documents': ModelConfig(os.getenv("HF_OCR_MODEL", "microsoft/trocr-base-printed"),
+                             timeout=60, concurrency=4),
+}
+# Пакетные эндпоинты картинок и музыки: сколько ждать попутчиков при свободной модели, мс.
+# 0 — пакеты набираются только из тех, кто ждал, пока модель была занята
+MEDIA_BATCH_WINDOW_MS = int(os.getenv("MEDIA_BATCH_WINDOW_MS", "0"))
+SUBSCRIPTION_CACHE_SIZE = int(os.getenv("SUBSCRIPTION_CACHE_SIZE", "100000"))
+# Память чата: бюджет токенов на диалог, общий лимит на процесс и срок простоя в секундах
+CHAT_CONTEXT_TOKENS = int(os.getenv("CHAT_CONTEXT_TOKENS", "1024"))
+CHAT_MEMORY_TOKENS = int(os.getenv("CHAT_MEMORY_TOKENS", "4000000"))
+CHAT_IDLE_TTL = int(os.getenv("CHAT_IDLE_TTL", "3600"))
+# Ответ чата печатается по мере генерации: правка сообщения не чаще раза в STREAM_EDIT_INTERVAL секунд
+CHAT_STREAMING = os.getenv("CHAT_STREAMING", "1") == "1"
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "2.0"))
+# Рассылка /broadcast: сколько отправок в полёте одновременно (темп задаёт общий лимит Telegram)
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "32"))
+# Кэш готовых картинок и музыки: file_id в памяти, файлы на диске
+RESULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR", "media_cache")
+RESULT_CACHE_MAX_MB = int(os.getenv("RESULT_CACHE_MAX_MB", "512"))
 
 # НАСТРОЙКИ КАНАЛОВ ДЛЯ ПОДПИСКИ (ТВОИ КАНАЛЫ!)
 REQUIRED_CHANNELS = [
@@ -45,9 +130,71 @@ REQUIRED_CHANNELS = [
     }
 ]
 
+# Хранилища: FSM, дневные лимиты со статистикой и записи о подписках
+if STORAGE_BACKEND == "redis":
+    from redis_storage import create_redis_storage
+    shared_storage = create_redis_storage(REDIS_URL, membership_ttl=SUBSCRIPTION_CACHE_TTL)
+    fsm_storage = shared_storage['fsm']
+    # Дневные счётчики и статистика — атомарно в Redis
+    user_limits = shared_storage['quotas']
+    membership_entries = shared_storage['membership']
+else:
+    fsm_storage = MemoryStorage()
+    # Дневные счётчики по МСК, одна компактная запись на пользователя;
+    # переживают рестарт: SQLite с отложенной пакетной записью
+    user_limits = QuotaStore(backend=SQLiteStorage(DATABASE_PATH))
+    membership_entries = LocalMembershipEntries(SUBSCRIPTION_CACHE_TTL, SUBSCRIPTION_CACHE_SIZE)
+
 # Инициализация
-bot = Bot(token=TELEGRAM_TOKEN)
-dp = Dispatcher(storage=MemoryStorage())
+bot = Bot(token=TELEGRAM_TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL))
+          if TELEGRAM_API_URL else None)
+# Выборочная трассировка: снаружи всех — в спаны попадает и ожидание в планировщике
+tracer = Tracer(TRACE_SAMPLE_RATE, TRACE_DIR)
+bot.session.middleware(tracer)
+profiler = Profiler(TRACE_DIR)
+# Идущие съёмки профиля по /profile
+profile_tasks = set()
+# Все исходящие запросы идут через планировщик с учётом flood control Telegram
+# Общий лимит Telegram на бота делится между воркерами шардов поровну
+outbound = OutboundScheduler(global_rate=30 / SHARD_WORKERS)
+bot.session.middleware(outbound)
+# Счётчик запросов к Bot API на апдейт (внутри планировщика — считаются реальные вызовы)
+api_calls = ApiCallCounter()
+bot.session.middleware(api_calls)
+# Метрики: задержки Bot API по методам (без ожидания в очереди планировщика)
+metrics_registry = Registry()
+bot_metrics = BotMetrics(metrics_registry)
+bot.session.middleware(bot_metrics)
+dp = Dispatcher(storage=fsm_storage)
+dp.update.outer_middleware(tracer.on_update)
+dp.update.outer_middleware(api_calls.on_update)
+dp.update.outer_middleware(bot_metrics.on_update)
+# Время хендлеров — inner middleware, там уже известен выбранный хендлер
+dp.message.middleware(bot_metrics.on_handler)
+dp.callback_query.middleware(bot_metrics.on_handler)
+dp.chat_member.middleware(bot_metrics.on_handler)
+dp.message.middleware(tracer.on_handler)
+dp.callback_query.middleware(tracer.on_handler)
+dp.chat_member.middleware(tracer.on_handler)
+# Без токена HuggingFace функции работают в демо-режиме
+inference = (InferenceClient(HUGGINGFACE_TOKEN, HF_MODELS, base_url=os.getenv("HF_API_URL", HF_API_URL))
+             if HUGGINGFACE_TOKEN else None)
+# Сканы документов: скачивание в память, подготовка в пуле потоков, кэш OCR
+document_intake = DocumentIntake(bot)
+# Картинки и музыка пакетами, если эндпоинт модели их принимает (HF_*_BATCH > 1)
+media_batchers = {
+    feature: MicroBatcher(
+        lambda prompts, feature=feature: inference.generate_media_batch(feature, prompts),
+        max_batch=HF_MODELS[feature].batch_size, window=MEDIA_BATCH_WINDOW_MS / 1000,
+        max_in_flight=HF_MODELS[feature].concurrency,
+        on_batch=lambda size, feature=feature: bot_metrics.backend_batch(feature, size),
+    )
+    for feature in ('images', 'music') if inference is not None and HF_MODELS[feature].batch_size > 1
+}
+# Повторный популярный запрос уходит по file_id — без генерации и без загрузки
+result_cache = ResultCache(RESULT_CACHE_DIR, max_bytes=RESULT_CACHE_MAX_MB * 1024 * 1024)
+# Контекст чата: последние реплики и выжимка старых, давно молчащие диалоги вытесняются
+conversations = ConversationStore(CHAT_CONTEXT_TOKENS, max_tokens=CHAT_MEMORY_TOKENS, idle_ttl=CHAT_IDLE_TTL)
 
 # Состояния FSM
 class BotStates(StatesGroup):
@@ -74,523 +221,212 @@ VIP_LIMITS = {         # VIP лимиты при подписке на ОБА к
     'documents': 8     # 8 документов для VIP
 }
 
-# Кэш статуса подписки
-subscription_cache = {}
-user_stats = {}
-user_limits = {}
-
-async def check_subscription(user_id: int) -> bool:
-    """Проверить подписку на ВСЕ каналы (нужны все для VIP)"""
-    try:
-        # Проверяем кэш (действует 5 минут)
-        now = datetime.now()
-        if user_id in subscription_cache:
-            cached_time, is_subscribed = subscription_cache[user_id]
-            if (now - cached_time).total_seconds() < 300:  # 5 минут
-                return is_subscribed
-
-        # Проверяем подписки на все каналы
-        all_subscribed = True
-        for channel in REQUIRED_CHANNELS:
-            try:
-                member = await bot.get_chat_member(channel["id"], user_id)
-                if member.status not in ['member', 'administrator', 'creator']:
-                    all_subscribed = False
-                    break
-            except:
-                all_subscribed = False
-                break
-
-        # Сохраняем в кэш
-        subscription_cache[user_id] = (now, all_subscribed)
-        return all_subscribed
-
-    except Exception as e:
-        logger.error(f"Ошибка проверки подписки: {e}")
+# Кэш статуса подписки по каждому каналу
+subscription_cache = MembershipCache(bot, REQUIRED_CHANNELS, ttl=SUBSCRIPTION_CACHE_TTL,
+                                     entries=membership_entries)
+
+# Состояние кэшей и очередей читается при каждом сборе метрик
+metrics_registry.callback_gauge(
+    'artemius_cache_hit_ratio', 'Доля попаданий в кэш', lambda: {
+        ('subscriptions',): subscription_cache.stats()['hit_ratio'],
+        ('results',): result_cache.stats()['hit_ratio'],
+        ('ocr',): document_intake.stats()['hit_ratio'],
+    }, labels=['cache'])
+metrics_registry.callback_counter(
+    'artemius_cache_bytes_saved_total', 'Байты медиа, не загруженные повторно благодаря кэшу',
+    lambda: {('results',): result_cache.stats()['bytes_saved']}, labels=['cache'])
+metrics_registry.callback_gauge(
+    'artemius_outbound_queue', 'Запросы в очереди планировщика исходящих',
+    lambda: outbound.stats()['queued'])
+metrics_registry.callback_gauge(
+    'artemius_conversations', 'Память диалогов чата', lambda: {
+        ('conversations',): len(conversations),
+        ('tokens',): conversations.total_tokens,
+    }, labels=['kind'])
+
+# Контекст пользователя (VIP статус и лимиты) собирается один раз на апдейт
+request_context = RequestContextMiddleware(subscription_cache, user_limits, FREE_LIMITS, VIP_LIMITS)
+dp.message.outer_middleware(request_context)
+dp.callback_query.outer_middleware(request_context)
+
+# Тексты и клавиатуры собраны заранее по языку и тарифу
+renderer = Renderer(CATALOG, FREE_LIMITS, VIP_LIMITS, REQUIRED_CHANNELS)
+
+# Генерации — то, что под перегрузкой можно отложить
+GENERATION_STATES = frozenset(state.state for state in (
+    BotStates.waiting_for_text, BotStates.waiting_for_image_prompt, BotStates.waiting_for_music_prompt,
+    BotStates.waiting_for_video_prompt, BotStates.waiting_for_document,
+))
+
+async def is_sheddable(update: types.Update, data: Dict[str, Any]) -> bool:
+    """Под перегрузкой отказываем только бесплатным запросам на генерацию"""
+    user = data.get("event_from_user")
+    if update.message is None or user is None or data.get("raw_state") not in GENERATION_STATES:
         return False
-
-async def check_individual_subscriptions(user_id: int) -> Dict[str, bool]:
-    """Проверить подписку на каждый канал отдельно"""
-    try:
-        subscriptions = {}
-        for channel in REQUIRED_CHANNELS:
-            try:
-                member = await bot.get_chat_member(channel["id"], user_id)
-                subscriptions[channel["id"]] = member.status in ['member', 'administrator', 'creator']
-            except:
-                subscriptions[channel["id"]] = False
-        return subscriptions
-    except:
-        return {ch["id"]: False for ch in REQUIRED_CHANNELS}
-
-def get_user_stats(user_id: int) -> dict:
-    """Получить статистику пользователя"""
-    if user_id not in user_stats:
-        user_stats[user_id] = {
-            'total_messages': 0,
-            'total_images': 0,
-            'total_music': 0,
-            'total_videos': 0,
-            'total_documents': 0,
-            'first_seen': datetime.now().isoformat()
-        }
-    return user_stats[user_id]
-
-def get_daily_usage(user_id: int) -> dict:
-    """Получить использование за сегодня"""
-    today = datetime.now().date().isoformat()
-    if user_id not in user_limits:
-        user_limits[user_id] = {}
-    if today not in user_limits[user_id]:
-        user_limits[user_id][today] = {
-            'chat': 0,
-            'images': 0,
-            'music': 0,
-            'video': 0,
-            'documents': 0
-        }
-    return user_limits[user_id][today]
-
-async def check_limit(user_id: int, feature: str) -> bool:
-    """Проверить лимит с учетом VIP статуса"""
-    is_vip = await check_subscription(user_id)
-    daily = get_daily_usage(user_id)
-
-    # Выбираем лимиты в зависимости от VIP статуса
-    limits = VIP_LIMITS if is_vip else FREE_LIMITS
-
-    return daily[feature] < limits[feature]
-
-def use_feature(user_id: int, feature: str):
-    """Засчитать использование функции"""
-    daily = get_daily_usage(user_id)
-    daily[feature] += 1
-
-    stats = get_user_stats(user_id)
-    stats[f'total_{feature}'] = stats.get(f'total_{feature}', 0) + 1
-
-# Клавиатуры
-async def get_main_menu(user_id: int):
-    """Главное меню с указанием статуса"""
-    is_vip = await check_subscription(user_id)
-    status_emoji = "⭐" if is_vip else "🔒"
-    status_text = "VIP режим" if is_vip else "Базовый доступ"
-
-    keyboard = [
-        [KeyboardButton(text="💬 Чат с Artemius"), KeyboardButton(text="🎨 Создать картинку")],
-        [KeyboardButton(text="🎵 Создать песню"), KeyboardButton(text="🎬 Создать видео")],
-        [KeyboardButton(text="📄 Документ"), KeyboardButton(text="👤 Мой профиль")],
-        [KeyboardButton(text=f"{status_emoji} {status_text}"), KeyboardButton(text="📢 Получить VIP")]
-    ]
-    return ReplyKeyboardMarkup(keyboard=keyboard, resize_keyboard=True)
-
-async def get_subscription_menu(user_id: int):
-    """Улучшенное меню подписки с отдельными кнопками для каждого канала"""
-    individual_subs = await check_individual_subscriptions(user_id)
-
-    keyboard = []
-
-    # Отдельные кнопки для каждого канала со статусом
-    for channel in REQUIRED_CHANNELS:
-        is_subscribed = individual_subs.get(channel["id"], False)
-        status_emoji = "✅" if is_subscribed else "📢"
-        status_text = "Подписан" if is_subscribed else "Подписаться"
-
-        keyboard.append([InlineKeyboardButton(
-            text=f"{status_emoji} {channel['name']} • {status_text}", 
-            url=channel["url"]
-        )])
-
-    # Разделитель
-    keyboard.append([InlineKeyboardButton(text="➖ ➖ ➖ ➖ ➖", callback_data="separator")])
-
-    # Кнопка проверки подписок
-    keyboard.append([InlineKeyboardButton(
-        text="🔄 Проверить подписки и получить VIP", 
-        callback_data="check_subscriptions"
-    )])
-
-    # Кнопка пропуска
-    keyboard.append([InlineKeyboardButton(
-        text="⏭️ Продолжить с базовым доступом", 
-        callback_data="skip_subscriptions"
-    )])
-
-    return InlineKeyboardMarkup(inline_keyboard=keyboard)
-
-def get_back_menu():
-    """Меню возврата"""
-    keyboard = [[KeyboardButton(text="🏠 Главное меню")]]
-    return ReplyKeyboardMarkup(keyboard=keyboard, resize_keyboard=True)
+    return not await subscription_cache.is_subscribed_all(user.id)
+
+async def reply_busy(update: types.Update, data: Dict[str, Any], reason: str):
+    """Дешёвый ответ вместо очереди: один запрос к Bot API, без хендлеров"""
+    bot_metrics.update_shed(reason)
+    user = data.get("event_from_user")
+    text = renderer.common(user.language_code if user else None, 'busy')
+    if update.message is not None:
+        await update.message.answer(text, parse_mode="Markdown")
+    elif update.callback_query is not None:
+        await update.callback_query.answer(text.replace("**", ""))
+
+# Апдейты пользователя — по очереди, хендлеров одновременно не больше UPDATE_CONCURRENCY
+update_scheduler = UpdateScheduler(UPDATE_CONCURRENCY, shed_queue=UPDATE_SHED_QUEUE, max_queue=UPDATE_MAX_QUEUE,
+                                   sheddable=is_sheddable, on_shed=reply_busy)
+dp.update.outer_middleware(update_scheduler)
+metrics_registry.callback_gauge(
+    'artemius_update_queue', 'Апдейты в планировщике', lambda: {
+        ('running',): update_scheduler.running,
+        ('waiting',): update_scheduler.waiting,
+        ('user_backlog',): update_scheduler.backlog,
+    }, labels=['stage'])
 
 # Обработчик /start
 @dp.message(Command("start"))
-async def start_handler(message: types.Message, state: FSMContext):
+async def start_handler(message: types.Message, state: FSMContext, ctx: UserContext):
     """Стартовое сообщение с проверкой подписки"""
     await state.clear()
-    user_id = message.from_user.id
-    is_vip = await check_subscription(user_id)
-
-    if is_vip:
-        # VIP приветствие
-        welcome_text = f"""🏛️ **Добро пожаловать, VIP-пользователь!**
-
-⭐ **VIP СТАТУС АКТИВЕН!**
-Спасибо за подписку на наши каналы!
-
-🚀 **ВАШИ VIP-ЛИМИТЫ:**
-💬 Диалоги — **{VIP_LIMITS['chat']} в день**
-🎨 Картинки — **{VIP_LIMITS['images']} в день**  
-🎵 Музыка — **{VIP_LIMITS['music']} в день**
-🎬 Видео — **{VIP_LIMITS['video']} в день**
-📄 Документы — **{VIP_LIMITS['documents']} в день**
-
-✨ **Передовые AI технологии:**
-• DeepSeek V3 для умных диалогов
-• Stable Diffusion для изображений
-• MusicGen для музыки
-• Video AI для роликов
-• TrOCR для документов
-
-Наслаждайтесь VIP-возможностями! 🎯"""
-
-        reply_markup = await get_main_menu(user_id)
-
-    else:
-        # Обычное приветствие с призывом к подписке
-        welcome_text = f"""🏛️ **Добро пожаловать в Artemius AI!**
-
-🤖 Я ваш персональный ИИ-помощник с множеством возможностей!
-
-🔒 **ВАШИ ТЕКУЩИЕ ЛИМИТЫ (базовый доступ):**
-💬 Диалоги — **{FREE_LIMITS['chat']} в день**
-🎨 Картинки — **{FREE_LIMITS['images']} в день**  
-🎵 Музыка — **{FREE_LIMITS['music']} в день**
-🎬 Видео — **{FREE_LIMITS['video']} в день**
-📄 Документы — **{FREE_LIMITS['documents']} в день**
-
-⭐ **ХОТИТЕ ПОЛУЧИТЬ VIP СТАТУС?**
-Подпишитесь на наши каналы и получите:
-
-💬 **{VIP_LIMITS['chat']} диалогов** в день (сейчас {FREE_LIMITS['chat']})
-🎨 **{VIP_LIMITS['images']} картинок** в день (сейчас {FREE_LIMITS['images']})
-🎵 **{VIP_LIMITS['music']} композиций** в день (сейчас {FREE_LIMITS['music']})
-🎬 **{VIP_LIMITS['video']} видео** в день (сейчас {FREE_LIMITS['video']})
-📄 **{VIP_LIMITS['documents']} документов** в день (сейчас {FREE_LIMITS['documents']})
-
-🚀 **Подпишитесь на оба канала для получения VIP!**"""
-
-        reply_markup = await get_subscription_menu(user_id)
-
-    await message.answer(welcome_text, reply_markup=reply_markup, parse_mode="Markdown")
+    # /start — новый разговор
+    conversations.clear(ctx.user_id)
+    # Пользователь попадает в рассылки, даже если ещё ничем не пользовался
+    await user_limits.register(ctx.user_id)
+    await broadcaster.mark_reachable(ctx.user_id)
+    # VIP — приветствие и меню, иначе — призыв к подписке
+    reply_markup = renderer.main_menu(ctx) if ctx.is_vip else renderer.subscription_menu(ctx)
+    await message.answer(renderer.text(ctx, 'start'), reply_markup=reply_markup, parse_mode="Markdown")
+
+# Профилирование по команде администратора: /profile [cpu|mem] [секунд]
+@dp.message(Command("profile"), F.from_user.id.in_(ADMIN_IDS))
+async def profile_command(message: types.Message, ctx: UserContext):
+    """Снять профиль работающего бота и прислать отчёт файлом"""
+    args = (message.text or "").split()[1:]
+    kind = args[0] if args and args[0] in ("cpu", "mem") else "cpu"
+    seconds = int(args[-1]) if args and args[-1].isdigit() else 30
+    if profiler.busy:
+        await message.answer(renderer.text(ctx, 'profile_busy'))
+        return
+    await message.answer(renderer.text(ctx, 'profile_started', kind=kind,
+                                       seconds=min(seconds, profiler.max_seconds)))
+    # Съёмка идёт в фоне: хендлер не держит очередь апдейтов администратора минутами
+    task = asyncio.create_task(send_profile(message, ctx, kind, seconds))
+    profile_tasks.add(task)
+    task.add_done_callback(profile_tasks.discard)
+
+async def send_profile(message: types.Message, ctx: UserContext, kind: str, seconds: int):
+    """Снять профиль и прислать отчёт файлом, когда съёмка закончится"""
+    capture = profiler.capture_cpu if kind == "cpu" else profiler.capture_memory
+    try:
+        path = await capture(seconds)
+    except CaptureBusy:
+        await message.answer(renderer.text(ctx, 'profile_busy'))
+        return
+    except Exception as e:
+        logger.error(f"Ошибка профилирования {kind}: {e}")
+        await message.answer(renderer.text(ctx, 'profile_failed', error=e))
+        return
+    logger.info(f"🔬 Профиль {kind} снят по команде {message.from_user.id}: {path}")
+    await message.answer_document(types.FSInputFile(path))
+
+# Рассылка всем пользователям: /broadcast <текст в HTML> или /broadcast stop
+@dp.message(Command("broadcast"), F.from_user.id.in_(ADMIN_IDS))
+async def broadcast_command(message: types.Message, ctx: UserContext):
+    """Запустить или прервать рассылку; прогресс — правками одного сообщения"""
+    parts = (message.html_text or "").split(maxsplit=1)
+    text = parts[1].strip() if len(parts) > 1 else ""
+    if not text:
+        await message.answer(renderer.text(ctx, 'broadcast_usage'))
+        return
+    if text == "stop":
+        stopped = await broadcaster.stop()
+        await message.answer(renderer.text(ctx, 'broadcast_stopped', id=stopped[0]) if stopped
+                             else renderer.text(ctx, 'broadcast_idle'))
+        return
+    if broadcaster.running:
+        await message.answer(renderer.text(ctx, 'broadcast_running'))
+        return
+    # Пробная отправка себе: ошибка HTML-разметки не должна всплыть на каждом получателе
+    try:
+        await message.answer(text, parse_mode="HTML")
+    except TelegramBadRequest as e:
+        await message.answer(renderer.text(ctx, 'broadcast_bad_text', error=e.message), parse_mode=None)
+        return
+    status_msg = await message.answer(renderer.text(ctx, 'broadcast_starting'))
+    await broadcaster.launch(message.from_user.id, message.chat.id, status_msg.message_id, text)
 
 # ОБНОВЛЕННАЯ функция уведомлений при исчерпании лимитов
-async def show_limit_exhausted(message: types.Message, feature: str):
+async def show_limit_exhausted(message: types.Message, feature: str, ctx: UserContext):
     """Показать сообщение об исчерпании лимита с четким призывом к подписке"""
-    user_id = message.from_user.id
-    is_vip = await check_subscription(user_id)
-
-    feature_names = {
-        'chat': 'диалогов с Artemius',
-        'images': 'генераций изображений',
-        'music': 'создания музыки', 
-        'video': 'видеопроизводства',
-        'documents': 'анализа документов'
-    }
-
-    feature_emoji = {
-        'chat': '💬',
-        'images': '🎨',
-        'music': '🎵',
-        'video': '🎬',
-        'documents': '📄'
-    }
-
-    current_limit = VIP_LIMITS[feature] if is_vip else FREE_LIMITS[feature]
-    vip_limit = VIP_LIMITS[feature]
-
-    if is_vip:
-        # Для VIP пользователей - простое уведомление
-        text = f"""🚫 **Вы исчерпали лимит {feature_names[feature]}!**
-
-⭐ **VIP статус:** {current_limit} в день
-⏰ **Лимиты обновятся:** завтра в 00:00 МСК
-
-💡 А пока можете использовать другие функции Artemius!"""
-
-        await message.answer(text, parse_mode="Markdown")
-
-    else:
-        # Для обычных пользователей - призыв к подписке  
-        increase = vip_limit - current_limit
-
-        text = f"""🚫 **Вы исчерпали лимит {feature_names[feature]}!**
-
-{feature_emoji[feature]} **Текущий лимит:** {current_limit} в день
-
-⭐ **Чтобы получить VIP статус, подпишитесь на каналы!**
-
-🎯 **VIP лимит:** {vip_limit} в день (+{increase} дополнительно!)
-
-🚀 **ВСЕ VIP БОНУСЫ:**
-💬 {VIP_LIMITS['chat']} диалогов (+{VIP_LIMITS['chat'] - FREE_LIMITS['chat']})
-🎨 {VIP_LIMITS['images']} картинок (+{VIP_LIMITS['images'] - FREE_LIMITS['images']})
-🎵 {VIP_LIMITS['music']} композиций (+{VIP_LIMITS['music'] - FREE_LIMITS['music']})
-🎬 {VIP_LIMITS['video']} видео (+{VIP_LIMITS['video'] - FREE_LIMITS['video']})
-📄 {VIP_LIMITS['documents']} документов (+{VIP_LIMITS['documents'] - FREE_LIMITS['documents']})
-
-📢 **Подпишитесь на оба канала прямо сейчас!**"""
-
-        await message.answer(text, reply_markup=await get_subscription_menu(user_id), parse_mode="Markdown")
-
-# Обработчики основных функций
-@dp.message(F.text == "💬 Чат с Artemius")
-async def chat_handler(message: types.Message, state: FSMContext):
-    """Чат с проверкой лимитов"""
-    user_id = message.from_user.id
-    is_vip = await check_subscription(user_id)
-
-    if not await check_limit(user_id, 'chat'):
-        await show_limit_exhausted(message, 'chat')
+    bot_metrics.quota_rejected(feature, ctx.is_vip)
+    reply_markup = None if ctx.is_vip else renderer.subscription_menu(ctx)
+    await message.answer(renderer.text(ctx, f'limit_exhausted:{feature}'),
+                         reply_markup=reply_markup, parse_mode="Markdown")
+
+async def enter_feature(message: types.Message, state: FSMContext, ctx: UserContext,
+                        feature: str, next_state: State):
+    """Перейти к функции, если на сегодня остался лимит"""
+    if not ctx.has_quota(feature):
+        await show_limit_exhausted(message, feature, ctx)
         return
 
-    await state.set_state(BotStates.waiting_for_text)
-    daily = get_daily_usage(user_id)
-    limits = VIP_LIMITS if is_vip else FREE_LIMITS
-    remaining = limits['chat'] - daily['chat']
-
-    status = "VIP" if is_vip else "Базовый"
-
+    await state.set_state(next_state)
     await message.answer(
-        f"🏛️ **Artemius готов к диалогу!**\n\n"
-        f"⭐ **Статус:** {status} доступ\n"
-        f"💡 **Осталось сообщений:** {remaining}\n\n"
-        f"🧠 Задавайте любые вопросы — я помогу с программированием, творчеством, решением задач и многим другим!",
-        reply_markup=get_back_menu(),
+        renderer.text(ctx, f'enter_{feature}', remaining=ctx.remaining(feature)),
+        reply_markup=renderer.back_menu(ctx),
         parse_mode="Markdown"
     )
 
-@dp.message(F.text == "🎨 Создать картинку")
-async def image_handler(message: types.Message, state: FSMContext):
-    """Генерация изображений с проверкой лимитов"""
-    user_id = message.from_user.id
-    is_vip = await check_subscription(user_id)
-
-    if not await check_limit(user_id, 'images'):
-        await show_limit_exhausted(message, 'images')
-        return
-
-    await state.set_state(BotStates.waiting_for_image_prompt)
-    daily = get_daily_usage(user_id)
-    limits = VIP_LIMITS if is_vip else FREE_LIMITS
-    remaining = limits['images'] - daily['images']
-
-    status = "VIP" if is_vip else "Базовый"
+# Обработчики основных функций
+@dp.message(F.text.in_(renderer.buttons('chat')))
+async def chat_handler(message: types.Message, state: FSMContext, ctx: UserContext):
+    """Чат с проверкой лимитов"""
+    await enter_feature(message, state, ctx, 'chat', BotStates.waiting_for_text)
 
-    await message.answer(
-        f"🎨 **Artemius Art Studio активирован!**\n\n"
-        f"⭐ **Статус:** {status} доступ\n"
-        f"💡 **Осталось изображений:** {remaining}\n\n"
-        f"🖼️ **Примеры запросов:**\n"
-        f"• Мистический лес с волшебными созданиями\n"
-        f"• Киберпанк город с неоновыми огнями\n"
-        f"• Портрет эльфа в стиле фэнтези\n"
-        f"• Космический корабль среди звезд\n\n"
-        f"Опишите что создать:",
-        reply_markup=get_back_menu(),
-        parse_mode="Markdown"
-    )
+@dp.message(F.text.in_(renderer.buttons('images')))
+async def image_handler(message: types.Message, state: FSMContext, ctx: UserContext):
+    """Генерация изображений с проверкой лимитов"""
+    await enter_feature(message, state, ctx, 'images', BotStates.waiting_for_image_prompt)
 
-@dp.message(F.text == "🎵 Создать песню")
-async def music_handler(message: types.Message, state: FSMContext):
+@dp.message(F.text.in_(renderer.buttons('music')))
+async def music_handler(message: types.Message, state: FSMContext, ctx: UserContext):
     """Создание музыки с проверкой лимитов"""
-    user_id = message.from_user.id
-    is_vip = await check_subscription(user_id)
-
-    if not await check_limit(user_id, 'music'):
-        await show_limit_exhausted(message, 'music')
-        return
-
-    await state.set_state(BotStates.waiting_for_music_prompt)
-    daily = get_daily_usage(user_id)
-    limits = VIP_LIMITS if is_vip else FREE_LIMITS
-    remaining = limits['music'] - daily['music']
-
-    status = "VIP" if is_vip else "Базовый"
-
-    await message.answer(
-        f"🎵 **Artemius Music Composer активирован!**\n\n"
-        f"⭐ **Статус:** {status} доступ\n"
-        f"💡 **Осталось композиций:** {remaining}\n\n"
-        f"🎼 **Примеры запросов:**\n"
-        f"• Эпичная оркестровая музыка для фильма\n"
-        f"• Расслабляющий джаз для работы\n"
-        f"• Энергичная электронная музыка для спорта\n"
-        f"• Романтическая мелодия с пианино\n\n"
-        f"Опишите какую музыку создать:",
-        reply_markup=get_back_menu(),
-        parse_mode="Markdown"
-    )
+    await enter_feature(message, state, ctx, 'music', BotStates.waiting_for_music_prompt)
 
-@dp.message(F.text == "🎬 Создать видео")
-async def video_handler(message: types.Message, state: FSMContext):
+@dp.message(F.text.in_(renderer.buttons('video')))
+async def video_handler(message: types.Message, state: FSMContext, ctx: UserContext):
     """Создание видео с проверкой лимитов"""
-    user_id = message.from_user.id
-    is_vip = await check_subscription(user_id)
-
-    if not await check_limit(user_id, 'video'):
-        await show_limit_exhausted(message, 'video')
-        return
+    await enter_feature(message, state, ctx, 'video', BotStates.waiting_for_video_prompt)
 
-    await state.set_state(BotStates.waiting_for_video_prompt)
-    daily = get_daily_usage(user_id)
-    limits = VIP_LIMITS if is_vip else FREE_LIMITS
-    remaining = limits['video'] - daily['video']
-
-    status = "VIP" if is_vip else "Базовый"
-
-    await message.answer(
-        f"🎬 **Artemius Video Producer активирован!**\n\n"
-        f"⭐ **Статус:** {status} доступ\n"
-        f"💡 **Осталось видео:** {remaining}\n\n"
-        f"🎥 **Доступные AI сервисы:**\n"
-        f"🌊 **Veo 3** — реалистичные сцены природы\n"
-        f"🤖 **Kling AI** — быстрая HD генерация\n"
-        f"🧡 **Hailuo 02** — креативные эффекты\n"
-        f"🐰 **Pika 2.2** — профессиональное качество\n\n"
-        f"📱 **Параметры:** HD (720p-1080p) • 5-10 сек\n\n"
-        f"Опишите какое видео создать:",
-        reply_markup=get_back_menu(),
-        parse_mode="Markdown"
-    )
-
-@dp.message(F.text == "📄 Документ")
-async def document_handler(message: types.Message, state: FSMContext):
+@dp.message(F.text.in_(renderer.buttons('documents')))
+async def document_handler(message: types.Message, state: FSMContext, ctx: UserContext):
     """Анализ документов с проверкой лимитов"""
-    user_id = message.from_user.id
-    is_vip = await check_subscription(user_id)
-
-    if not await check_limit(user_id, 'documents'):
-        await show_limit_exhausted(message, 'documents')
-        return
+    await enter_feature(message, state, ctx, 'documents', BotStates.waiting_for_document)
 
-    await state.set_state(BotStates.waiting_for_document)
-    daily = get_daily_usage(user_id)
-    limits = VIP_LIMITS if is_vip else FREE_LIMITS
-    remaining = limits['documents'] - daily['documents']
-
-    status = "VIP" if is_vip else "Базовый"
-
-    await message.answer(
-        f"📄 **Artemius Document Analyzer активирован!**\n\n"
-        f"⭐ **Статус:** {status} доступ\n"
-        f"💡 **Осталось анализов:** {remaining}\n\n"
-        f"🔍 **Artemius умеет обрабатывать:**\n"
-        f"• Сканы документов и справок\n"
-        f"• Рукописные заметки и тексты\n"
-        f"• Чеки, счета и квитанции\n"
-        f"• Таблицы и формы\n\n"
-        f"📸 Отправьте фото документа:",
-        reply_markup=get_back_menu(),
-        parse_mode="Markdown"
-    )
-
-@dp.message(F.text == "👤 Мой профиль")
-async def profile_handler(message: types.Message):
+@dp.message(F.text.in_(renderer.buttons('profile')))
+async def profile_handler(message: types.Message, ctx: UserContext):
     """Показать профиль пользователя"""
-    user_id = message.from_user.id
-    is_vip = await check_subscription(user_id)
-    stats = get_user_stats(user_id)
-    daily = get_daily_usage(user_id)
-
-    limits = VIP_LIMITS if is_vip else FREE_LIMITS
-
-    if is_vip:
-        status_title = "⭐ VIP СТАТУС АКТИВЕН!"
-        status_desc = "Спасибо за подписку на каналы!"
-    else:
-        status_title = "🔒 БАЗОВЫЙ ДОСТУП"
-        status_desc = "Подпишитесь на каналы для VIP статуса!"
-
-    profile_text = f"""👤 **Профиль пользователя Artemius AI**
-
-{status_title}
-{status_desc}
+    stats = await user_limits.get_stats(ctx.user_id)
+    reply_markup = None if ctx.is_vip else renderer.subscription_menu(ctx)
+    await message.answer(renderer.text(ctx, 'profile', daily=ctx.daily, stats=stats),
+                         reply_markup=reply_markup, parse_mode="Markdown")
 
-📊 **Использовано сегодня:**
-💬 Диалоги: {daily['chat']}/{limits['chat']}
-🎨 Изображения: {daily['images']}/{limits['images']}  
-🎵 Музыка: {daily['music']}/{limits['music']}
-🎬 Видео: {daily['video']}/{limits['video']}
-📄 Документы: {daily['documents']}/{limits['documents']}
-
-📈 **Всего создано с Artemius:**
-• Диалогов: {stats['total_messages']:,}
-• Изображений: {stats['total_images']:,}
-• Композиций: {stats['total_music']:,}
-• Видеороликов: {stats['total_videos']:,}
-• Документов: {stats['total_documents']:,}
-
-⏰ Лимиты обновляются каждый день в 00:00 МСК"""
-
-    if not is_vip:
-        profile_text += f"""
-
-⭐ **ПОЛУЧИТЕ VIP СТАТУС:**
-Подпишитесь на оба канала и получите:
-
-💬 {VIP_LIMITS['chat']} диалогов (+{VIP_LIMITS['chat'] - FREE_LIMITS['chat']})
-🎨 {VIP_LIMITS['images']} картинок (+{VIP_LIMITS['images'] - FREE_LIMITS['images']})
-🎵 {VIP_LIMITS['music']} композиций (+{VIP_LIMITS['music'] - FREE_LIMITS['music']})
-🎬 {VIP_LIMITS['video']} видео (+{VIP_LIMITS['video'] - FREE_LIMITS['video']})
-📄 {VIP_LIMITS['documents']} документов (+{VIP_LIMITS['documents'] - FREE_LIMITS['documents']})
-
-🚀 Подпишитесь на каналы!"""
-
-    reply_markup = None if is_vip else await get_subscription_menu(user_id)
-    await message.answer(profile_text, reply_markup=reply_markup, parse_mode="Markdown")
-
-@dp.message(F.text.in_(["⭐ VIP режим", "🔒 Базовый доступ", "📢 Получить VIP"]))
-async def subscription_info_handler(message: types.Message):
+@dp.message(F.text.in_(renderer.buttons('status_vip', 'status_free', 'get_vip')))
+async def subscription_info_handler(message: types.Message, ctx: UserContext):
     """Информация о получении VIP статуса"""
-    user_id = message.from_user.id
-    is_vip = await check_subscription(user_id)
-
-    if is_vip:
-        await message.answer(
-            f"⭐ **VIP СТАТУС УЖЕ АКТИВЕН!**\n\n"
-            f"Спасибо за поддержку наших каналов!\n\n"
-            f"🎯 **Ваши VIP-лимиты:**\n"
-            f"💬 {VIP_LIMITS['chat']} диалогов в день\n"
-            f"🎨 {VIP_LIMITS['images']} изображений в день\n"
-            f"🎵 {VIP_LIMITS['music']} композиций в день\n"
-            f"🎬 {VIP_LIMITS['video']} видеороликов в день\n"
-            f"📄 {VIP_LIMITS['documents']} анализов документов в день\n\n"
-            f"🏛️ Наслаждайтесь возможностями Artemius AI!",
-            parse_mode="Markdown"
-        )
-    else:
-        await message.answer(
-            f"⭐ **КАК ПОЛУЧИТЬ VIP СТАТУС?**\n\n"
-            f"📢 **Подпишитесь на ОБА наших канала:**\n\n"
-            + "\n".join([f"• {ch['name']} — {ch['description']}" for ch in REQUIRED_CHANNELS]) +
-            f"\n\n🚀 **Что вы получите:**\n\n"
-            f"**СЕЙЧАС (базовый):**\n"
-            f"💬 {FREE_LIMITS['chat']} диалогов в день\n"
-            f"🎨 {FREE_LIMITS['images']} изображений в день\n"
-            f"🎵 {FREE_LIMITS['music']} композиций в день\n"
-            f"🎬 {FREE_LIMITS['video']} видео в день\n"
-            f"📄 {FREE_LIMITS['documents']} документов в день\n\n"
-            f"**ПОСЛЕ ПОДПИСКИ (VIP):**\n"
-            f"💬 **{VIP_LIMITS['chat']} диалогов** (+{VIP_LIMITS['chat'] - FREE_LIMITS['chat']})\n"
-            f"🎨 **{VIP_LIMITS['images']} изображений** (+{VIP_LIMITS['images'] - FREE_LIMITS['images']})\n"
-            f"🎵 **{VIP_LIMITS['music']} композиций** (+{VIP_LIMITS['music'] - FREE_LIMITS['music']})\n"
-            f"🎬 **{VIP_LIMITS['video']} видео** (+{VIP_LIMITS['video'] - FREE_LIMITS['video']})\n"
-            f"📄 **{VIP_LIMITS['documents']} документов** (+{VIP_LIMITS['documents'] - FREE_LIMITS['documents']})\n\n"
-            f"⭐ **Подпишитесь на каналы прямо сейчас!**",
-            reply_markup=await get_subscription_menu(user_id),
-            parse_mode="Markdown"
-        )
+    reply_markup = None if ctx.is_vip else renderer.subscription_menu(ctx)
+    await message.answer(renderer.text(ctx, 'subscription_info'),
+                         reply_markup=reply_markup, parse_mode="Markdown")
+
+# Push-обновления подписок (бот должен быть админом в каналах)
+@dp.chat_member()
+async def channel_member_handler(update: types.ChatMemberUpdated):
+    """Обновить статус подписки по событию вступления/выхода из канала"""
+    if await subscription_cache.apply_update(update):
+        logger.info(f"Подписка {update.new_chat_member.user.id} в {update.chat.id}: {update.new_chat_member.status}")
 
 # Обработка коллбеков
 @dp.callback_query(F.data == "separator")
@@ -599,251 +435,305 @@ async def separator_callback(callback: types.CallbackQuery):
     await callback.answer()
 
 @dp.callback_query(F.data == "check_subscriptions")
-async def check_subscriptions_callback(callback: types.CallbackQuery):
+async def check_subscriptions_callback(callback: types.CallbackQuery, ctx: UserContext):
     """Проверить подписки пользователя"""
-    await callback.answer("🔄 Проверяю подписки...")
+    await callback.answer(renderer.text(ctx, 'checking'))
     user_id = callback.from_user.id
 
-    # Очищаем кэш для принудительной проверки
-    if user_id in subscription_cache:
-        del subscription_cache[user_id]
+    # Очищаем кэш для принудительной проверки и пересобираем контекст
+    await subscription_cache.invalidate(user_id)
+    ctx = await request_context.resolve(user_id, callback.from_user.language_code)
 
-    is_vip = await check_subscription(user_id)
-    individual_subs = await check_individual_subscriptions(user_id)
-
-    if is_vip:
+    if ctx.is_vip:
+        await callback.message.answer(renderer.text(ctx, 'check_vip'),
+                                      reply_markup=renderer.main_menu(ctx), parse_mode="Markdown")
+    elif not all(ctx.subscriptions.values()):
+        # Показываем какие каналы подписаны, какие нет
         await callback.message.answer(
-            f"✅ **ПОЗДРАВЛЯЕМ! VIP СТАТУС АКТИВИРОВАН!**\n\n"
-            f"🎉 Спасибо за подписку на оба канала!\n\n"
-            f"⭐ **Ваши новые VIP-лимиты:**\n"
-            f"💬 {VIP_LIMITS['chat']} диалогов в день\n"
-            f"🎨 {VIP_LIMITS['images']} изображений в день\n"
-            f"🎵 {VIP_LIMITS['music']} композиций в день\n"
-            f"🎬 {VIP_LIMITS['video']} видеороликов в день\n"
-            f"📄 {VIP_LIMITS['documents']} документов в день\n\n"
-            f"🚀 Теперь у вас есть доступ к расширенным возможностям Artemius AI!",
-            reply_markup=await get_main_menu(user_id),
+            renderer.text(ctx, 'check_missing', status_lines=renderer.status_lines(ctx)),
+            reply_markup=renderer.subscription_menu(ctx),
             parse_mode="Markdown"
         )
     else:
-        # Показываем какие каналы подписаны, какие нет
-        subscribed_channels = []
-        missing_channels = []
-
-        for channel in REQUIRED_CHANNELS:
-            if individual_subs.get(channel["id"], False):
-                subscribed_channels.append(f"✅ {channel['name']}")
-            else:
-                missing_channels.append(f"❌ {channel['name']}")
-
-        status_text = "\n".join(subscribed_channels + missing_channels)
-
-        if missing_channels:
-            await callback.message.answer(
-                f"❌ **VIP статус пока недоступен**\n\n"
-                f"📊 **Статус подписок:**\n"
-                f"{status_text}\n\n"
-                f"📢 **Для получения VIP нужно подписаться на ВСЕ каналы!**\n\n"
-                f"🔍 Убедитесь что вы:\n"
-                f"• Подписались на все каналы\n"
-                f"• НЕ заблокировали каналы\n"
-                f"• Подождали 1-2 минуты после подписки\n\n"
-                f"🔄 Подпишитесь и попробуйте еще раз!",
-                reply_markup=await get_subscription_menu(user_id),
-                parse_mode="Markdown"
-            )
-        else:
-            await callback.message.answer(
-                f"⏳ **Проверяем подписки...**\n\n"
-                f"Возможно нужно подождать минуту для обновления статуса.\n"
-                f"Попробуйте еще раз через 30-60 секунд.",
-                reply_markup=await get_subscription_menu(user_id),
-                parse_mode="Markdown"
-            )
+        await callback.message.answer(renderer.text(ctx, 'check_pending'),
+                                      reply_markup=renderer.subscription_menu(ctx), parse_mode="Markdown")
 
 @dp.callback_query(F.data == "skip_subscriptions")
-async def skip_subscriptions_callback(callback: types.CallbackQuery):
+async def skip_subscriptions_callback(callback: types.CallbackQuery, ctx: UserContext):
     """Пропустить подписку (пока что)"""
     await callback.answer()
-    user_id = callback.from_user.id
-
-    await callback.message.answer(
-        f"🔒 **Базовый доступ активен**\n\n"
-        f"Вы можете пользоваться ограниченными возможностями:\n\n"
-        f"💬 {FREE_LIMITS['chat']} диалогов в день\n"
-        f"🎨 {FREE_LIMITS['images']} изображений в день\n"
-        f"🎵 {FREE_LIMITS['music']} композиций в день\n"
-        f"🎬 {FREE_LIMITS['video']} видео в день\n"
-        f"📄 {FREE_LIMITS['documents']} документов в день\n\n"
-        f"⭐ **В любой момент можете получить VIP**, подписавшись на каналы!",
-        reply_markup=await get_main_menu(user_id),
-        parse_mode="Markdown"
-    )
+    await callback.message.answer(renderer.text(ctx, 'skip'),
+                                  reply_markup=renderer.main_menu(ctx), parse_mode="Markdown")
 
-@dp.message(F.text == "🏠 Главное меню")
-async def main_menu_handler(message: types.Message, state: FSMContext):
+@dp.message(F.text.in_(renderer.buttons('main_menu')))
+async def main_menu_handler(message: types.Message, state: FSMContext, ctx: UserContext):
     """Возврат в главное меню"""
     await state.clear()
-    user_id = message.from_user.id
-    is_vip = await check_subscription(user_id)
-
-    status = "VIP режим" if is_vip else "Базовый доступ"
-
-    await message.answer(
-        f"🏛️ **Artemius AI — Главное меню**\n\n⭐ **Текущий статус:** {status}", 
-        reply_markup=await get_main_menu(user_id),
-        parse_mode="Markdown"
-    )
+    await message.answer(renderer.text(ctx, 'main_menu'),
+                         reply_markup=renderer.main_menu(ctx), parse_mode="Markdown")
 
 # AI ФУНКЦИИ (упрощенные версии для демонстрации)
-async def chat_with_ai(prompt: str, user_id: int) -> str:
-    """Чат с AI"""
-    try:
-        use_feature(user_id, 'chat')
-        return f"🏛️ **Artemius AI обрабатывает:** \"{prompt}\"\n\n💡 Получил ваш запрос! В полной версии использую DeepSeek V3 для глубокого анализа и развернутых ответов на любые вопросы."
-    except Exception as e:
-        return f"❌ Artemius временно недоступен: {str(e)}"
-
-async def generate_image(prompt: str, user_id: int) -> str:
-    """Генерация изображений (заглушка)"""
-    try:
-        use_feature(user_id, 'images')
-        return f"🎨 **Artemius создает изображение:** \"{prompt}\"\n\n⚡ В полной версии использую Stable Diffusion XL для создания качественных изображений по вашему описанию!"
-    except Exception as e:
-        return f"❌ Ошибка генерации: {str(e)}"
-
-async def generate_music(prompt: str, user_id: int) -> str:
-    """Генерация музыки (заглушка)"""
-    try:
-        use_feature(user_id, 'music')
-        return f"🎵 **Artemius компонует музыку:** \"{prompt}\"\n\n🎼 В полной версии использую MusicGen для создания уникальных композиций в любом жанре!"
-    except Exception as e:
-        return f"❌ Ошибка создания музыки: {str(e)}"
+# При сбое бэкенда функции бросают исключение — лимит тогда возвращается
+async def chat_with_ai(prompt: str, user_id: int, language: Optional[str] = None) -> AsyncIterator[str]:
+    """Чат с AI с учётом предыдущих реплик: ответ по кускам, по мере генерации"""
+    if inference is not None:
+        model_prompt = conversations.build_prompt(user_id, prompt)
+        if CHAT_STREAMING:
+            pieces = []
+            async for piece in inference.stream_text('chat', model_prompt):
+                # Заголовок — вместе с первым куском, чтобы первая правка уже показала ответ
+                yield piece if pieces else f"🏛️ **Artemius:**\n\n{piece}"
+                pieces.append(piece)
+            answer = "".join(pieces)
+        else:
+            answer = await inference.generate_text('chat', model_prompt)
+            yield f"🏛️ **Artemius:**\n\n{answer}"
+        # В память — только удачные ответы: после сбоя вопрос просто повторят
+        conversations.append(user_id, prompt, answer)
+        return
+    yield renderer.common(language, 'demo_chat', prompt=prompt)
+
+async def request_media(feature: str, prompt: str) -> bytes:
+    """Файл от модели: через пакетный диспетчер, если он включён для функции"""
+    batcher = media_batchers.get(feature)
+    if batcher is not None:
+        return await batcher.submit(prompt)
+    return await inference.generate_media(feature, prompt)
+
+async def generate_image(prompt: str, user_id: int, language: Optional[str] = None):
+    """Генерация изображений (без токена — заглушка)"""
+    if inference is not None:
+        return await result_cache.get_or_create(
+            'images', HF_MODELS['images'].name, prompt,
+            lambda: request_media('images', prompt), "artemius.png"
+        )
+    return renderer.common(language, 'demo_images', prompt=prompt)
+
+async def generate_music(prompt: str, user_id: int, language: Optional[str] = None):
+    """Генерация музыки (без токена — заглушка)"""
+    if inference is not None:
+        return await result_cache.get_or_create(
+            'music', HF_MODELS['music'].name, prompt,
+            lambda: request_media('music', prompt), "artemius.flac"
+        )
+    return renderer.common(language, 'demo_music', prompt=prompt)
 
-async def generate_video(prompt: str, user_id: int) -> str:
+async def generate_video(prompt: str, user_id: int, language: Optional[str] = None) -> str:
     """Генерация видео (заглушка)"""
-    try:
-        use_feature(user_id, 'video')
-        return f"""🎬 **Artemius Video Studio**
-
-📝 **Создается видео:** {prompt}
-
-⚡ **Параметры:**
-• AI: Veo 3, Kling AI, Pika 2.2
-• Качество: HD (720p-1080p)
-• Длительность: 5-10 секунд
-
-🔄 **Статус:** Генерация...
-⏱️ **Время:** 2-5 минут
-
-💡 В полной версии интегрированы реальные video API!"""
-    except Exception as e:
-        return f"❌ Ошибка видео: {str(e)}"
-
-async def analyze_document(user_id: int) -> str:
-    """Анализ документов (заглушка)"""
-    try:
-        use_feature(user_id, 'documents')
-        return f"""📄 **Artemius Document Analysis**
+    return renderer.common(language, 'demo_video', prompt=prompt)
 
-✅ Документ успешно обработан!
+async def analyze_document(file: DocumentFile, user_id: int, language: Optional[str] = None) -> str:
+    """Анализ документов (без токена — заглушка)"""
+    if inference is not None:
+        text = await document_intake.recognize(
+            file, lambda image: inference.image_to_text('documents', image)
+        )
+        if not text:
+            return renderer.common(language, 'document_no_text')
+        return renderer.common(language, 'document_text', text=text)
+    return renderer.common(language, 'demo_documents')
+
+# Фоновые задачи: видео и музыка не держат хендлер, пока идёт генерация
+JOB_FEATURES = ('video', 'music')
+
+def job_status_text(job: Job, elapsed: Optional[int]) -> str:
+    """Статус задачи в заглушке — на языке заказчика"""
+    if elapsed is None:
+        return renderer.common(job.language, f'job_started:{job.feature}')
+    return renderer.common(job.language, f'job_running:{job.feature}', elapsed=f"{elapsed // 60}:{elapsed % 60:02d}")
+
+async def deliver_job_result(job: Job, result):
+    """Отдать результат фоновой задачи в чат, где её заказали"""
+    if isinstance(result, Exception):
+        await bot.edit_message_text(renderer.common(job.language, f'failed:{job.feature}', error=result),
+                                    chat_id=job.chat_id, message_id=job.message_id)
+    elif isinstance(result, str):
+        await edit_text(bot, job.chat_id, job.message_id, result)
+    else:
+        if job.feature == 'music':
+            await result_cache.send(result, lambda media: bot.send_audio(job.chat_id, media))
+        else:
+            await bot.send_video(job.chat_id, result)
+        # Результат уже у пользователя: неудача удаления заглушки — не ошибка доставки
+        try:
+            await bot.delete_message(job.chat_id, job.message_id)
+        except Exception as e:
+            logger.warning(f"Не удалось удалить заглушку задачи {job.id}: {e}")
+
+job_queue = JobQueue(bot, JobStore(DATABASE_PATH), user_limits, deliver_job_result, job_status_text)
+job_queue.register('video', lambda job: generate_video(job.prompt, job.user_id, job.language),
+                   concurrency=VIDEO_WORKERS)
+job_queue.register('music', lambda job: generate_music(job.prompt, job.user_id, job.language),
+                   concurrency=MUSIC_WORKERS)
+# Рассылки: получатели страницами из хранилища пользователей, с контрольными точками в DATABASE_PATH
+broadcaster = Broadcaster(bot, BroadcastStore(DATABASE_PATH), user_limits, concurrency=BROADCAST_CONCURRENCY)
+metrics_registry.callback_gauge(
+    'artemius_broadcast', 'Идущие рассылки', lambda: {
+        (kind,): sum(progress[kind] for progress in broadcaster.stats().values())
+        for kind in ('sent', 'blocked', 'skipped', 'failed', 'rate')
+    }, labels=['kind'])
+metrics_registry.callback_gauge(
+    'artemius_job_queue', 'Фоновые задачи в очереди',
+    lambda: {(feature,): job_queue.queue_size(feature) for feature in JOB_FEATURES}, labels=['feature'])
+
+async def enqueue_feature(message: types.Message, ctx: UserContext, feature: str, chat_action: str):
+    """Долгая генерация: резерв лимита и постановка задачи в фоновую очередь"""
+    reservation = await user_limits.reserve(message.from_user.id, feature, ctx.limits[feature])
+    if reservation is None:
+        await show_limit_exhausted(message, feature, ctx)
+        return
 
-🔍 **Использованы технологии:**
-• Microsoft TrOCR для распознавания текста
-• Нейросетевая обработка изображения
-• Многоязычный анализ
+    # Если задачу поставить не удалось, единица лимита вернётся
+    async with reservation:
+        await bot.send_chat_action(message.chat.id, chat_action)
+        position = job_queue.queue_size(feature) + 1
+        processing_msg = await message.answer(renderer.text(ctx, f'job_queued:{feature}', position=position))
+        await job_queue.submit(reservation, message.chat.id, processing_msg.message_id, message.text,
+                               language=ctx.language)
+
+async def process_feature(message: types.Message, ctx: UserContext, feature: str, generate):
+    """Общий путь генерации: резерв лимита → бэкенд → подтверждение или возврат
+
+    Заглушка отправляется один раз и затем редактируется в текстовый ответ —
+    два запроса к Bot API вместо четырёх и без мигания сообщений.
+    """
+    # Проверка и списание одной атомарной операцией — общей для всех реплик,
+    # поэтому пачка одновременных сообщений не проскочит лимит
+    reservation = await user_limits.reserve(message.from_user.id, feature, ctx.limits[feature])
+    if reservation is None:
+        await show_limit_exhausted(message, feature, ctx)
+        return
 
-💡 В полной версии: точное распознавание текста с любых документов, переводы, ответы на вопросы по содержанию!"""
-    except Exception as e:
-        return f"❌ Ошибка OCR: {str(e)}"
+    # Любое исключение или отмена внутри блока возвращает единицу лимита
+    async with reservation:
+        processing_msg = await message.answer(renderer.text(ctx, f'progress:{feature}'))
+
+        try:
+            with span(f"generate:{feature}", 'feature'):
+                response = await generate()
+        except Exception as e:
+            logger.error(f"Ошибка {feature} для {message.from_user.id}: {e}")
+            await reservation.refund()
+            response = renderer.text(ctx, f'failed:{feature}', error=e)
+
+        if isinstance(response, str):
+            await edit_text(bot, message.chat.id, processing_msg.message_id, response)
+            return
+
+        # Текстовое сообщение в фото не превратить — заменяем заглушку
+        await processing_msg.delete()
+        if isinstance(response, CachedMedia):
+            await result_cache.send(response, message.answer_photo)
+        else:
+            await message.answer_photo(response)
 
 # Обработчики состояний
 @dp.message(StateFilter(BotStates.waiting_for_text))
-async def process_chat_message(message: types.Message, state: FSMContext):
-    user_id = message.from_user.id
-    if not await check_limit(user_id, 'chat'):
-        await show_limit_exhausted(message, 'chat')
+async def process_chat_message(message: types.Message, state: FSMContext, ctx: UserContext):
+    """Чат: заглушка дописывается ответом по мере генерации"""
+    reservation = await user_limits.reserve(message.from_user.id, 'chat', ctx.limits['chat'])
+    if reservation is None:
+        await show_limit_exhausted(message, 'chat', ctx)
         return
 
-    await bot.send_chat_action(message.chat.id, "typing")
-    processing_msg = await message.answer("🏛️ Artemius думает...")
-
-    response = await chat_with_ai(message.text, user_id)
-    await processing_msg.delete()
-    await message.answer(response, parse_mode="Markdown")
+    async with reservation:
+        processing_msg = await message.answer(renderer.text(ctx, 'progress:chat'))
+        reply = StreamingReply(bot, message.chat.id, processing_msg.message_id, interval=STREAM_EDIT_INTERVAL)
+        try:
+            with span("generate:chat", 'feature'):
+                async for piece in chat_with_ai(message.text, message.from_user.id, ctx.language):
+                    await reply.feed(piece)
+        except Exception as e:
+            # Оборванный ответ не засчитывается; показанное остаётся, ниже — ошибка
+            logger.error(f"Ошибка chat для {message.from_user.id}: {e}")
+            await reservation.refund()
+            error = renderer.text(ctx, 'failed:chat', error=e)
+            await reply.feed(f"\n\n{error}" if reply.text else error)
+        if not reply.text.strip():
+            # Модель ничего не ответила — лимит не списываем
+            await reservation.refund()
+        await reply.finish(renderer.text(ctx, 'empty_reply'))
 
 @dp.message(StateFilter(BotStates.waiting_for_image_prompt))
-async def process_image_generation(message: types.Message, state: FSMContext):
-    user_id = message.from_user.id
-    if not await check_limit(user_id, 'images'):
-        await show_limit_exhausted(message, 'images')
-        return
-
-    await bot.send_chat_action(message.chat.id, "upload_photo")
-    processing_msg = await message.answer("🎨 Artemius создаёт...")
-
-    response = await generate_image(message.text, user_id)
-    await processing_msg.delete()
-    await message.answer(response, parse_mode="Markdown")
+async def process_image_generation(message: types.Message, state: FSMContext, ctx: UserContext):
+    await process_feature(message, ctx, 'images',
+                          lambda: generate_image(message.text, message.from_user.id, ctx.language))
 
 @dp.message(StateFilter(BotStates.waiting_for_music_prompt))
-async def process_music_generation(message: types.Message, state: FSMContext):
-    user_id = message.from_user.id
-    if not await check_limit(user_id, 'music'):
-        await show_limit_exhausted(message, 'music')
-        return
-
-    await bot.send_chat_action(message.chat.id, "upload_document")
-    processing_msg = await message.answer("🎵 Artemius компонует...")
-
-    response = await generate_music(message.text, user_id)
-    await processing_msg.delete()
-    await message.answer(response, parse_mode="Markdown")
+async def process_music_generation(message: types.Message, state: FSMContext, ctx: UserContext):
+    await enqueue_feature(message, ctx, 'music', "upload_document")
 
 @dp.message(StateFilter(BotStates.waiting_for_video_prompt))
-async def process_video_generation(message: types.Message, state: FSMContext):
-    user_id = message.from_user.id
-    if not await check_limit(user_id, 'video'):
-        await show_limit_exhausted(message, 'video')
+async def process_video_generation(message: types.Message, state: FSMContext, ctx: UserContext):
+    await enqueue_feature(message, ctx, 'video', "upload_video")
+
+@dp.message(StateFilter(BotStates.waiting_for_document), F.photo | F.document)
+async def process_document_photo(message: types.Message, state: FSMContext, ctx: UserContext):
+    """Документ фотографией или файлом-изображением"""
+    file = document_intake.select(message)
+    if file is None:
+        await message.answer(renderer.text(ctx, 'document_wrong_type'))
         return
-
-    await bot.send_chat_action(message.chat.id, "upload_video")
-    processing_msg = await message.answer("🎬 Artemius создаёт видео...")
-
-    response = await generate_video(message.text, user_id)
-    await processing_msg.delete()
-    await message.answer(response, parse_mode="Markdown")
-
-@dp.message(StateFilter(BotStates.waiting_for_document), F.photo)
-async def process_document_photo(message: types.Message, state: FSMContext):
-    user_id = message.from_user.id
-    if not await check_limit(user_id, 'documents'):
-        await show_limit_exhausted(message, 'documents')
+    if file.file_size and file.file_size > MAX_DOCUMENT_BYTES:
+        await message.answer(renderer.text(ctx, 'document_too_big'))
         return
 
-    await bot.send_chat_action(message.chat.id, "typing")
-    processing_msg = await message.answer("📄 Artemius сканирует...")
-
-    response = await analyze_document(user_id)
-    await processing_msg.delete()
-    await message.answer(response, parse_mode="Markdown")
+    await process_feature(message, ctx, 'documents',
+                          lambda: analyze_document(file, message.from_user.id, ctx.language))
 
 @dp.message()
-async def handle_unknown_message(message: types.Message):
+async def handle_unknown_message(message: types.Message, ctx: UserContext):
     """Обработка неизвестных сообщений"""
-    user_id = message.from_user.id
-    await message.answer(
-        f"🤔 **Artemius не понял команду**\n\n"
-        f"💡 Используйте кнопки меню для навигации",
-        reply_markup=await get_main_menu(user_id),
-        parse_mode="Markdown"
-    )
+    await message.answer(renderer.text(ctx, 'unknown'),
+                         reply_markup=renderer.main_menu(ctx), parse_mode="Markdown")
+
+async def run_router(allowed_updates):
+    """Роутер шардов: принимает апдейты и без разбора раздаёт их воркерам"""
+    router = ShardRouter(SHARD_WORKERS, [sys.executable, os.path.abspath(__file__)])
+    try:
+        await router.start()
+        logger.info(f"🧩 Роутер раздаёт апдейты {SHARD_WORKERS} воркерам")
+        if BOT_MODE == "webhook":
+            app = build_router_app(router.route, path=WEBHOOK_PATH, secret_token=WEBHOOK_SECRET)
+            await serve_webhook(app, bot, WEBHOOK_URL, path=WEBHOOK_PATH, secret_token=WEBHOOK_SECRET,
+                                port=PORT, allowed_updates=allowed_updates)
+        else:
+            await bot.delete_webhook(drop_pending_updates=True)
+            await poll_updates(bot, router, allowed_updates=allowed_updates)
+    finally:
+        logger.info(f"📊 Шарды: {router.stats()}")
+        await router.close()
+        await bot.session.close()
 
 # Запуск Artemius
 async def main():
     """Запуск Artemius с улучшенной системой подписок"""
+    # chat_member не приходит без явного запроса в allowed_updates
+    allowed_updates = dp.resolve_used_update_types()
+    if SHARD_WORKERS > 1 and not SHARD_SOCKET:
+        try:
+            await run_router(allowed_updates)
+        except Exception as e:
+            logger.error(f"Ошибка: {e}")
+        return
+
+    metrics_runner = None
     try:
-        await bot.delete_webhook(drop_pending_updates=True)
+        await user_limits.start()
+        # Воркер шарда восстанавливает только задачи своих пользователей
+        owns = (lambda user_id: shard_of(user_id, SHARD_WORKERS) == SHARD_INDEX) if SHARD_SOCKET else None
+        await job_queue.start(owns=owns)
+        # Рассылку продолжает воркер, которому достаётся запустивший её администратор
+        await broadcaster.start(owns=owns)
+        bot_metrics.start()
+        if METRICS_PORT:
+            metrics_runner = await start_metrics_server(metrics_registry, METRICS_HOST, METRICS_PORT)
+
+        if SHARD_SOCKET:
+            logger.info(f"🧩 Воркер шарда {SHARD_INDEX + 1}/{SHARD_WORKERS} запущен")
+            await serve_shard(SHARD_SOCKET, dp, bot)
+            return
+
         logger.info("🏛️ ARTEMIUS AI BOT - ЗАПУЩЕН С КАНАЛАМИ @kanal1kkal и @kanal2kkal!")
         logger.info(f"📢 VIP требует подписки на: {[ch['id'] for ch in REQUIRED_CHANNELS]}")
 
@@ -853,11 +743,41 @@ async def main():
         print(f"⭐ VIP лимиты: {VIP_LIMITS}")
         print("💡 Система готова к привлечению пользователей!")
 
-        await dp.start_polling(bot)
+        if BOT_MODE == "webhook":
+            await run_webhook(dp, bot, WEBHOOK_URL, path=WEBHOOK_PATH, secret_token=WEBHOOK_SECRET,
+                              port=PORT, allowed_updates=allowed_updates)
+        else:
+            await bot.delete_webhook(drop_pending_updates=True)
+            await dp.start_polling(bot, allowed_updates=allowed_updates)
 
     except Exception as e:
         logger.error(f"Ошибка: {e}")
     finally:
+        logger.info(f"📊 Кэш подписок: {subscription_cache.stats()}")
+        logger.info(f"📊 Кэш результатов: {result_cache.stats()}")
+        logger.info(f"📊 Кэш OCR: {document_intake.stats()}")
+        logger.info(f"📊 Исходящие: {outbound.stats()}")
+        logger.info(f"📊 Запросы к Bot API: {api_calls.stats()}")
+        logger.info(f"📊 Диалоги: {conversations.stats()}")
+        for feature, batcher in media_batchers.items():
+            logger.info(f"📊 Пакеты {feature}: {batcher.stats()}")
+        logger.info(f"📊 Планировщик апдейтов: {update_scheduler.stats()}")
+        logger.info(f"📊 Трассировка: {tracer.stats()}")
+        for task in profile_tasks:
+            task.cancel()
+        await broadcaster.close()
+        await job_queue.close()
+        for batcher in media_batchers.values():
+            await batcher.close()
+        await tracer.close()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        await bot_metrics.close()
+        await user_limits.close()
+        if inference is not None:
+            await inference.close()
+        await dp.storage.close()
+        await outbound.close()
         await bot.session.close()
 
 if __name__ == "__main__":
@@ -0,0 +1,184 @@
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from typing import Dict, Any, List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.types import Chat, ChatMemberUpdated
+
+from cache import TTLCache
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Статусы, которые считаются подпиской на канал
+SUBSCRIBED_STATUSES = ('member', 'administrator', 'creator')
+
+
+class MembershipEntries(ABC):
+    """Хранилище записей о подписках: результаты опроса (с TTL) и события"""
+
+    @abstractmethod
+    async def get_many(self, user_id: int, channel_ids: List[str]) -> List[Optional[bool]]:
+        """Статусы по каналам; None — записи нет или она истекла"""
+
+    @abstractmethod
+    async def set_polled(self, user_id: int, channel_id: str, is_subscribed: bool):
+        """Запомнить результат getChatMember на TTL"""
+
+    @abstractmethod
+    async def set_known(self, user_id: int, channel_id: str, is_subscribed: bool):
+        """Запомнить статус из события chat_member (без TTL)"""
+
+    @abstractmethod
+    async def invalidate(self, user_id: int, channel_ids: List[str]):
+        """Сбросить результаты опроса и отрицательные события"""
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+
+class LocalMembershipEntries(MembershipEntries):
+    """Записи о подписках в памяти процесса"""
+
+    def __init__(self, ttl: float = 300, maxsize: int = 100_000):
+        # (user_id, channel_id) -> подписан ли, по результатам getChatMember
+        self._entries = TTLCache(maxsize, ttl)
+        # (user_id, channel_id) -> подписан ли, по событиям chat_member (без TTL)
+        self._known = TTLCache(maxsize)
+
+    async def get_many(self, user_id: int, channel_ids: List[str]) -> List[Optional[bool]]:
+        result = []
+        for channel_id in channel_ids:
+            key = (user_id, channel_id)
+            # Таблица событий — не кэш: её отсутствие промахом не считается
+            known = self._known.peek(key)
+            result.append(known if known is not None else self._entries.get(key))
+        return result
+
+    async def set_polled(self, user_id: int, channel_id: str, is_subscribed: bool):
+        self._entries.set((user_id, channel_id), is_subscribed)
+
+    async def set_known(self, user_id: int, channel_id: str, is_subscribed: bool):
+        key = (user_id, channel_id)
+        self._known.set(key, is_subscribed)
+        self._entries.pop(key, None)
+
+    async def invalidate(self, user_id: int, channel_ids: List[str]):
+        for channel_id in channel_ids:
+            key = (user_id, channel_id)
+            self._entries.pop(key, None)
+            if self._known.peek(key) is False:
+                self._known.pop(key)
+
+    def stats(self) -> Dict[str, Any]:
+        """Счётчики кэша getChatMember и таблицы событий"""
+        return {'polled': self._entries.stats(), 'events': self._known.stats()}
+
+
+class MembershipCache:
+    """Кэш подписок по паре (пользователь, канал) с TTL
+
+    Если бот админ в канале, статус приходит push-событиями chat_member и
+    хранится без TTL; getChatMember остаётся запасным путём для тех, о ком
+    событий ещё не было. Сами записи лежат в `entries` — в памяти процесса
+    или в общем хранилище для нескольких реплик.
+    """
+
+    def __init__(self, bot: Bot, channels: List[Dict[str, Any]], ttl: float = 300,
+                 maxsize: int = 100_000, entries: MembershipEntries = None):
+        self.bot = bot
+        self.channels = channels
+        self.ttl = ttl
+        self.entries = entries if entries is not None else LocalMembershipEntries(ttl, maxsize)
+        # Запросы в полёте: параллельные промахи ждут один и тот же getChatMember
+        self._inflight: Dict[Tuple[int, str], asyncio.Future] = {}
+        # Попадания и промахи по парам (пользователь, канал) — для любого хранилища
+        self.hits = 0
+        self.misses = 0
+
+    async def _fetch(self, user_id: int, channel_id: str) -> bool:
+        """Запросить статус в одном канале через getChatMember"""
+        try:
+            member = await self.bot.get_chat_member(channel_id, user_id)
+        except Exception as e:
+            # Ошибку не кэшируем, чтобы сбой API не лишал VIP на весь TTL
+            logger.warning(f"Не удалось проверить подписку {user_id} на {channel_id}: {e}")
+            return False
+        is_subscribed = member.status in SUBSCRIBED_STATUSES
+        await self.entries.set_polled(user_id, channel_id, is_subscribed)
+        return is_subscribed
+
+    def _fetch_shared(self, user_id: int, channel_id: str) -> asyncio.Future:
+        """Общий запрос для всех, кто одновременно промахнулся по одной паре"""
+        key = (user_id, channel_id)
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._fetch(user_id, channel_id))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return future
+
+    async def get_statuses(self, user_id: int) -> Dict[str, bool]:
+        """Статус подписки на каждый канал; промахи запрашиваются параллельно"""
+        with span('subscriptions', 'membership', user_id=user_id):
+            channel_ids = [channel["id"] for channel in self.channels]
+            statuses = {}
+            missing = []
+            for channel_id, cached in zip(channel_ids, await self.entries.get_many(user_id, channel_ids)):
+                if cached is None:
+                    missing.append(channel_id)
+                else:
+                    statuses[channel_id] = cached
+            self.hits += len(statuses)
+            self.misses += len(missing)
+
+            if missing:
+                # shield: отмена одного ожидающего не должна отменять общий запрос
+                results = await asyncio.gather(
+                    *(asyncio.shield(self._fetch_shared(user_id, ch_id)) for ch_id in missing)
+                )
+                statuses.update(zip(missing, results))
+
+        return statuses
+
+    async def is_subscribed_all(self, user_id: int) -> bool:
+        """Подписан ли пользователь на ВСЕ каналы"""
+        statuses = await self.get_statuses(user_id)
+        return all(statuses.values())
+
+    def channel_id_for(self, chat: Chat):
+        """Найти канал из списка по чату апдейта (по @username или числовому id)"""
+        for channel in self.channels:
+            channel_id = channel["id"]
+            if channel_id == str(chat.id):
+                return channel_id
+            if chat.username and channel_id.lower() == f"@{chat.username.lower()}":
+                return channel_id
+        return None
+
+    async def apply_update(self, update: ChatMemberUpdated) -> bool:
+        """Учесть событие вступления/выхода; False если канал не из списка"""
+        channel_id = self.channel_id_for(update.chat)
+        if channel_id is None:
+            return False
+        is_subscribed = update.new_chat_member.status in SUBSCRIBED_STATUSES
+        await self.entries.set_known(update.new_chat_member.user.id, channel_id, is_subscribed)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+            **self.entries.stats(),
+        }
+
+    async def invalidate(self, user_id: int):
+        """Сбросить кэш пользователя для принудительной проверки
+
+        Подтверждённые событиями подписки остаются, а отрицательные
+        перепроверяются: событие вступления могло потеряться при рестарте.
+        """
+        await self.entries.invalidate(user_id, [channel["id"] for channel in self.channels])
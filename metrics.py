@@ -0,0 +1,334 @@
+import asyncio
+import logging
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from aiohttp import web
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import TelegramMethod
+from aiogram.types import TelegramObject
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Секунды: от быстрых ответов из кэша до долгих генераций
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric(ABC):
+    kind = ''
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._children: Dict[Tuple[str, ...], Any] = {}
+
+    def labels(self, *values: str):
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._new_child()
+        return child
+
+    @abstractmethod
+    def _new_child(self):
+        """Значение для одного набора меток"""
+
+    @abstractmethod
+    def _samples(self) -> List[str]:
+        """Строки значений в текстовом формате Prometheus"""
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return '\n'.join(lines)
+
+
+class _Value:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def dec(self, amount: float = 1):
+        self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}{_labels(self.label_names, values)} {_number(child.value)}"
+                for values, child in self._children.items()]
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def dec(self, amount: float = 1):
+        self.labels().dec(amount)
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+
+class _CallbackMetric(_Metric):
+    """Значение читается при каждом сборе: `collect` — число или {метки: число}"""
+
+    def __init__(self, name: str, help: str, collect: Callable[[], Any], labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self.collect = collect
+
+    def _new_child(self):
+        raise TypeError(f"{self.name}: значения задаёт collect, labels() не поддерживается")
+
+    def _samples(self) -> List[str]:
+        value = self.collect()
+        if not isinstance(value, dict):
+            return [f"{self.name} {_number(value)}"]
+        return [f"{self.name}{_labels(self.label_names, values)} {_number(item)}"
+                for values, item in value.items()]
+
+
+class CallbackGauge(_CallbackMetric):
+    kind = 'gauge'
+
+
+class CallbackCounter(_CallbackMetric):
+    """Счётчик, который ведёт сам компонент (например, байты, сэкономленные кэшем)"""
+
+    kind = 'counter'
+
+
+class _HistogramValue:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self) -> _HistogramValue:
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for values, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), child.counts):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, values, le)} {cumulative}")
+            labels = _labels(self.label_names, values)
+            lines.append(f"{self.name}_sum{labels} {_number(child.sum)}")
+            lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+class Registry:
+    """Набор метрик, отдаваемый в текстовом формате Prometheus"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def callback_gauge(self, name: str, help: str, collect: Callable[[], Any],
+                       labels: Sequence[str] = ()) -> CallbackGauge:
+        return self.register(CallbackGauge(name, help, collect, labels))
+
+    def callback_counter(self, name: str, help: str, collect: Callable[[], Any],
+                         labels: Sequence[str] = ()) -> CallbackCounter:
+        return self.register(CallbackCounter(name, help, collect, labels))
+
+    def render(self) -> str:
+        parts = []
+        for metric in self._metrics:
+            try:
+                parts.append(metric.render())
+            except Exception as e:
+                logger.error(f"Ошибка сбора метрики {metric.name}: {e}")
+        return '\n'.join(parts) + '\n'
+
+
+class BotMetrics(BaseRequestMiddleware):
+    """Метрики бота: хендлеры, запросы к Bot API, апдейты в работе, лаг event loop
+
+    Как middleware сессии меряет каждый запрос к Telegram по методу (стоит
+    внутри планировщика исходящих, поэтому ожидание в очереди не входит).
+    `on_update` — outer middleware на `dp.update`, `on_handler` — inner
+    middleware на наблюдателях, где уже известен выбранный хендлер.
+    """
+
+    def __init__(self, registry: Registry):
+        self.registry = registry
+        self.handler_latency = registry.histogram(
+            'artemius_handler_seconds', 'Время работы хендлера', ['handler'])
+        self.handler_errors = registry.counter(
+            'artemius_handler_errors_total', 'Исключения в хендлерах', ['handler'])
+        self.api_latency = registry.histogram(
+            'artemius_telegram_api_seconds', 'Время запроса к Bot API', ['method'])
+        self.api_calls = registry.counter(
+            'artemius_telegram_api_calls_total', 'Запросы к Bot API', ['method', 'result'])
+        self.updates_in_flight = registry.gauge(
+            'artemius_updates_in_flight', 'Апдейты в обработке')
+        self.updates_total = registry.counter(
+            'artemius_updates_total', 'Обработанные апдейты')
+        self.quota_rejections = registry.counter(
+            'artemius_quota_rejections_total', 'Отказы по дневному лимиту', ['feature', 'tier'])
+        self.updates_shed = registry.counter(
+            'artemius_updates_shed_total', 'Апдейты, отклонённые под перегрузкой', ['reason'])
+        self.backend_batches = registry.histogram(
+            'artemius_backend_batch_size', 'Запросов в пакете к бэкенду', ['feature'],
+            buckets=(1, 2, 4, 8, 16, 32))
+        self.loop_lag = registry.histogram(
+            'artemius_event_loop_lag_seconds', 'Опоздание пробуждения event loop',
+            buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5))
+        self.loop_lag_last = registry.gauge(
+            'artemius_event_loop_lag_last_seconds', 'Последнее измерение лага event loop')
+        self._lag_task: Optional[asyncio.Task] = None
+
+    async def __call__(self, make_request: NextRequestMiddlewareType, bot: Bot, method: TelegramMethod):
+        name = method.__api_method__
+        started = time.perf_counter()
+        try:
+            result = await make_request(bot, method)
+        except Exception:
+            self.api_calls.labels(name, 'error').inc()
+            raise
+        finally:
+            self.api_latency.labels(name).observe(time.perf_counter() - started)
+        self.api_calls.labels(name, 'ok').inc()
+        return result
+
+    async def on_update(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                        event: TelegramObject, data: Dict[str, Any]) -> Any:
+        self.updates_in_flight.inc()
+        try:
+            return await handler(event, data)
+        finally:
+            self.updates_in_flight.dec()
+            self.updates_total.inc()
+
+    async def on_handler(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                         event: TelegramObject, data: Dict[str, Any]) -> Any:
+        handler_object = data.get('handler')
+        name = handler_object.callback.__name__ if handler_object is not None else 'unknown'
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            self.handler_errors.labels(name).inc()
+            raise
+        finally:
+            self.handler_latency.labels(name).observe(time.perf_counter() - started)
+
+    def quota_rejected(self, feature: str, is_vip: bool):
+        self.quota_rejections.labels(feature, 'vip' if is_vip else 'free').inc()
+
+    def update_shed(self, reason: str):
+        self.updates_shed.labels(reason).inc()
+
+    def backend_batch(self, feature: str, size: int):
+        self.backend_batches.labels(feature).observe(size)
+
+    async def _measure_loop_lag(self, interval: float):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(interval)
+            lag = max(0.0, time.perf_counter() - started - interval)
+            self.loop_lag.observe(lag)
+            self.loop_lag_last.set(lag)
+
+    def start(self, interval: float = 0.5):
+        if self._lag_task is None:
+            self._lag_task = asyncio.create_task(self._measure_loop_lag(interval))
+
+    async def close(self):
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+            try:
+                await self._lag_task
+            except asyncio.CancelledError:
+                pass
+            self._lag_task = None
+
+
+def metrics_handler(registry: Registry) -> Callable[[web.Request], Awaitable[web.Response]]:
+    async def handle(request: web.Request) -> web.Response:
+        return web.Response(body=registry.render().encode(), headers={'Content-Type': CONTENT_TYPE})
+    return handle
+
+
+async def start_metrics_server(registry: Registry, host: str = "127.0.0.1", port: int = 9090) -> web.AppRunner:
+    """Отдельный HTTP сервер с /metrics"""
+    app = web.Application()
+    app.router.add_get("/metrics", metrics_handler(registry))
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host=host, port=port).start()
+    logger.info(f"📈 Метрики на http://{host}:{port}/metrics")
+    return runner
@@ -0,0 +1,238 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendChatAction, TelegramMethod
+
+from cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Приоритеты исходящих запросов: меньше — раньше
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+
+outbound_priority: ContextVar[int] = ContextVar('outbound_priority', default=PRIORITY_INTERACTIVE)
+
+# Методы, на которые распространяются лимиты Telegram на отправку
+LIMITED_METHODS = frozenset({
+    'sendMessage', 'sendPhoto', 'sendAudio', 'sendVideo', 'sendDocument', 'sendVoice',
+    'sendAnimation', 'sendMediaGroup', 'copyMessage', 'forwardMessage',
+    'editMessageText', 'editMessageCaption', 'editMessageMedia', 'sendChatAction',
+})
+
+# Индикатор «печатает...» Telegram показывает около 5 секунд
+CHAT_ACTION_TTL = 4.5
+
+
+@contextmanager
+def bulk_priority():
+    """Запросы внутри блока уступают интерактивным ответам (рассылки и т.п.)"""
+    token = outbound_priority.set(PRIORITY_BULK)
+    try:
+        yield
+    finally:
+        outbound_priority.reset(token)
+
+
+class TokenBucket:
+    """Маркерное ведро: `rate` маркеров в секунду, не больше `capacity` про запас"""
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self) -> float:
+        """Сколько ждать до свободного маркера, ничего не забирая"""
+        self._refill()
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def reserve(self) -> float:
+        """Забрать маркер в долг; вернуть, сколько ждать до его появления"""
+        self._refill()
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def pause(self, seconds: float):
+        """Ничего не выдавать `seconds` секунд (ответ 429 с retry_after)
+
+        Ближайший маркер появится через `seconds`. Паузы не складываются:
+        несколько 429 подряд с одним retry_after не удлиняют ожидание,
+        долг больше паузы сохраняется.
+        """
+        self._refill()
+        self.tokens = min(self.tokens, 1 - seconds * self.rate)
+
+    def debt_cleared_in(self) -> float:
+        """Через сколько секунд долг будет погашен (0 — долга нет)"""
+        self._refill()
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+class OutboundScheduler(BaseRequestMiddleware):
+    """Планировщик исходящих запросов на уровне сессии Bot API
+
+    Каждый отправляющий запрос сначала ждёт маркер своего чата (личные
+    чаты около 1 сообщения в секунду, группы — 20 в минуту), затем —
+    общий маркер (около 30 в секунду). Общие маркеры выдаются по
+    приоритету: интерактивные ответы раньше массовых. На 429 на паузу
+    `retry_after` ставятся и чат, и общее ведро, и запрос повторяется.
+    Ведро чата в долгу или на паузе не забывается по TTL, пока долг не
+    погашен, иначе новое полное ведро обошло бы паузу. Повторные
+    «печатает...» в тот же чат, пока прежний индикатор ещё виден,
+    не отправляются вовсе.
+    """
+
+    def __init__(self, global_rate: float = 30, private_rate: float = 1, group_rate: float = 20 / 60,
+                 chat_burst: float = 3, max_retries: int = 3, maxsize: int = 100_000):
+        self.private_rate = private_rate
+        self.group_rate = group_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self._global = TokenBucket(global_rate, global_rate)
+        # Простаивающее ведро за минуту и так наполняется — его можно забыть
+        self._chats = TTLCache(maxsize, ttl=60)
+        # Вёдра в долгу (паузы 429, очередь в чат) — до погашения долга
+        self._held: Dict[Any, TokenBucket] = {}
+        self._held_until: list = []
+        self._actions = TTLCache(maxsize, ttl=CHAT_ACTION_TTL)
+        self._queue: list = []
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.sent = 0
+        self.retries = 0
+        self.coalesced = 0
+        self.max_queue = 0
+
+    def _chat_bucket(self, chat_id: Any) -> TokenBucket:
+        self._release_held()
+        bucket = self._held.get(chat_id) or self._chats.get(chat_id)
+        if bucket is None:
+            is_group = isinstance(chat_id, str) or chat_id < 0
+            bucket = TokenBucket(self.group_rate if is_group else self.private_rate, self.chat_burst)
+        # Срок жизни записи отсчитывается от последнего запроса в чат
+        self._chats.set(chat_id, bucket)
+        return bucket
+
+    def _hold(self, chat_id: Any, bucket: TokenBucket):
+        """Не отдавать ведро вытеснению, пока у него есть долг"""
+        wait = bucket.debt_cleared_in()
+        if wait:
+            if chat_id not in self._held:
+                self._held[chat_id] = bucket
+            heapq.heappush(self._held_until, (time.monotonic() + wait, next(self._seq), chat_id))
+
+    def _release_held(self):
+        now = time.monotonic()
+        held_until = self._held_until
+        while held_until and held_until[0][0] <= now:
+            _, _, chat_id = heapq.heappop(held_until)
+            bucket = self._held.get(chat_id)
+            # Долг мог вырасти после записи в кучу — тогда там есть и более поздняя
+            if bucket is not None and not bucket.debt_cleared_in():
+                del self._held[chat_id]
+                self._chats.set(chat_id, bucket)
+
+    async def _acquire_global(self, priority: int):
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._seq), future))
+        self.max_queue = max(self.max_queue, len(self._queue))
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._dispatch())
+        self._wakeup.set()
+        await future
+
+    async def _dispatch(self):
+        """Выдавать общие маркеры ожидающим по приоритету"""
+        queue = self._queue
+        while True:
+            if not queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            delay = self._global.delay()
+            if delay:
+                await asyncio.sleep(delay)
+                continue
+            _, _, future = heapq.heappop(queue)
+            if not future.done():
+                self._global.take()
+                future.set_result(None)
+
+    async def _acquire(self, chat_id: Any, priority: int):
+        bucket = self._chat_bucket(chat_id)
+        delay = bucket.reserve()
+        if delay:
+            self._hold(chat_id, bucket)
+            await asyncio.sleep(delay)
+        await self._acquire_global(priority)
+
+    async def __call__(self, make_request: NextRequestMiddlewareType, bot: Bot, method: TelegramMethod):
+        chat_id = getattr(method, 'chat_id', None)
+        if method.__api_method__ not in LIMITED_METHODS or chat_id is None:
+            return await make_request(bot, method)
+
+        if isinstance(method, SendChatAction):
+            key = (chat_id, method.action)
+            if self._actions.get(key) is not None:
+                self.coalesced += 1
+                return True
+            self._actions.set(key, True)
+
+        priority = outbound_priority.get()
+        for attempt in range(self.max_retries + 1):
+            await self._acquire(chat_id, priority)
+            try:
+                result = await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                if attempt == self.max_retries:
+                    raise
+                self.retries += 1
+                logger.warning(f"⏳ Flood control для {chat_id}: пауза {e.retry_after} с")
+                bucket = self._chat_bucket(chat_id)
+                bucket.pause(e.retry_after)
+                self._hold(chat_id, bucket)
+                self._global.pause(e.retry_after)
+                continue
+            self.sent += 1
+            return result
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'sent': self.sent,
+            'retries': self.retries,
+            'coalesced_actions': self.coalesced,
+            'queued': len(self._queue),
+            'max_queue': self.max_queue,
+            'held_chats': len(self._held),
+        }
@@ -0,0 +1,112 @@
+import asyncio
+import cProfile
+import io
+import logging
+import os
+import pstats
+import time
+import tracemalloc
+from typing import List
+
+logger = logging.getLogger(__name__)
+
+# Кадров стека на выделение памяти: хватает, чтобы дойти до хендлера
+TRACEMALLOC_FRAMES = 15
+
+# Шум самого профилировщика и импорта в отчёте по памяти не нужен
+_MEMORY_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+]
+
+
+class CaptureBusy(Exception):
+    """Профилирование уже идёт"""
+
+
+class Profiler:
+    """Профилирование работающего бота по команде, с ограничением по времени
+
+    cProfile включается на весь процесс: за окно захвата в отчёт попадает
+    всё, что выполнял event loop. tracemalloc сравнивает снимки памяти в
+    начале и в конце окна — видно, где память выросла. Одновременно идёт
+    только один захват; отчёт пишется текстовым файлом в `directory`.
+    """
+
+    def __init__(self, directory: str = "traces", max_seconds: int = 300):
+        self.directory = directory
+        self.max_seconds = max_seconds
+        self._lock = asyncio.Lock()
+
+    @property
+    def busy(self) -> bool:
+        return self._lock.locked()
+
+    def _path(self, kind: str, extension: str) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        return os.path.join(self.directory, f"{kind}-{time.strftime('%Y%m%d-%H%M%S')}.{extension}")
+
+    async def capture_cpu(self, seconds: int) -> str:
+        """cProfile за `seconds` секунд; вернуть путь к текстовому отчёту (рядом — .prof)"""
+        if self.busy:
+            raise CaptureBusy()
+        seconds = min(seconds, self.max_seconds)
+        async with self._lock:
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                profiler.disable()
+            return await asyncio.to_thread(self._write_cpu_report, profiler, seconds)
+
+    def _write_cpu_report(self, profiler: cProfile.Profile, seconds: int) -> str:
+        path = self._path('cpu', 'txt')
+        profiler.dump_stats(path[:-len('txt')] + 'prof')
+        buffer = io.StringIO()
+        buffer.write(f"cProfile за {seconds} с\n\n")
+        stats = pstats.Stats(profiler, stream=buffer).strip_dirs()
+        stats.sort_stats('cumulative').print_stats(60)
+        stats.sort_stats('tottime').print_stats(40)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(buffer.getvalue())
+        return path
+
+    async def capture_memory(self, seconds: int) -> str:
+        """Рост памяти по tracemalloc за `seconds` секунд; вернуть путь к отчёту"""
+        if self.busy:
+            raise CaptureBusy()
+        seconds = min(seconds, self.max_seconds)
+        async with self._lock:
+            started_here = not tracemalloc.is_tracing()
+            if started_here:
+                tracemalloc.start(TRACEMALLOC_FRAMES)
+            try:
+                before = tracemalloc.take_snapshot().filter_traces(_MEMORY_FILTERS)
+                await asyncio.sleep(seconds)
+                after = tracemalloc.take_snapshot().filter_traces(_MEMORY_FILTERS)
+                current, peak = tracemalloc.get_traced_memory()
+            finally:
+                if started_here:
+                    tracemalloc.stop()
+            return await asyncio.to_thread(self._write_memory_report, before, after, current, peak,
+                                           seconds, started_here)
+
+    def _write_memory_report(self, before: tracemalloc.Snapshot, after: tracemalloc.Snapshot,
+                             current: int, peak: int, seconds: int, started_here: bool) -> str:
+        lines: List[str] = [
+            f"tracemalloc за {seconds} с: сейчас {current / 1024 / 1024:.1f} МБ, пик {peak / 1024 / 1024:.1f} МБ"
+            + (" (учтено только выделенное за время захвата)" if started_here else ""),
+            "",
+            "Рост по строкам:",
+        ]
+        lines.extend(str(diff) for diff in after.compare_to(before, 'lineno')[:40])
+        lines.extend(["", "Крупнейшие стеки выделений:"])
+        for statistic in after.compare_to(before, 'traceback')[:10]:
+            lines.append(f"{statistic.size_diff / 1024:+.1f} KiB, {statistic.count_diff:+d} блоков")
+            lines.extend(f"    {line}" for line in statistic.traceback.format())
+        path = self._path('memory', 'txt')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        return path
@@ -0,0 +1,290 @@
+import time
+from abc import ABC, abstractmethod
+from array import array
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from cache import TTLCache
+
+# Фиксированные индексы функций в счётчиках
+FEATURES = ('chat', 'images', 'music', 'video', 'documents')
+FEATURE_INDEX = {feature: i for i, feature in enumerate(FEATURES)}
+
+# Поля общей статистики в порядке FEATURES
+STATS_FIELDS = ('total_messages', 'total_images', 'total_music', 'total_videos', 'total_documents')
+
+# Какой счётчик статистики увеличивает каждая функция
+FEATURE_STATS = dict(zip(FEATURES, STATS_FIELDS))
+
+# Лимиты сбрасываются в 00:00 МСК (UTC+3, без перехода на летнее время)
+MSK_OFFSET = 3 * 3600
+
+
+def msk_day(now: float = None) -> int:
+    """Номер текущих суток по Москве от начала эпохи"""
+    if now is None:
+        now = time.time()
+    return (int(now) + MSK_OFFSET) // 86400
+
+
+class DailyUsage:
+    """Счётчики пользователя за текущие сутки по МСК"""
+
+    __slots__ = ('day', 'counts')
+
+    def __init__(self, day: int):
+        self.day = day
+        self.counts = array('I', bytes(4 * len(FEATURES)))
+
+    def roll(self, day: int):
+        """Ленивый сброс при первом обращении после полуночи"""
+        if self.day != day:
+            self.day = day
+            for i in range(len(self.counts)):
+                self.counts[i] = 0
+
+    def __getitem__(self, feature: str) -> int:
+        return self.counts[FEATURE_INDEX[feature]]
+
+    def copy(self) -> 'DailyUsage':
+        usage = DailyUsage(self.day)
+        usage.counts = array('I', self.counts)
+        return usage
+
+
+def new_stats() -> dict:
+    stats = dict.fromkeys(STATS_FIELDS, 0)
+    stats['first_seen'] = datetime.now().isoformat()
+    return stats
+
+
+class QuotaReservation:
+    """Единица лимита, списанная до вызова бэкенда
+
+    При успехе её подтверждают (`commit` — засчитывается в статистику),
+    при ошибке или отмене возвращают (`refund`). Как контекстный менеджер
+    подтверждает при нормальном выходе и возвращает при любом исключении,
+    включая CancelledError.
+    """
+
+    __slots__ = ('store', 'user_id', 'feature', 'day', 'settled')
+
+    def __init__(self, store: "BaseQuotaStore", user_id: int, feature: str, day: int):
+        self.store = store
+        self.user_id = user_id
+        self.feature = feature
+        self.day = day
+        self.settled = False
+
+    async def commit(self):
+        if not self.settled:
+            self.settled = True
+            await self.store.add_stats(self.user_id, self.feature)
+
+    async def refund(self):
+        if not self.settled:
+            self.settled = True
+            await self.store.release(self.user_id, self.feature, self.day)
+
+    async def __aenter__(self) -> "QuotaReservation":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            await self.commit()
+        else:
+            await self.refund()
+
+
+class BaseQuotaStore(ABC):
+    """Учёт использования: дневные лимиты и общая статистика пользователя"""
+
+    # Может ли recipients вернуть одного пользователя на разных страницах
+    recipients_may_repeat = False
+
+    @abstractmethod
+    async def get_usage(self, user_id: int) -> DailyUsage:
+        """Снимок счётчиков пользователя за текущие сутки по МСК"""
+
+    @abstractmethod
+    async def consume(self, user_id: int, feature: str, limit: int, day: int) -> bool:
+        """Атомарно списать единицу лимита за сутки `day`, если он ещё не исчерпан"""
+
+    @abstractmethod
+    async def release(self, user_id: int, feature: str, day: int):
+        """Вернуть списанную единицу (если сутки ещё не сменились)"""
+
+    async def reserve(self, user_id: int, feature: str, limit: int):
+        """Зарезервировать единицу лимита; None, если лимит исчерпан"""
+        day = msk_day()
+        if not await self.consume(user_id, feature, limit, day):
+            return None
+        return QuotaReservation(self, user_id, feature, day)
+
+    @abstractmethod
+    async def get_stats(self, user_id: int) -> dict:
+        """Общая статистика пользователя за всё время"""
+
+    @abstractmethod
+    async def add_stats(self, user_id: int, feature: str):
+        """Засчитать использование функции в общую статистику"""
+
+    @abstractmethod
+    async def register(self, user_id: int):
+        """Запомнить пользователя, даже если он ещё ничем не пользовался"""
+
+    @abstractmethod
+    async def recipients(self, cursor: str = "", count: int = 100) -> Tuple[List[int], Optional[str]]:
+        """Страница известных user_id после `cursor` и курсор следующей (None — обход закончен)
+
+        Курсор — непрозрачная строка: сохранив её, обход продолжают после рестарта.
+        """
+
+    @abstractmethod
+    async def count_users(self) -> int:
+        """Сколько пользователей известно (для оценки времени рассылки)"""
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+
+class QuotaStore(BaseQuotaStore):
+    """Дневные лимиты и статистика в памяти процесса
+
+    По лимитам — одна запись на пользователя, только за текущие сутки.
+    Если передан `backend` (например, SQLiteStorage), записи пользователя
+    подгружаются из него при первом обращении (чтение — вне event loop),
+    а изменения помечаются для отложенной записи. Тогда в памяти не больше
+    `maxsize` записей каждого вида (LRU): вытесненная до флаша запись
+    остаётся в очереди записи backend и при следующей загрузке берётся
+    оттуда. Без backend память — единственное хранилище, и записи не
+    вытесняются.
+    """
+
+    def __init__(self, backend=None, maxsize: int = 100_000):
+        limit = maxsize if backend is not None else float('inf')
+        self._records = TTLCache(limit)
+        self._stats = TTLCache(limit)
+        self.backend = backend
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    async def usage(self, user_id: int, day: int = None) -> DailyUsage:
+        """Счётчики пользователя на сегодня (создаются и сбрасываются лениво)"""
+        if day is None:
+            day = msk_day()
+        record = self._records.get(user_id)
+        if record is None:
+            record = await self._load(user_id)
+        record.roll(day)
+        return record
+
+    async def _load(self, user_id: int) -> DailyUsage:
+        saved = await self.backend.load_usage(user_id) if self.backend is not None else None
+        # Пока шло чтение, запись мог подгрузить параллельный апдейт
+        record = self._records.peek(user_id)
+        if record is None:
+            record = saved if saved is not None else DailyUsage(msk_day())
+            self._records.set(user_id, record)
+        return record
+
+    async def used(self, user_id: int, feature: str) -> int:
+        return (await self.usage(user_id)).counts[FEATURE_INDEX[feature]]
+
+    async def increment(self, user_id: int, feature: str, amount: int = 1) -> int:
+        """Засчитать использование и вернуть новое значение счётчика"""
+        record = await self.usage(user_id)
+        index = FEATURE_INDEX[feature]
+        record.counts[index] += amount
+        if self.backend is not None:
+            self.backend.mark_usage(user_id, record)
+        return record.counts[index]
+
+    async def user_stats(self, user_id: int) -> dict:
+        stats = self._stats.get(user_id)
+        if stats is None:
+            stats, _ = await self._load_stats(user_id)
+        return stats
+
+    async def _load_stats(self, user_id: int) -> Tuple[dict, bool]:
+        """Статистика из backend или новая; второе значение — новая ли она"""
+        saved = await self.backend.load_stats(user_id) if self.backend is not None else None
+        stats = self._stats.peek(user_id)
+        if stats is not None:
+            return stats, False
+        stats = saved if saved is not None else new_stats()
+        self._stats.set(user_id, stats)
+        return stats, saved is None
+
+    async def get_usage(self, user_id: int) -> DailyUsage:
+        # Копия, как у Redis: запись в кэше меняют резервы других апдейтов
+        return (await self.usage(user_id)).copy()
+
+    async def consume(self, user_id: int, feature: str, limit: int, day: int) -> bool:
+        record = await self.usage(user_id, day)
+        # После загрузки проверка и инкремент не прерываются — внутри одного event loop
+        index = FEATURE_INDEX[feature]
+        if record.counts[index] >= limit:
+            return False
+        record.counts[index] += 1
+        if self.backend is not None:
+            self.backend.mark_usage(user_id, record)
+        return True
+
+    async def release(self, user_id: int, feature: str, day: int):
+        record = self._records.get(user_id)
+        if record is None:
+            record = await self._load(user_id)
+        index = FEATURE_INDEX[feature]
+        if record.day != day or record.counts[index] == 0:
+            return
+        record.counts[index] -= 1
+        if self.backend is not None:
+            self.backend.mark_usage(user_id, record)
+
+    async def get_stats(self, user_id: int) -> dict:
+        return await self.user_stats(user_id)
+
+    async def add_stats(self, user_id: int, feature: str):
+        stats = await self.user_stats(user_id)
+        stats[FEATURE_STATS[feature]] += 1
+        if self.backend is not None:
+            self.backend.mark_stats(user_id, stats)
+
+    async def register(self, user_id: int):
+        if self._stats.get(user_id) is not None:
+            return
+        stats, created = await self._load_stats(user_id)
+        if created and self.backend is not None:
+            self.backend.mark_stats(user_id, stats)
+
+    async def recipients(self, cursor: str = "", count: int = 100) -> Tuple[List[int], Optional[str]]:
+        after = int(cursor) if cursor else 0
+        if self.backend is not None:
+            if not cursor:
+                await self.backend.flush()
+            user_ids = await self.backend.user_ids(after, count)
+        else:
+            user_ids = sorted(user_id for user_id in self._stats.keys() if user_id > after)[:count]
+        if len(user_ids) < count:
+            return user_ids, None
+        return user_ids, str(user_ids[-1])
+
+    async def count_users(self) -> int:
+        if self.backend is not None:
+            # Новые пользователи ещё могут ждать записи на диск
+            await self.backend.flush()
+            return await self.backend.count_users()
+        return len(self._stats)
+
+    async def start(self):
+        if self.backend is not None:
+            self.backend.start()
+
+    async def close(self):
+        if self.backend is not None:
+            await self.backend.close()
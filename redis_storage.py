@@ -0,0 +1,167 @@
+import logging
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+
+from aiogram.fsm.storage.redis import RedisStorage
+from redis.asyncio import ConnectionPool, Redis
+
+from membership import MembershipEntries
+from quota import FEATURES, FEATURE_STATS, STATS_FIELDS, BaseQuotaStore, DailyUsage, msk_day, new_stats
+
+logger = logging.getLogger(__name__)
+
+# Счётчики дня живут чуть больше суток, потом Redis удаляет их сам
+QUOTA_KEY_TTL = 2 * 86400
+
+# Инкремент с проверкой лимита за один round-trip
+CONSUME_SCRIPT = """
+local used = redis.call('HINCRBY', KEYS[1], ARGV[1], 1)
+if used > tonumber(ARGV[2]) then
+    redis.call('HINCRBY', KEYS[1], ARGV[1], -1)
+    return 0
+end
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return 1
+"""
+
+# Возврат единицы без ухода в минус
+RELEASE_SCRIPT = """
+local used = tonumber(redis.call('HGET', KEYS[1], ARGV[1]) or '0')
+if used > 0 then
+    redis.call('HINCRBY', KEYS[1], ARGV[1], -1)
+end
+return used
+"""
+
+
+class RedisQuotaStore(BaseQuotaStore):
+    """Дневные лимиты и статистика в Redis, общие для всех процессов бота"""
+
+    # SSCAN при перестройке множества повторяет элементы и между страницами
+    recipients_may_repeat = True
+
+    def __init__(self, redis: Redis, prefix: str = "artemius"):
+        self.redis = redis
+        self.prefix = prefix
+        self._consume = redis.register_script(CONSUME_SCRIPT)
+        self._release = redis.register_script(RELEASE_SCRIPT)
+
+    def _usage_key(self, user_id: int, day: int) -> str:
+        return f"{self.prefix}:quota:{day}:{user_id}"
+
+    def _stats_key(self, user_id: int) -> str:
+        return f"{self.prefix}:stats:{user_id}"
+
+    @property
+    def _users_key(self) -> str:
+        # Множество всех user_id: SSCAN обходит его по курсору, SCARD считает
+        return f"{self.prefix}:users"
+
+    async def get_usage(self, user_id: int) -> DailyUsage:
+        day = msk_day()
+        values = await self.redis.hmget(self._usage_key(user_id, day), FEATURES)
+        usage = DailyUsage(day)
+        usage.counts = array('I', (int(value or 0) for value in values))
+        return usage
+
+    async def consume(self, user_id: int, feature: str, limit: int, day: int) -> bool:
+        key = self._usage_key(user_id, day)
+        return bool(await self._consume(keys=[key], args=[feature, limit, QUOTA_KEY_TTL]))
+
+    async def release(self, user_id: int, feature: str, day: int):
+        await self._release(keys=[self._usage_key(user_id, day)], args=[feature])
+
+    async def get_stats(self, user_id: int) -> dict:
+        key = self._stats_key(user_id)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.hsetnx(key, 'first_seen', new_stats()['first_seen'])
+            pipe.sadd(self._users_key, user_id)
+            pipe.hgetall(key)
+            _, _, raw = await pipe.execute()
+        stats = dict.fromkeys(STATS_FIELDS, 0)
+        for field, value in raw.items():
+            field = field.decode()
+            stats[field] = value.decode() if field == 'first_seen' else int(value)
+        return stats
+
+    async def add_stats(self, user_id: int, feature: str):
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.hincrby(self._stats_key(user_id), FEATURE_STATS[feature], 1)
+            pipe.sadd(self._users_key, user_id)
+            await pipe.execute()
+
+    async def register(self, user_id: int):
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.hsetnx(self._stats_key(user_id), 'first_seen', new_stats()['first_seen'])
+            pipe.sadd(self._users_key, user_id)
+            await pipe.execute()
+
+    async def recipients(self, cursor: str = "", count: int = 100) -> Tuple[List[int], Optional[str]]:
+        # Курсор SSCAN не привязан к соединению — годится и после рестарта
+        next_cursor, members = await self.redis.sscan(self._users_key, int(cursor or 0), count=count)
+        # SSCAN может вернуть элемент повторно — в пределах страницы повторы отбрасываются
+        return list(dict.fromkeys(int(member) for member in members)), str(next_cursor) if next_cursor else None
+
+    async def count_users(self) -> int:
+        return await self.redis.scard(self._users_key)
+
+
+class RedisMembershipEntries(MembershipEntries):
+    """Записи о подписках в Redis: опрос с TTL через SET EX, события без TTL"""
+
+    def __init__(self, redis: Redis, ttl: float = 300, prefix: str = "artemius"):
+        self.redis = redis
+        self.ttl = int(ttl)
+        self.prefix = prefix
+
+    def _keys(self, user_id: int, channel_id: str) -> Tuple[str, str]:
+        base = f"{self.prefix}:member:{user_id}:{channel_id}"
+        return f"{base}:known", f"{base}:polled"
+
+    async def get_many(self, user_id: int, channel_ids: List[str]) -> List[Optional[bool]]:
+        keys = []
+        for channel_id in channel_ids:
+            keys.extend(self._keys(user_id, channel_id))
+        values = await self.redis.mget(keys)
+        result = []
+        for known, polled in zip(values[::2], values[1::2]):
+            value = known if known is not None else polled
+            result.append(None if value is None else value == b'1')
+        return result
+
+    async def set_polled(self, user_id: int, channel_id: str, is_subscribed: bool):
+        _, polled = self._keys(user_id, channel_id)
+        await self.redis.set(polled, b'1' if is_subscribed else b'0', ex=self.ttl)
+
+    async def set_known(self, user_id: int, channel_id: str, is_subscribed: bool):
+        known, polled = self._keys(user_id, channel_id)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.set(known, b'1' if is_subscribed else b'0')
+            pipe.delete(polled)
+            await pipe.execute()
+
+    async def invalidate(self, user_id: int, channel_ids: List[str]):
+        keys = [self._keys(user_id, channel_id) for channel_id in channel_ids]
+        known_values = await self.redis.mget([known for known, _ in keys])
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for (known, polled), value in zip(keys, known_values):
+                pipe.delete(polled)
+                if value == b'0':
+                    pipe.delete(known)
+            await pipe.execute()
+
+
+def create_redis_storage(url: str, membership_ttl: float = 300,
+                         max_connections: int = 50, redis: Redis = None) -> Dict[str, Any]:
+    """FSM, лимиты и кэш подписок поверх одного пула соединений
+
+    `redis` можно передать готовый (например, fakeredis в локальных проверках).
+    """
+    if redis is None:
+        pool = ConnectionPool.from_url(url, max_connections=max_connections)
+        redis = Redis(connection_pool=pool)
+    return {
+        'fsm': RedisStorage(redis=redis),
+        'quotas': RedisQuotaStore(redis),
+        'membership': RedisMembershipEntries(redis, ttl=membership_ttl),
+    }
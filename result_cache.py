@@ -0,0 +1,202 @@
+import asyncio
+import hashlib
+import logging
+import os
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Union
+
+from aiogram import types
+from aiogram.exceptions import TelegramBadRequest
+
+from cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Одинаковые по смыслу запросы — один ключ: регистр и пробелы не важны"""
+    return ' '.join(prompt.casefold().split())
+
+
+def result_key(feature: str, model: str, prompt: str) -> str:
+    raw = f"{feature}\0{model}\0{normalize_prompt(prompt)}"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def sent_file_id(message: types.Message) -> Optional[str]:
+    """file_id, который Telegram присвоил только что загруженному файлу"""
+    if message.photo:
+        return message.photo[-1].file_id
+    for media in (message.audio, message.video, message.document, message.voice):
+        if media is not None:
+            return media.file_id
+    return None
+
+
+class CachedMedia:
+    """Результат генерации: file_id в Telegram и/или байты файла"""
+
+    __slots__ = ('key', 'filename', 'size', 'file_id', 'data')
+
+    def __init__(self, key: str, filename: str, size: int,
+                 file_id: Optional[str] = None, data: Optional[bytes] = None):
+        self.key = key
+        self.filename = filename
+        self.size = size
+        self.file_id = file_id
+        self.data = data
+
+
+class ResultCache:
+    """Кэш сгенерированных картинок и музыки по содержимому запроса
+
+    Ключ — нормализованный промпт вместе с функцией и моделью. Первый
+    уровень — file_id, полученный от Telegram после первой загрузки:
+    повтор уходит ссылкой, без генерации и без загрузки байтов. Второй —
+    файлы на диске с вытеснением самых давних по суммарному размеру;
+    он выручает, когда file_id в памяти нет или Telegram его не принял.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 512 * 1024 * 1024, maxsize: int = 50_000):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._file_ids = TTLCache(maxsize)
+        # key -> (имя файла, размер), от давно использованных к недавним
+        self._disk: "OrderedDict[str, tuple]" = OrderedDict()
+        self._disk_bytes = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.file_id_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        """Подхватить файлы, оставшиеся с прошлого запуска"""
+        entries = []
+        for name in os.listdir(self.directory):
+            key, _, filename = name.partition('_')
+            if not filename or name.endswith('.tmp'):
+                continue
+            stat = os.stat(os.path.join(self.directory, name))
+            entries.append((stat.st_mtime, key, filename, stat.st_size))
+        for _, key, filename, size in sorted(entries):
+            self._disk[key] = (filename, size)
+            self._disk_bytes += size
+
+    def _path(self, key: str, filename: str) -> str:
+        return os.path.join(self.directory, f"{key}_{filename}")
+
+    def _write(self, key: str, filename: str, data: bytes):
+        path = self._path(key, filename)
+        tmp = f"{path}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def _read(self, key: str, filename: str) -> bytes:
+        with open(self._path(key, filename), 'rb') as f:
+            return f.read()
+
+    def _evict(self):
+        while self._disk_bytes > self.max_bytes and self._disk:
+            key, (filename, size) = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            try:
+                os.remove(self._path(key, filename))
+            except OSError as e:
+                logger.warning(f"Не удалось удалить {key} из кэша результатов: {e}")
+
+    async def _store(self, key: str, filename: str, data: bytes):
+        try:
+            await asyncio.to_thread(self._write, key, filename, data)
+        except OSError as e:
+            logger.error(f"Ошибка записи в кэш результатов: {e}")
+            return
+        previous = self._disk.pop(key, None)
+        if previous is not None:
+            self._disk_bytes -= previous[1]
+        self._disk[key] = (filename, len(data))
+        self._disk_bytes += len(data)
+        self._evict()
+
+    async def _load(self, key: str) -> Optional[CachedMedia]:
+        entry = self._disk.get(key)
+        if entry is None:
+            return None
+        filename, size = entry
+        try:
+            data = await asyncio.to_thread(self._read, key, filename)
+        except OSError:
+            self._disk.pop(key, None)
+            self._disk_bytes -= size
+            return None
+        self._disk.move_to_end(key)
+        return CachedMedia(key, filename, size, data=data)
+
+    async def _lookup(self, key: str) -> Optional[CachedMedia]:
+        cached = self._file_ids.get(key)
+        if cached is not None:
+            filename, size, file_id = cached
+            self.file_id_hits += 1
+            return CachedMedia(key, filename, size, file_id=file_id)
+        media = await self._load(key)
+        if media is not None:
+            self.disk_hits += 1
+        return media
+
+    async def _create(self, key: str, filename: str, generate: Callable[[], Awaitable[bytes]]) -> CachedMedia:
+        media = await self._lookup(key)
+        if media is not None:
+            return media
+        self.misses += 1
+        data = await generate()
+        await self._store(key, filename, data)
+        return CachedMedia(key, filename, len(data), data=data)
+
+    async def get_or_create(self, feature: str, model: str, prompt: str,
+                            generate: Callable[[], Awaitable[bytes]], filename: str) -> CachedMedia:
+        """Результат из кэша или новая генерация; одинаковые запросы в полёте — один вызов"""
+        key = result_key(feature, model, prompt)
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._create(key, filename, generate))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(future)
+
+    async def send(self, media: CachedMedia,
+                   send: Callable[[Union[str, types.InputFile]], Awaitable[types.Message]]) -> types.Message:
+        """Отправить результат: ссылкой по file_id, а если не вышло — файлом"""
+        if media.file_id is not None:
+            try:
+                message = await send(media.file_id)
+                self.bytes_saved += media.size
+                return message
+            except TelegramBadRequest as e:
+                logger.warning(f"file_id из кэша не принят, отправляем файл: {e}")
+                self._file_ids.pop(media.key)
+                fallback = await self._load(media.key)
+                if fallback is None:
+                    raise
+                media = fallback
+
+        message = await send(types.BufferedInputFile(media.data, filename=media.filename))
+        file_id = sent_file_id(message)
+        if file_id is not None:
+            self._file_ids.set(media.key, (media.filename, media.size, file_id))
+        return message
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.file_id_hits + self.disk_hits
+        lookups = hits + self.misses
+        return {
+            'file_id_hits': self.file_id_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_ratio': hits / lookups if lookups else 0.0,
+            'bytes_saved': self.bytes_saved,
+            'disk_entries': len(self._disk),
+            'disk_bytes': self._disk_bytes,
+        }
@@ -0,0 +1,139 @@
+import asyncio
+import logging
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram.types import TelegramObject, Update
+
+logger = logging.getLogger(__name__)
+
+# Отказы: общая очередь переполнена, у пользователя слишком много апдейтов в очереди,
+# перегрузка — отказ тем, кого политика разрешает откладывать
+SHED_QUEUE_FULL = 'queue_full'
+SHED_USER_QUEUE = 'user_queue'
+SHED_OVERLOAD = 'overload'
+
+
+class _UserQueue:
+    __slots__ = ('lock', 'pending')
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.pending = 0
+
+
+class UpdateScheduler:
+    """Порядок, ограничение параллелизма и сброс нагрузки для апдейтов
+
+    Outer middleware на `dp.update`. Апдейты одного пользователя выполняются
+    строго по очереди (asyncio.Lock отдаёт очередь по порядку прихода), и
+    состояние FSM перечитывается, если апдейт ждал предыдущий: иначе промпт
+    успел бы прочитать состояние до `state.clear()` из «Главного меню».
+    Одновременно работает не больше `max_concurrency` хендлеров, остальные
+    ждут слота в общей очереди.
+
+    При входе апдейт может получить отказ: когда общая очередь длиннее
+    `max_queue`, у пользователя уже `max_user_queue` апдейтов в ожидании, или
+    очередь длиннее `shed_queue` и `sheddable(event, data)` разрешает
+    отказать (например, бесплатная генерация). Отказ — вызов `on_shed`
+    (дешёвый ответ «занято») вместо ожидания без конца.
+    """
+
+    def __init__(self, max_concurrency: int = 256, shed_queue: int = 200, max_queue: int = 1000,
+                 max_user_queue: int = 20,
+                 sheddable: Optional[Callable[[Update, Dict[str, Any]], Awaitable[bool]]] = None,
+                 on_shed: Optional[Callable[[Update, Dict[str, Any], str], Awaitable[Any]]] = None):
+        self.max_concurrency = max_concurrency
+        self.shed_queue = shed_queue
+        self.max_queue = max_queue
+        self.max_user_queue = max_user_queue
+        self.sheddable = sheddable
+        self.on_shed = on_shed
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._users: Dict[int, _UserQueue] = {}
+        # Ждут общего слота / ждут, пока закончится предыдущий апдейт пользователя
+        self.waiting = 0
+        self.backlog = 0
+        self.running = 0
+        self.max_waiting = 0
+        self.shed: Counter = Counter()
+
+    async def _admit(self, event: Update, data: Dict[str, Any], user_queue: Optional[_UserQueue]) -> Optional[str]:
+        """Причина отказа или None, если апдейт встаёт в очередь"""
+        if user_queue is not None and user_queue.pending >= self.max_user_queue:
+            return SHED_USER_QUEUE
+        if self.waiting >= self.max_queue:
+            return SHED_QUEUE_FULL
+        if self.waiting >= self.shed_queue and self.sheddable is not None and await self.sheddable(event, data):
+            return SHED_OVERLOAD
+        return None
+
+    async def _run(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                   event: Update, data: Dict[str, Any]) -> Any:
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.running += 1
+        try:
+            return await handler(event, data)
+        finally:
+            self.running -= 1
+            self._slots.release()
+
+    async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: Update, data: Dict[str, Any]) -> Any:
+        user = data.get("event_from_user")
+        user_queue = self._users.get(user.id) if user is not None else None
+
+        reason = await self._admit(event, data, user_queue)
+        if reason is not None:
+            self.shed[reason] += 1
+            if self.on_shed is not None:
+                try:
+                    await self.on_shed(event, data, reason)
+                except Exception as e:
+                    logger.warning(f"Не удалось ответить на отклонённый апдейт: {e}")
+            return None
+
+        if user is None:
+            return await self._run(handler, event, data)
+
+        # Пока решалось, принимать ли апдейт, очередь пользователя могла появиться
+        user_queue = self._users.get(user.id)
+        if user_queue is None:
+            user_queue = self._users[user.id] = _UserQueue()
+        user_queue.pending += 1
+        waited = user_queue.pending > 1
+        if waited:
+            self.backlog += 1
+        try:
+            try:
+                await user_queue.lock.acquire()
+            finally:
+                if waited:
+                    self.backlog -= 1
+            try:
+                state = data.get("state")
+                if waited and state is not None:
+                    # Состояние прочитано до того, как предыдущий апдейт его поменял
+                    data["raw_state"] = await state.get_state()
+                return await self._run(handler, event, data)
+            finally:
+                user_queue.lock.release()
+        finally:
+            user_queue.pending -= 1
+            if not user_queue.pending:
+                del self._users[user.id]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'running': self.running,
+            'waiting': self.waiting,
+            'max_waiting': self.max_waiting,
+            'backlog': self.backlog,
+            'users': len(self._users),
+            'shed': dict(self.shed),
+        }
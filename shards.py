@@ -0,0 +1,243 @@
+import asyncio
+import json
+import logging
+import os
+import struct
+import tempfile
+from collections import deque
+from typing import Any, Dict, List, Optional, Sequence
+
+import aiohttp
+from aiogram import Bot, Dispatcher
+
+logger = logging.getLogger(__name__)
+
+# Кадр: длина (4 байта, big-endian) и JSON апдейта; кадр нулевой длины — барьер
+_HEADER = struct.Struct('>I')
+_BARRIER = _HEADER.pack(0)
+_ACK = b'\x01'
+
+# Сколько ждать, пока воркер поднимется и откроет сокет
+WORKER_START_TIMEOUT = 60
+
+
+def update_user_id(update: Dict[str, Any]) -> Optional[int]:
+    """Пользователь, к чьему состоянию относится апдейт"""
+    for key, event in update.items():
+        if key == 'update_id' or not isinstance(event, dict):
+            continue
+        # chat_member: кэш подписок хранится по тому, кто вступил или вышел
+        member = event.get('new_chat_member')
+        if member is not None:
+            return member['user']['id']
+        for field in ('from', 'user'):
+            user = event.get(field)
+            if user is not None:
+                return user['id']
+        chat = event.get('chat')
+        if chat is not None:
+            return chat['id']
+    return None
+
+
+def shard_of(user_id: int, workers: int) -> int:
+    """Номер шарда пользователя; не зависит от процесса и рестартов"""
+    return user_id % workers
+
+
+class ShardRouter:
+    """Раздаёт апдейты по процессам-воркерам по user_id
+
+    Воркеры — отдельные процессы с тем же ботом (`command`), каждый слушает
+    свой unix-сокет. Все апдейты пользователя попадают в один воркер в
+    порядке получения, поэтому FSM, дневные лимиты и кэш подписок в памяти
+    воркера остаются согласованными. Упавший воркер перезапускается;
+    апдейты, отправленные ему до падения, теряются, как при падении бота.
+    """
+
+    def __init__(self, workers: int, command: Sequence[str], env: Optional[Dict[str, str]] = None):
+        self.workers = workers
+        self.command = list(command)
+        self.env = env
+        self.directory = tempfile.mkdtemp(prefix='artemius-shards-')
+        self.routed = [0] * workers
+        self._processes: List[Optional[asyncio.subprocess.Process]] = [None] * workers
+        self._writers: List[Optional[asyncio.StreamWriter]] = [None] * workers
+        self._ready = [asyncio.Event() for _ in range(workers)]
+        self._acks: List[deque] = [deque() for _ in range(workers)]
+        self._tasks: List[asyncio.Task] = []
+        self._closing = False
+
+    def socket_path(self, index: int) -> str:
+        return os.path.join(self.directory, f"shard-{index}.sock")
+
+    async def _spawn(self, index: int):
+        env = dict(self.env if self.env is not None else os.environ)
+        env.update(SHARD_INDEX=str(index), SHARD_WORKERS=str(self.workers), SHARD_SOCKET=self.socket_path(index))
+        self._processes[index] = await asyncio.create_subprocess_exec(*self.command, env=env)
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + WORKER_START_TIMEOUT
+        while True:
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.socket_path(index))
+                break
+            except OSError:
+                if loop.time() > deadline or self._processes[index].returncode is not None:
+                    raise RuntimeError(f"Воркер {index} не поднялся")
+                await asyncio.sleep(0.1)
+        self._writers[index] = writer
+        self._ready[index].set()
+        self._tasks.append(asyncio.create_task(self._read_acks(index, reader)))
+        logger.info(f"🧩 Воркер {index} запущен (pid {self._processes[index].pid})")
+
+    async def _read_acks(self, index: int, reader: asyncio.StreamReader):
+        while await reader.read(1):
+            if self._acks[index]:
+                self._acks[index].popleft().set_result(None)
+        # Соединение закрыто — воркер упал или завершается: барьеры не дождутся ответа
+        while self._acks[index]:
+            self._acks[index].popleft().set_exception(ConnectionError(f"воркер {index} недоступен"))
+
+    async def _supervise(self, index: int):
+        while not self._closing:
+            await self._processes[index].wait()
+            if self._closing:
+                return
+            logger.error(f"Воркер {index} завершился с кодом {self._processes[index].returncode}, перезапуск")
+            self._ready[index].clear()
+            self._writers[index] = None
+            try:
+                await self._spawn(index)
+            except RuntimeError as e:
+                logger.error(f"{e}; повтор через 5 с")
+                await asyncio.sleep(5)
+
+    async def start(self):
+        await asyncio.gather(*(self._spawn(index) for index in range(self.workers)))
+        self._tasks.extend(asyncio.create_task(self._supervise(index)) for index in range(self.workers))
+
+    async def route(self, update: Dict[str, Any]):
+        """Отправить апдейт (dict из Bot API) в воркер его пользователя"""
+        user_id = update_user_id(update)
+        index = shard_of(user_id if user_id is not None else update['update_id'], self.workers)
+        if not self._ready[index].is_set():
+            await self._ready[index].wait()
+        payload = json.dumps(update, ensure_ascii=False).encode()
+        writer = self._writers[index]
+        writer.write(_HEADER.pack(len(payload)) + payload)
+        self.routed[index] += 1
+        await writer.drain()
+
+    async def drain(self):
+        """Дождаться, пока все воркеры обработают отправленные им апдейты"""
+        futures = []
+        for index in range(self.workers):
+            if self._closing and not self._ready[index].is_set():
+                continue
+            await self._ready[index].wait()
+            future = asyncio.get_running_loop().create_future()
+            self._acks[index].append(future)
+            self._writers[index].write(_BARRIER)
+            futures.append(future)
+        await asyncio.gather(*futures)
+
+    async def close(self):
+        # Упавшие при остановке воркеры больше не перезапускаются
+        self._closing = True
+        try:
+            await asyncio.wait_for(self.drain(), 30)
+        except (asyncio.TimeoutError, ConnectionError) as e:
+            logger.warning(f"Воркеры не дообработали апдейты: {e!r}")
+        for task in self._tasks:
+            task.cancel()
+        # Закрытый сокет — сигнал воркеру сохранить состояние и выйти
+        for writer in self._writers:
+            if writer is not None:
+                writer.close()
+        processes = [process for process in self._processes if process is not None]
+        try:
+            await asyncio.wait_for(asyncio.gather(*(process.wait() for process in processes)), 30)
+        except asyncio.TimeoutError:
+            for process in processes:
+                if process.returncode is None:
+                    process.terminate()
+            await asyncio.gather(*(process.wait() for process in processes))
+
+    def stats(self) -> Dict[str, Any]:
+        return {'workers': self.workers, 'routed': list(self.routed)}
+
+
+async def poll_updates(bot: Bot, router: ShardRouter, allowed_updates: Optional[List[str]] = None,
+                       timeout: int = 30):
+    """Long polling без разбора апдейтов в модели: JSON из getUpdates сразу в воркеры"""
+    url = bot.session.api.api_url(token=bot.token, method='getUpdates')
+    offset = 0
+    delay = 1.0
+    async with aiohttp.ClientSession() as session:
+        while True:
+            params = {'offset': offset, 'timeout': timeout}
+            if allowed_updates is not None:
+                params['allowed_updates'] = json.dumps(allowed_updates)
+            try:
+                async with session.post(url, data=params,
+                                        timeout=aiohttp.ClientTimeout(total=timeout + 10)) as response:
+                    body = await response.json(content_type=None)
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                logger.warning(f"getUpdates не удался: {e!r}, повтор через {delay:.0f} с")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+                continue
+            if not body.get('ok'):
+                logger.warning(f"getUpdates: {body.get('description')}, повтор через {delay:.0f} с")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+                continue
+            delay = 1.0
+            for update in body['result']:
+                await router.route(update)
+                offset = update['update_id'] + 1
+
+
+async def serve_shard(path: str, dp: Dispatcher, bot: Bot, **kwargs: Any):
+    """Воркер: принимать апдейты от роутера и обрабатывать их как при polling
+
+    Возвращается, когда роутер закрыл соединение, дообработав полученное.
+    """
+    tasks: set = set()
+    disconnected = asyncio.Event()
+
+    async def process(update: Dict[str, Any]):
+        try:
+            await dp.feed_raw_update(bot, update, **kwargs)
+        except Exception as e:
+            logger.error(f"Ошибка обработки апдейта {update.get('update_id')}: {e}")
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                (length,) = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+                if not length:
+                    # Барьер: ответить, когда дообработано всё полученное до него
+                    if tasks:
+                        await asyncio.wait(set(tasks))
+                    writer.write(_ACK)
+                    await writer.drain()
+                    continue
+                task = asyncio.create_task(process(json.loads(await reader.readexactly(length))))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except asyncio.IncompleteReadError:
+            pass
+        finally:
+            writer.close()
+            disconnected.set()
+
+    if os.path.exists(path):
+        os.unlink(path)
+    server = await asyncio.start_unix_server(handle, path)
+    logger.info(f"🧩 Воркер шарда слушает {path}")
+    async with server:
+        await disconnected.wait()
+    if tasks:
+        await asyncio.wait(set(tasks))
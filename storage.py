@@ -0,0 +1,222 @@
+import asyncio
+import logging
+import sqlite3
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from quota import FEATURES, STATS_FIELDS, DailyUsage
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS user_stats (
+    user_id INTEGER PRIMARY KEY,
+    first_seen TEXT NOT NULL,
+    {', '.join(f'{field} INTEGER NOT NULL DEFAULT 0' for field in STATS_FIELDS)}
+);
+CREATE TABLE IF NOT EXISTS daily_usage (
+    user_id INTEGER PRIMARY KEY,
+    day INTEGER NOT NULL,
+    {', '.join(f'{feature} INTEGER NOT NULL DEFAULT 0' for feature in FEATURES)}
+);
+"""
+
+
+class SQLiteStorage:
+    """Хранилище статистики и лимитов в SQLite с отложенной пакетной записью
+
+    Счётчики меняются только в памяти; изменённые записи помечаются
+    грязными и раз в `flush_interval` секунд (или при `flush_threshold`
+    грязных записях) пишутся одной транзакцией в отдельном потоке. Поток
+    записи один: пакеты не пересекаются на соединении, а `close` дожидается
+    идущего пакета, прежде чем закрыть базу.
+
+    Чтения идут в своём потоке по одному и не блокируют event loop. Ещё
+    не записанные изменения отдаются прямо из очереди записи — поэтому
+    запись, вытесненная из памяти до флаша, при следующей загрузке не
+    подменяется устаревшей строкой с диска.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 2.0, flush_threshold: int = 1000):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        # Отдельные соединения на чтение (event loop) и запись (поток флаша);
+        # в режиме WAL чтение не ждёт идущую запись
+        self._writer = self._connect()
+        self._writer.executescript(SCHEMA)
+        self._reader = self._connect()
+        self._read_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sqlite-read')
+        self._write_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sqlite-write')
+        self._dirty_stats: Dict[int, dict] = {}
+        self._dirty_usage: Dict[int, DailyUsage] = {}
+        # Записи, которые прямо сейчас пишутся на диск
+        self._flushing_stats: Dict[int, dict] = {}
+        self._flushing_usage: Dict[int, DailyUsage] = {}
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    async def _read(self, query: Callable[..., Any], *args) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._read_executor, query, *args)
+
+    # Ленивая загрузка по одному пользователю
+
+    async def load_stats(self, user_id: int) -> Optional[dict]:
+        pending = self._dirty_stats.get(user_id) or self._flushing_stats.get(user_id)
+        if pending is not None:
+            return pending
+        return await self._read(self._select_stats, user_id)
+
+    async def load_usage(self, user_id: int) -> Optional[DailyUsage]:
+        pending = self._dirty_usage.get(user_id) or self._flushing_usage.get(user_id)
+        if pending is not None:
+            return pending
+        return await self._read(self._select_usage, user_id)
+
+    def _select_stats(self, user_id: int) -> Optional[dict]:
+        row = self._reader.execute(
+            f"SELECT first_seen, {', '.join(STATS_FIELDS)} FROM user_stats WHERE user_id = ?",
+            (user_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        stats = dict(zip(STATS_FIELDS, row[1:]))
+        stats['first_seen'] = row[0]
+        return stats
+
+    def _select_usage(self, user_id: int) -> Optional[DailyUsage]:
+        row = self._reader.execute(
+            f"SELECT day, {', '.join(FEATURES)} FROM daily_usage WHERE user_id = ?",
+            (user_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        usage = DailyUsage(row[0])
+        usage.counts = array('I', row[1:])
+        return usage
+
+    # Обход пользователей по возрастанию user_id (рассылки)
+
+    async def user_ids(self, after: int, limit: int) -> List[int]:
+        rows = await self._read(lambda: self._reader.execute(
+            "SELECT user_id FROM user_stats WHERE user_id > ? ORDER BY user_id LIMIT ?", (after, limit)
+        ).fetchall())
+        return [user_id for user_id, in rows]
+
+    async def count_users(self) -> int:
+        return await self._read(lambda: self._reader.execute("SELECT COUNT(*) FROM user_stats").fetchone()[0])
+
+    # Отметки об изменениях (горячий путь, без I/O)
+
+    def mark_stats(self, user_id: int, stats: dict):
+        self._dirty_stats[user_id] = stats
+        self._maybe_wakeup()
+
+    def mark_usage(self, user_id: int, usage: DailyUsage):
+        self._dirty_usage[user_id] = usage
+        self._maybe_wakeup()
+
+    def _maybe_wakeup(self):
+        if len(self._dirty_stats) + len(self._dirty_usage) >= self.flush_threshold:
+            self._wakeup.set()
+
+    # Запись на диск
+
+    def _write_batch(self, stats_rows: list, usage_rows: list):
+        conn = self._writer
+        conn.execute("BEGIN")
+        try:
+            if stats_rows:
+                conn.executemany(
+                    f"INSERT INTO user_stats (user_id, first_seen, {', '.join(STATS_FIELDS)}) "
+                    f"VALUES (?, ?, {', '.join('?' for _ in STATS_FIELDS)}) "
+                    f"ON CONFLICT(user_id) DO UPDATE SET "
+                    + ', '.join(f'{field} = excluded.{field}' for field in STATS_FIELDS),
+                    stats_rows
+                )
+            if usage_rows:
+                conn.executemany(
+                    f"INSERT OR REPLACE INTO daily_usage (user_id, day, {', '.join(FEATURES)}) "
+                    f"VALUES (?, ?, {', '.join('?' for _ in FEATURES)})",
+                    usage_rows
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _take_snapshot(self):
+        """Забрать грязные записи и зафиксировать их значения на этот момент"""
+        dirty_stats, self._dirty_stats = self._dirty_stats, {}
+        dirty_usage, self._dirty_usage = self._dirty_usage, {}
+        stats_rows = [
+            (user_id, stats['first_seen'], *(stats.get(field, 0) for field in STATS_FIELDS))
+            for user_id, stats in dirty_stats.items()
+        ]
+        usage_rows = [
+            (user_id, usage.day, *usage.counts)
+            for user_id, usage in dirty_usage.items()
+        ]
+        return dirty_stats, dirty_usage, stats_rows, usage_rows
+
+    async def flush(self):
+        """Записать накопленные изменения одной транзакцией"""
+        async with self._flush_lock:
+            if not self._dirty_stats and not self._dirty_usage:
+                return
+            dirty_stats, dirty_usage, stats_rows, usage_rows = self._take_snapshot()
+            self._flushing_stats, self._flushing_usage = dirty_stats, dirty_usage
+            try:
+                await asyncio.get_running_loop().run_in_executor(
+                    self._write_executor, self._write_batch, stats_rows, usage_rows)
+            except Exception as e:
+                logger.error(f"Ошибка записи в {self.path}: {e}")
+                # Вернём несохранённое, не затирая более свежие отметки
+                for user_id, stats in dirty_stats.items():
+                    self._dirty_stats.setdefault(user_id, stats)
+                for user_id, usage in dirty_usage.items():
+                    self._dirty_usage.setdefault(user_id, usage)
+            finally:
+                self._flushing_stats, self._flushing_usage = {}, {}
+
+    async def _flush_loop(self):
+        # Останавливается флагом, а не cancel(): wait_for может проглотить отмену,
+        # а отменённый флаш оставил бы пакет дописываться в потоке
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if self._closing:
+                return
+            await self.flush()
+
+    def start(self):
+        """Запустить фоновую запись"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        """Остановить фоновую запись, сбросить остаток на диск и закрыть базу"""
+        self._closing = True
+        self._wakeup.set()
+        if self._task is not None:
+            # Идущий пакет дописывается, новый цикл не начинается
+            await self._task
+            self._task = None
+        await self.flush()
+        # Даже если флаш прервали снаружи, поток записи дорабатывает до закрытия соединений
+        self._write_executor.shutdown(wait=True)
+        self._read_executor.shutdown(wait=True)
+        self._reader.close()
+        self._writer.close()
@@ -0,0 +1,181 @@
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, KeyboardButton, ReplyKeyboardMarkup
+
+from context import UserContext
+from quota import FEATURES
+
+TIERS = ('free', 'vip')
+
+
+class _Deferred:
+    """Поле, которое заполняется при отправке: при сборке остаётся как есть"""
+
+    __slots__ = ('name',)
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __getitem__(self, key: str) -> "_Deferred":
+        return _Deferred(f"{self.name}[{key}]")
+
+    def __format__(self, spec: str) -> str:
+        return '{' + self.name + (':' + spec if spec else '') + '}'
+
+
+class _StaticFields(dict):
+    """Известные при запуске поля; неизвестные откладываются до отправки"""
+
+    deferred = False
+
+    def __missing__(self, key: str) -> _Deferred:
+        self.deferred = True
+        return _Deferred(key)
+
+
+def _escape(value: Any) -> Any:
+    if isinstance(value, str):
+        return value.replace('{', '{{').replace('}', '}}')
+    if isinstance(value, dict):
+        return {key: _escape(item) for key, item in value.items()}
+    return value
+
+
+def precompile(template: str, fields: Dict[str, Any]) -> Tuple[str, bool]:
+    """Подставить известные поля; вернуть текст и признак, остались ли поля на потом"""
+    static = _StaticFields(fields)
+    text = template.format_map(static)
+    if static.deferred:
+        # Текст ещё пройдёт через format — фигурные скобки в значениях экранируем
+        text = template.format_map(_StaticFields(_escape(fields)))
+    return sys.intern(text), static.deferred
+
+
+class Renderer:
+    """Готовые тексты и клавиатуры по языку и тарифу
+
+    Всё, что зависит только от лимитов, каналов и языка, собирается один
+    раз при запуске. При отправке остаётся выбрать готовую строку или
+    подставить в неё пару пользовательских полей (остаток лимита,
+    счётчики профиля, строки статуса каналов из готовых фрагментов).
+    """
+
+    def __init__(self, catalog: Dict[str, dict], free_limits: Dict[str, int], vip_limits: Dict[str, int],
+                 channels: List[Dict[str, str]], default_locale: str = 'ru'):
+        self.catalog = catalog
+        self.channels = channels
+        self.default_locale = default_locale
+        self._texts: Dict[Tuple[str, str, str], str] = {}
+        self._main_menus: Dict[Tuple[str, str], ReplyKeyboardMarkup] = {}
+        self._back_menus: Dict[str, ReplyKeyboardMarkup] = {}
+        self._subscription_menus: Dict[Tuple[str, Tuple[bool, ...]], InlineKeyboardMarkup] = {}
+        self._status_lines: Dict[Tuple[str, Tuple[bool, ...]], str] = {}
+        self._channel_lines: Dict[str, List[Tuple[str, str]]] = {}
+        self._locales: Dict[Optional[str], str] = {}
+
+        plus = {feature: vip_limits[feature] - free_limits[feature] for feature in FEATURES}
+        for locale, entries in catalog.items():
+            channel_list = "\n".join(f"• {ch['name']} — {ch['description']}" for ch in channels)
+            for tier in TIERS:
+                limits = vip_limits if tier == 'vip' else free_limits
+                fields = {
+                    'free': free_limits, 'vip': vip_limits, 'plus': plus, 'limit': limits,
+                    'tier': entries['tiers'][tier], 'channels': channel_list,
+                }
+                for key, template in entries['texts'].items():
+                    if isinstance(template, dict):
+                        template = template[tier]
+                    if '{feature[' in template:
+                        for feature in FEATURES:
+                            feature_fields = dict(entries['features'][feature], limit=limits[feature],
+                                                  vip=vip_limits[feature], plus=plus[feature])
+                            text, _ = precompile(template, dict(fields, feature=feature_fields))
+                            self._texts[(locale, tier, f"{key}:{feature}")] = text
+                    else:
+                        self._texts[(locale, tier, key)], _ = precompile(template, fields)
+                self._main_menus[(locale, tier)] = self._build_main_menu(entries['buttons'], tier)
+
+            self._back_menus[locale] = ReplyKeyboardMarkup(
+                keyboard=[[KeyboardButton(text=entries['buttons']['main_menu'])]], resize_keyboard=True
+            )
+            self._channel_lines[locale] = [
+                (sys.intern(entries['texts']['channel_ok'].format(name=ch['name'])),
+                 sys.intern(entries['texts']['channel_missing'].format(name=ch['name'])))
+                for ch in channels
+            ]
+
+    def _build_main_menu(self, buttons: Dict[str, str], tier: str) -> ReplyKeyboardMarkup:
+        keyboard = [
+            [KeyboardButton(text=buttons['chat']), KeyboardButton(text=buttons['images'])],
+            [KeyboardButton(text=buttons['music']), KeyboardButton(text=buttons['video'])],
+            [KeyboardButton(text=buttons['documents']), KeyboardButton(text=buttons['profile'])],
+            [KeyboardButton(text=buttons[f'status_{tier}']), KeyboardButton(text=buttons['get_vip'])],
+        ]
+        return ReplyKeyboardMarkup(keyboard=keyboard, resize_keyboard=True)
+
+    def _build_subscription_menu(self, locale: str, states: Tuple[bool, ...]) -> InlineKeyboardMarkup:
+        buttons = self.catalog[locale]['buttons']
+        keyboard = [
+            [InlineKeyboardButton(
+                text=buttons['subscribed' if is_subscribed else 'subscribe'].format(name=channel['name']),
+                url=channel['url']
+            )]
+            for channel, is_subscribed in zip(self.channels, states)
+        ]
+        keyboard.append([InlineKeyboardButton(text=buttons['separator'], callback_data="separator")])
+        keyboard.append([InlineKeyboardButton(text=buttons['check'], callback_data="check_subscriptions")])
+        keyboard.append([InlineKeyboardButton(text=buttons['skip'], callback_data="skip_subscriptions")])
+        return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+    def locale(self, language_code: Optional[str]) -> str:
+        """Язык каталога по language_code пользователя из Telegram"""
+        locale = self._locales.get(language_code)
+        if locale is None:
+            prefix = (language_code or '').split('-')[0].lower()
+            locale = prefix if prefix in self.catalog else self.default_locale
+            self._locales[language_code] = locale
+        return locale
+
+    def _states(self, ctx: UserContext) -> Tuple[bool, ...]:
+        return tuple(ctx.subscriptions.get(ch['id'], False) for ch in self.channels)
+
+    def text(self, ctx: UserContext, key: str, **fields: Any) -> str:
+        """Готовый текст; `fields` — только для шаблонов с полями на момент отправки"""
+        tier = 'vip' if ctx.is_vip else 'free'
+        template = self._texts[(self.locale(ctx.language), tier, key)]
+        return template.format(**fields) if fields else template
+
+    def common(self, language_code: Optional[str], key: str, **fields: Any) -> str:
+        """Текст, одинаковый для всех тарифов, когда контекста пользователя нет (фоновые задачи)"""
+        template = self._texts[(self.locale(language_code), 'free', key)]
+        return template.format(**fields) if fields else template
+
+    def buttons(self, *keys: str) -> List[str]:
+        """Надписи кнопок на всех языках — для фильтров хендлеров"""
+        return [entries['buttons'][key] for entries in self.catalog.values() for key in keys]
+
+    def main_menu(self, ctx: UserContext) -> ReplyKeyboardMarkup:
+        return self._main_menus[(self.locale(ctx.language), 'vip' if ctx.is_vip else 'free')]
+
+    def back_menu(self, ctx: UserContext) -> ReplyKeyboardMarkup:
+        return self._back_menus[self.locale(ctx.language)]
+
+    def subscription_menu(self, ctx: UserContext) -> InlineKeyboardMarkup:
+        key = (self.locale(ctx.language), self._states(ctx))
+        menu = self._subscription_menus.get(key)
+        if menu is None:
+            menu = self._subscription_menus[key] = self._build_subscription_menu(*key)
+        return menu
+
+    def status_lines(self, ctx: UserContext) -> str:
+        """Строки ✅/❌ по каналам: сначала подписанные, затем остальные"""
+        locale = self.locale(ctx.language)
+        states = self._states(ctx)
+        lines = self._status_lines.get((locale, states))
+        if lines is None:
+            fragments = self._channel_lines[locale]
+            ok = [fragments[i][0] for i, state in enumerate(states) if state]
+            missing = [fragments[i][1] for i, state in enumerate(states) if not state]
+            lines = self._status_lines[(locale, states)] = "\n".join(ok + missing)
+        return lines
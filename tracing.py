@@ -0,0 +1,182 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import TelegramMethod
+from aiogram.types import TelegramObject, Update
+
+logger = logging.getLogger(__name__)
+
+
+class _Span:
+    __slots__ = ('events', 'tid', 'started', 'awaited')
+
+    def __init__(self, events: List[dict], tid: int, started: float):
+        self.events = events
+        self.tid = tid
+        self.started = started
+        # Время во вложенных спанах — ожидание Bot API, кэша подписок, бэкенда
+        self.awaited = 0.0
+
+
+_current_span: ContextVar[Optional[_Span]] = ContextVar('trace_span', default=None)
+
+# Спаны внешних вызовов: всё их время — ожидание ответа
+EXTERNAL_CATEGORIES = frozenset({'telegram', 'backend'})
+
+# Общая точка отсчёта ts для всех событий процесса, мкс
+_EPOCH = time.perf_counter()
+
+
+def _us(seconds: float) -> float:
+    return round(seconds * 1_000_000, 1)
+
+
+@contextmanager
+def span(name: str, category: str = 'app', **args: Any):
+    """Спан внутри выбранного для трассировки апдейта; вне его ничего не делает"""
+    parent = _current_span.get()
+    if parent is None:
+        yield
+        return
+    started = time.perf_counter()
+    current = _Span(parent.events, parent.tid, started)
+    token = _current_span.set(current)
+    try:
+        yield
+    finally:
+        _current_span.reset(token)
+        duration = time.perf_counter() - started
+        parent.awaited += duration
+        _record(current, name, category, duration, args)
+
+
+def current_trace() -> Optional[_Span]:
+    """Спан, в котором идёт код: передать в отложенную работу, чтобы продолжить трассу"""
+    return _current_span.get()
+
+
+@contextmanager
+def resume_trace(parent: Optional[_Span], name: str, category: str = 'task', **args: Any):
+    """Спан `name` на дорожке `parent` из другой задачи (очередь, воркер)
+
+    Апдейт такую работу не ждёт, поэтому её время не входит в await_ms родителя.
+    """
+    if parent is None:
+        yield
+        return
+    token = _current_span.set(_Span(parent.events, parent.tid, time.perf_counter()))
+    try:
+        with span(name, category, **args):
+            yield
+    finally:
+        _current_span.reset(token)
+
+
+def _record(current: _Span, name: str, category: str, duration: float, args: Dict[str, Any]):
+    if category in EXTERNAL_CATEGORIES:
+        awaited = duration
+    else:
+        # Параллельные дочерние спаны (gather) могут в сумме быть дольше родителя
+        awaited = min(current.awaited, duration)
+    current.events.append({
+        'name': name, 'cat': category, 'ph': 'X', 'pid': 1, 'tid': current.tid,
+        'ts': _us(current.started - _EPOCH), 'dur': _us(duration),
+        'args': dict(args, await_ms=round(awaited * 1000, 3), self_ms=round((duration - awaited) * 1000, 3)),
+    })
+
+
+class Tracer(BaseRequestMiddleware):
+    """Выборочная трассировка апдейтов в формате Chrome trace (Perfetto, chrome://tracing)
+
+    `on_update` — outer middleware на `dp.update`: с вероятностью
+    `sample_rate` апдейт получает свою дорожку (tid = update_id), и всё,
+    что внутри него обёрнуто в `span`, попадает в трассу. `on_handler` —
+    inner middleware с именем хендлера; как middleware сессии записывает
+    каждый запрос к Bot API. У спана `await_ms` — время во вложенных
+    спанах (у запросов к Bot API и бэкенду — всё время), `self_ms` —
+    остальное: собственная работа и неучтённые ожидания event loop.
+    Трассы копятся в памяти и пишутся файлом на каждые `flush_every` апдейтов.
+
+    Задачи из asyncio.create_task наследуют спан апдейта вместе с контекстом
+    и пишут в трассу и после его конца (попадут в следующий файл). Работа,
+    которую выполняет чужой воркер (фоновые задачи jobs.py), продолжает
+    трассу явно: `current_trace()` при постановке и `resume_trace` в воркере.
+    """
+
+    def __init__(self, sample_rate: float = 0.0, directory: str = "traces", flush_every: int = 100):
+        self.sample_rate = sample_rate
+        self.directory = directory
+        self.flush_every = flush_every
+        self._events: List[dict] = []
+        self._traced = 0
+        self._files = 0
+
+    async def __call__(self, make_request: NextRequestMiddlewareType, bot: Bot, method: TelegramMethod):
+        with span(method.__api_method__, 'telegram'):
+            return await make_request(bot, method)
+
+    async def on_update(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                        event: Update, data: Dict[str, Any]) -> Any:
+        if not self.sample_rate or random.random() >= self.sample_rate:
+            return await handler(event, data)
+
+        # Спаны пишут прямо в общий буфер: события фоновых задач, закончившихся
+        # после апдейта, тоже не теряются
+        self._events.append({
+            'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': event.update_id,
+            'args': {'name': f"update {event.update_id}"},
+        })
+        root = _Span(self._events, event.update_id, time.perf_counter())
+        token = _current_span.set(root)
+        try:
+            with span('update', 'update', type=event.event_type):
+                return await handler(event, data)
+        finally:
+            _current_span.reset(token)
+            self._traced += 1
+            if self._traced % self.flush_every == 0:
+                await self.flush()
+
+    async def on_handler(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                         event: TelegramObject, data: Dict[str, Any]) -> Any:
+        handler_object = data.get('handler')
+        name = handler_object.callback.__name__ if handler_object is not None else 'unknown'
+        with span(name, 'handler'):
+            return await handler(event, data)
+
+    def _write(self, path: str, events: List[dict]):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f, ensure_ascii=False)
+
+    async def flush(self) -> Optional[str]:
+        """Записать накопленные трассы в новый файл; вернуть его путь"""
+        if not self._events:
+            return None
+        # Тот же список очищается, а не заменяется: на него ссылаются спаны в работе
+        events = self._events.copy()
+        self._events.clear()
+        self._files += 1
+        path = os.path.join(self.directory, f"trace-{time.strftime('%Y%m%d-%H%M%S')}-{self._files}.json")
+        try:
+            await asyncio.to_thread(self._write, path, events)
+        except OSError as e:
+            logger.error(f"Не удалось записать трассу {path}: {e}")
+            return None
+        logger.info(f"🧭 Трасса записана: {path}")
+        return path
+
+    async def close(self):
+        await self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        return {'sample_rate': self.sample_rate, 'traced': self._traced, 'files': self._files}
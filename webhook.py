@@ -0,0 +1,81 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+logger = logging.getLogger(__name__)
+
+
+async def health_handler(request: web.Request) -> web.Response:
+    """Проверка живости для Railway"""
+    return web.json_response({"status": "ok"})
+
+
+def build_app(dp: Dispatcher, bot: Bot, path: str = "/webhook",
+              secret_token: Optional[str] = None) -> web.Application:
+    """aiohttp-приложение с вебхуком и /health
+
+    Апдейт принимается, на него сразу отвечается 200, а обработка идёт
+    в фоне — Telegram не ждёт хендлер. Запросы без верного
+    X-Telegram-Bot-Api-Secret-Token отклоняются с 401.
+    """
+    app = web.Application()
+    app.router.add_get("/health", health_handler)
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=secret_token,
+        handle_in_background=True,
+    ).register(app, path=path)
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+def build_router_app(route: Callable[[Dict[str, Any]], Awaitable[None]], path: str = "/webhook",
+                     secret_token: Optional[str] = None) -> web.Application:
+    """aiohttp-приложение роутера шардов: апдейт без разбора передаётся в `route`"""
+    async def handle(request: web.Request) -> web.Response:
+        if secret_token and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != secret_token:
+            return web.Response(status=401)
+        await route(await request.json())
+        return web.Response()
+
+    app = web.Application()
+    app.router.add_get("/health", health_handler)
+    app.router.add_post(path, handle)
+    return app
+
+
+async def serve_webhook(app: web.Application, bot: Bot, base_url: str, path: str = "/webhook",
+                        secret_token: Optional[str] = None, host: str = "0.0.0.0", port: int = 8080,
+                        allowed_updates: Optional[List[str]] = None):
+    """Поднять сервер, зарегистрировать вебхук и работать до отмены"""
+    if not base_url:
+        raise ValueError("Для режима webhook нужен WEBHOOK_URL")
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host=host, port=port)
+    await site.start()
+    logger.info(f"🌐 Вебхук слушает {host}:{port}{path}")
+
+    try:
+        await bot.set_webhook(
+            url=f"{base_url.rstrip('/')}{path}",
+            secret_token=secret_token,
+            allowed_updates=allowed_updates,
+        )
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot, base_url: str, path: str = "/webhook",
+                      secret_token: Optional[str] = None, host: str = "0.0.0.0", port: int = 8080,
+                      allowed_updates: Optional[List[str]] = None):
+    """Вебхук с обработкой апдейтов в этом же процессе"""
+    app = build_app(dp, bot, path=path, secret_token=secret_token)
+    await serve_webhook(app, bot, base_url, path=path, secret_token=secret_token, host=host, port=port,
+                        allowed_updates=allowed_updates)